@@ -0,0 +1,75 @@
+# benchmarks/cache_parse.py
+#
+# Carga repetida da mesma exportação com e sem o cache_parse: tempo até os
+# registros validados chegarem ao enriquecimento (leitura + parse, ou leitura
+# do cache) e a geração completa da outra especialidade sobre o mesmo arquivo.
+#
+# Uso: python -m benchmarks.cache_parse EXPORT.txt [--repeticoes 3]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from cache_parse import CacheParse, EntradaCacheParse
+from pipeline import CONFIGURACAO_SERIAL, Pipeline
+from solicitador_apac import gerar_apacs_de_arquivo
+from utils import abrir_blocos_bdsia
+
+
+def medir_registros(arquivo, cache):
+    """Segundos para obter todos os (registro, motivos) do arquivo, em série."""
+    inicio = time.perf_counter()
+    entrada = EntradaCacheParse(cache, arquivo) if cache is not None else None
+    pipeline = Pipeline(CONFIGURACAO_SERIAL, cache_parse=entrada)
+    blocos = entrada.blocos(arquivo) if entrada is not None else abrir_blocos_bdsia(arquivo)
+    total = sum(1 for _ in pipeline.registros(blocos))
+    if entrada is not None:
+        entrada.concluir()
+    return time.perf_counter() - inicio, total
+
+
+def medir_geracao(arquivo, cache):
+    pasta = tempfile.mkdtemp(prefix="apac_bench_cache_")
+    try:
+        inicio = time.perf_counter()
+        gerar_apacs_de_arquivo(arquivo, "risco_cirurgico", pasta_saida=pasta, cache_parse=cache if cache else False)
+        return time.perf_counter() - inicio
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga repetida de uma exportação com e sem o cache do parse.")
+    parser.add_argument("arquivo", help="Arquivo TXT exportado (BDSIA)")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    pasta_cache = tempfile.mkdtemp(prefix="apac_bench_cache_parse_")
+    try:
+        cache = CacheParse(pasta_cache)
+        sem_cache = min(medir_registros(args.arquivo, None)[0] for _ in range(args.repeticoes))
+        primeira, total = medir_registros(args.arquivo, cache)
+        tamanho = sum(os.path.getsize(os.path.join(pasta_cache, nome)) for nome in os.listdir(pasta_cache))
+        repetida = min(medir_registros(args.arquivo, cache)[0] for _ in range(args.repeticoes))
+        print(f"{total} registros; entrada do cache: {tamanho / 1024:.0f} KiB "
+              f"({tamanho / os.path.getsize(args.arquivo):.1%} da exportação)")
+        print(f"{'registros sem cache':<34} {sem_cache:8.3f} s")
+        print(f"{'registros, 1ª carga (grava)':<34} {primeira:8.3f} s")
+        print(f"{'registros, carga repetida':<34} {repetida:8.3f} s")
+        # Intercaladas, para a variação da máquina pesar igual nas duas
+        geracoes = {None: [], cache: []}
+        for _ in range(args.repeticoes):
+            for modo in geracoes:
+                geracoes[modo].append(medir_geracao(args.arquivo, modo))
+        print(f"{'geração risco, sem cache':<34} {min(geracoes[None]):8.3f} s")
+        print(f"{'geração risco, carga repetida':<34} {min(geracoes[cache]):8.3f} s")
+    finally:
+        shutil.rmtree(pasta_cache, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# benchmarks/gerar_export_sintetico.py
+#
+# Gera exportações *BDSIA sintéticas, de qualquer tamanho, para medir o desempenho.
+# Os médicos, estabelecimentos e CIDs saem das tabelas do repositório (com uma
+# parcela de valores desconhecidos) e CPF, CNS e número da APAC têm dígitos
+# verificadores válidos.
+#
+# Uso: python -m benchmarks.gerar_export_sintetico SAIDA.txt --blocos 10000
+#          [--risco 0.3] [--malformados 0.02] [--semente 1]
+
+import argparse
+import csv
+import random
+import sys
+
+from utils import resource_path
+from oftalmologia import MAPA_PROCEDIMENTOS_OFTALMO
+from risco_cirurgico import PROC_PRINCIPAL, PROC_SECUNDARIOS
+
+# Fração de consultas que não devem ser encontradas nas tabelas
+FRACAO_DESCONHECIDOS = 0.05
+
+NOMES = ("MARIA", "JOSE", "ANA", "JOAO", "ANTONIO", "FRANCISCA", "CARLOS", "PAULO", "LUCAS", "JULIANA",
+         "MARCOS", "PATRICIA", "ALINE", "RAFAEL", "BEATRIZ", "GABRIEL", "LETICIA", "PEDRO", "SANDRA", "VITOR")
+SOBRENOMES = ("SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "RODRIGUES", "FERREIRA", "ALVES", "PEREIRA", "LIMA",
+              "GOMES", "COSTA", "RIBEIRO", "MARTINS", "CARVALHO", "ALMEIDA", "LOPES", "SOARES", "VIEIRA")
+RUAS = ("RUA DAS FLORES", "AVENIDA BRASIL", "RUA SAO PAULO", "RUA VOLUNTARIOS DA FRANCA", "AVENIDA PRESIDENTE VARGAS",
+        "RUA MARECHAL DEODORO", "RUA DO COMERCIO", "AVENIDA DR. ISMAEL ALONSO Y ALONSO")
+BAIRROS = ("CENTRO", "JARDIM AEROPORTO", "VILA SANTA CRUZ", "CITY PETROPOLIS", "JARDIM CONSOLO", "PARQUE PROGRESSO")
+RACAS = ("01 BRANCA", "02 PRETA", "03 PARDA", "04 AMARELA", "05 INDIGENA")
+
+# ==============================================================================
+# DÍGITOS VERIFICADORES
+# ==============================================================================
+
+def digitos_cpf(base9):
+    """Completa os 9 primeiros dígitos do CPF com os dois verificadores."""
+    digitos = [int(d) for d in base9]
+    for peso_inicial in (10, 11):
+        soma = sum(d * p for d, p in zip(digitos, range(peso_inicial, 1, -1)))
+        resto = soma * 10 % 11
+        digitos.append(0 if resto == 10 else resto)
+    return "".join(map(str, digitos))
+
+def formatar_cpf(cpf):
+    return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+
+def cns_definitivo(base11):
+    """CNS definitivo (começa com 1 ou 2) a partir dos 11 primeiros dígitos (PIS)."""
+    soma = sum(int(d) * p for d, p in zip(base11, range(15, 4, -1)))
+    dv = 11 - soma % 11
+    if dv == 11:
+        dv = 0
+    if dv == 10:
+        soma += 2
+        dv = 11 - soma % 11
+        return f"{base11}001{dv}"
+    return f"{base11}000{dv}"
+
+def cns_provisorio(rng):
+    """CNS provisório (começa com 7, 8 ou 9): soma ponderada múltipla de 11."""
+    while True:
+        base = str(rng.choice((7, 8, 9))) + "".join(str(rng.randrange(10)) for _ in range(13))
+        soma = sum(int(d) * p for d, p in zip(base, range(15, 1, -1)))
+        for ultimo in range(10):
+            if (soma + ultimo) % 11 == 0:
+                return base + str(ultimo)
+
+def numero_apac(sequencial):
+    """Número da APAC (12 dígitos + verificador = resto da divisão por 11, com 10 -> 0)."""
+    base = f"3525{sequencial:08d}"
+    dv = int(base) % 11
+    return f"{base}-{0 if dv == 10 else dv}"
+
+# ==============================================================================
+# TABELAS DO REPOSITÓRIO
+# ==============================================================================
+
+def _primeira_coluna(nome_csv):
+    try:
+        with open(resource_path(nome_csv), newline="", encoding="utf-8") as f:
+            leitor = csv.reader(f, delimiter=";")
+            next(leitor, None)
+            return [linha[0].strip() for linha in leitor if linha and linha[0].strip()]
+    except FileNotFoundError:
+        return []
+
+# ==============================================================================
+# BLOCOS
+# ==============================================================================
+
+class GeradorExport:
+    """Monta blocos *BDSIA no formato lido por extrair_dados_variaveis e extrair_procedimentos."""
+
+    def __init__(self, semente=1, fracao_risco=0.3, fracao_malformados=0.02):
+        self.rng = random.Random(semente)
+        self.fracao_risco = fracao_risco
+        self.fracao_malformados = fracao_malformados
+        self.medicos = _primeira_coluna("medicos.csv") or [cns_definitivo("12345678901")]
+        self.estabelecimentos = _primeira_coluna("estabelecimentos.csv") or ["3975347"]
+        self.cids = [c for c in _primeira_coluna("cid_oftalmologia.csv") if len(c) >= 3] or ["H251"]
+        self.sequencial = 0
+
+    def _talvez_desconhecido(self, valores, gerar_desconhecido):
+        if self.rng.random() < FRACAO_DESCONHECIDOS:
+            return gerar_desconhecido()
+        return self.rng.choice(valores)
+
+    def _nome(self):
+        return f"{self.rng.choice(NOMES)} {self.rng.choice(SOBRENOMES)} {self.rng.choice(SOBRENOMES)}"
+
+    def _cns_medico(self):
+        return self._talvez_desconhecido(self.medicos, lambda: cns_provisorio(self.rng))
+
+    def _linhas_procedimentos(self, risco, cnes_terc):
+        if risco:
+            principal = (PROC_PRINCIPAL["cod"], PROC_PRINCIPAL["descricao"], PROC_PRINCIPAL["qtd"])
+            secundarios = [(s["cod"], s["nome"], s["qtd"]) for s in PROC_SECUNDARIOS]
+        else:
+            cod = self.rng.choice(list(MAPA_PROCEDIMENTOS_OFTALMO))
+            mapa = MAPA_PROCEDIMENTOS_OFTALMO[cod]
+            principal = (cod, mapa["descricao"], "1")
+            secundarios = [(s["cod"], s["nome"], s["qtd"]) for s in mapa["secundarios"]]
+        linhas = ["CODIGO       DESCRICAO                                          QTD  CBO     CNES TERC"]
+        for cod, nome, qtd in [principal] + secundarios:
+            linhas.append(f"{cod}  {nome[:48]:<48}  {qtd:>3}  225265  {cnes_terc}")
+        return linhas
+
+    def bloco_valido(self, risco=False):
+        self.sequencial += 1
+        rng = self.rng
+        cpf = formatar_cpf(digitos_cpf("".join(str(rng.randrange(10)) for _ in range(9))))
+        cnes_terc = self._talvez_desconhecido(self.estabelecimentos, lambda: f"{rng.randrange(1000000, 9999999)}")
+        cid = self._talvez_desconhecido(self.cids, lambda: f"Z{rng.randrange(100, 999)}")
+        cns_solicitante = self._cns_medico()
+        # O SIA às vezes imprime o CNS em grupos de quatro dígitos
+        if rng.random() < 0.5:
+            cns_solicitante = f"{cns_solicitante[:3]} {cns_solicitante[3:7]} {cns_solicitante[7:11]} {cns_solicitante[11:]}"
+        linhas = [
+            f"  SISTEMA DE INFORMACOES AMBULATORIAIS        PAG: {self.sequencial}",
+            f"NUMERO DO APAC: {numero_apac(self.sequencial)}",
+            "INICIO DA VALIDADE DA APAC: 01/10/2025    FIM DA VALIDADE DO APAC: 31/12/2025",
+            f"CODIGO DA UNIDADE: {rng.choice(('2087669', '2087669', '2081695'))}",
+            f"NOME: {self._nome()}",
+            f"CPF:   {cpf}",
+            f"SEXO: {rng.choice(('MASCULINO', 'FEMININO'))}    DATA DE NASCIMENTO: "
+            f"{rng.randrange(1, 29):02d}/{rng.randrange(1, 13):02d}/{rng.randrange(1935, 2020)}   RACA: {rng.choice(RACAS)}",
+            f"NOME DA MAE: {self._nome()}",
+            f"NOME DO RES: {self._nome()}",
+            f"ENDERECO:  {rng.choice(RUAS)}",
+            f"NUMERO:  {rng.randrange(1, 5000)}",
+            f"BAIRRO:  {rng.choice(BAIRROS)}",
+            f"CEP:  144{rng.randrange(0, 99):02d}-{rng.randrange(0, 999):03d}",
+            "MEDICO SOLICITANTE",
+            f"CNS: {cns_solicitante}",
+            f"C.I.D. PRINCIPAL {cid}",
+            "PROCEDIMENTOS REALIZADOS:",
+            *self._linhas_procedimentos(risco, cnes_terc),
+            "MOTIVO DE SAIDA: 21",
+            "AUTORIZADOR",
+            f"CNS: {self._cns_medico()}",
+        ]
+        return "\n".join(linhas) + "\n"
+
+    def bloco_malformado(self):
+        """Bloco com defeitos comuns: sem procedimentos, truncado, código não mapeado ou lixo."""
+        defeito = self.rng.randrange(4)
+        bloco = self.bloco_valido(risco=False)
+        if defeito == 0:
+            inicio = bloco.index("PROCEDIMENTOS REALIZADOS:")
+            return bloco[:inicio] + bloco[bloco.index("MOTIVO DE SAIDA"):]
+        if defeito == 1:
+            return bloco[:len(bloco) // 3]
+        if defeito == 2:
+            linhas = bloco.split("\n")
+            i = next(n for n, linha in enumerate(linhas) if linha.startswith("CODIGO  "))
+            linhas[i + 1] = "099999999-9" + linhas[i + 1][11:]
+            return "\n".join(linhas)
+        return "  RELATORIO DE CONFERENCIA - SEM DADOS DE APAC\n" + "-" * 80 + "\n"
+
+    def blocos(self, quantidade):
+        for _ in range(quantidade):
+            sorteio = self.rng.random()
+            if sorteio < self.fracao_malformados:
+                yield self.bloco_malformado()
+            else:
+                yield self.bloco_valido(risco=self.rng.random() < self.fracao_risco)
+
+def gerar_export(caminho, quantidade, semente=1, fracao_risco=0.3, fracao_malformados=0.02):
+    """Grava uma exportação sintética com quantidade blocos (latin-1, como o SIA)."""
+    gerador = GeradorExport(semente, fracao_risco, fracao_malformados)
+    with open(caminho, "w", encoding="latin-1", newline="\n") as f:
+        f.write("MINISTERIO DA SAUDE - SIA/SUS - RELACAO DE APACS\n")
+        for bloco in gerador.blocos(quantidade):
+            f.write("*BDSIA")
+            f.write(bloco)
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera uma exportação *BDSIA sintética.")
+    parser.add_argument("saida", help="Arquivo TXT a gerar")
+    parser.add_argument("--blocos", type=int, default=1000)
+    parser.add_argument("--risco", type=float, default=0.3, help="Fração de blocos de risco cirúrgico")
+    parser.add_argument("--malformados", type=float, default=0.02, help="Fração de blocos com defeito")
+    parser.add_argument("--semente", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    gerar_export(args.saida, args.blocos, args.semente, args.risco, args.malformados)
+    print(f"{args.saida}: {args.blocos} blocos")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
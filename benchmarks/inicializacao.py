@@ -0,0 +1,115 @@
+# benchmarks/inicializacao.py
+#
+# Tempo de abertura do programa, sempre em processos novos:
+#   - importação de cada módulo (main, solicitador_apac, utils, fpdf, ttkthemes);
+#   - até a janela ficar visível, rodando main.py (modo script) ou o executável
+#     gerado pelo PyInstaller (modo congelado, --executavel);
+#   - carga das tabelas de consulta a partir do CSV e do pacote .tab.
+#
+# Uso: python -m benchmarks.inicializacao [--repeticoes 5] [--executavel dist/main.exe] [--sem-janela]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULOS = ("main", "solicitador_apac", "utils", "fpdf", "ttkthemes")
+
+# Tempo máximo (s) esperando a janela aparecer
+LIMITE_JANELA = 60
+
+
+def _resumo(tempos):
+    if not tempos:
+        return "-"
+    return f"mín {min(tempos) * 1000:8.1f} ms   mediana {statistics.median(tempos) * 1000:8.1f} ms"
+
+
+def tempo_importacao(modulo):
+    """Segundos para importar o módulo num interpretador novo (descontado o interpretador vazio)."""
+    codigo = f"import time; t = time.perf_counter(); import {modulo}; print(time.perf_counter() - t)"
+    resultado = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, capture_output=True, text=True)
+    if resultado.returncode != 0:
+        return None
+    return float(resultado.stdout.strip().splitlines()[-1])
+
+
+def tempo_janela(comando):
+    """Segundos entre iniciar o processo e a janela ficar visível, ou None se não abriu."""
+    descritor, caminho_marca = tempfile.mkstemp(prefix="apac_inicializacao_")
+    os.close(descritor)
+    os.remove(caminho_marca)
+    ambiente = dict(os.environ, APAC_MEDIR_INICIALIZACAO=caminho_marca)
+    inicio = time.time()
+    try:
+        subprocess.run(comando, cwd=RAIZ, env=ambiente, capture_output=True, timeout=LIMITE_JANELA)
+        with open(caminho_marca, encoding="utf-8") as f:
+            return float(f.read()) - inicio
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+    finally:
+        if os.path.exists(caminho_marca):
+            os.remove(caminho_marca)
+
+
+def tempo_tabelas(repeticoes):
+    """(ms lendo os CSVs, ms lendo os pacotes .tab) para indexar as tabelas de consulta."""
+    sys.path.insert(0, RAIZ)
+    from utils import TABELAS_CONSULTA, TabelaIndexada, empacotar_tabelas, resource_path
+    from utils import assinatura_csv, ler_pacote_tabela, nome_pacote_tabela
+
+    pasta = tempfile.mkdtemp(prefix="apac_pacotes_")
+    empacotar_tabelas(pasta)
+    tempos_csv, tempos_pacote = [], []
+    for _ in range(repeticoes):
+        for caminho_csv, chave, valor in TABELAS_CONSULTA:
+            try:
+                with open(resource_path(caminho_csv), "rb") as f:
+                    conteudo = f.read()
+            except OSError:
+                continue
+            tabela = TabelaIndexada(caminho_csv, chave, valor)
+            inicio = time.perf_counter()
+            tabela._indexar_csv(conteudo)
+            tempos_csv.append(time.perf_counter() - inicio)
+            inicio = time.perf_counter()
+            ler_pacote_tabela(os.path.join(pasta, nome_pacote_tabela(caminho_csv, chave, valor)),
+                              assinatura_csv(conteudo, tabela.delimitador))
+            tempos_pacote.append(time.perf_counter() - inicio)
+    por_rodada = max(repeticoes, 1)
+    return sum(tempos_csv) / por_rodada * 1000, sum(tempos_pacote) / por_rodada * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo de abertura do Gerador de APAC (script e executável).")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--executavel", default=None, help="Executável do PyInstaller (modo congelado)")
+    parser.add_argument("--sem-janela", action="store_true", help="Mede só as importações (sem display)")
+    args = parser.parse_args(argv)
+
+    print("importação (processo novo):")
+    for modulo in MODULOS:
+        tempos = [t for t in (tempo_importacao(modulo) for _ in range(args.repeticoes)) if t is not None]
+        print(f"  {modulo:<18} {_resumo(tempos) if tempos else 'não importável neste ambiente'}")
+
+    if not args.sem_janela:
+        modos = [("script", [sys.executable, os.path.join(RAIZ, "main.py")])]
+        if args.executavel:
+            modos.append(("congelado", [os.path.abspath(args.executavel)]))
+        print("\naté a janela ficar visível:")
+        for nome, comando in modos:
+            tempos = [t for t in (tempo_janela(comando) for _ in range(args.repeticoes)) if t is not None]
+            print(f"  {nome:<18} {_resumo(tempos) if tempos else 'a janela não abriu (sem display?)'}")
+
+    ms_csv, ms_pacote = tempo_tabelas(args.repeticoes)
+    print(f"\ntabelas de consulta: CSV {ms_csv:.2f} ms   pacote .tab {ms_pacote:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
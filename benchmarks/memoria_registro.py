@@ -0,0 +1,70 @@
+# benchmarks/memoria_registro.py
+#
+# Bytes por registro mantido em memória: dicionário mesclado por página (antes)
+# contra RegistroAPAC com __slots__ e valores internados (depois).
+#
+# Uso: python -m benchmarks.memoria_registro EXPORT.txt
+
+import argparse
+import sys
+import tracemalloc
+
+from utils import abrir_blocos_bdsia, extrair_dados_variaveis, extrair_principal_e_cnes
+from registro_apac import extrair_registro
+from oftalmologia import MAPA_PROCEDIMENTOS_OFTALMO, completar_registro, dados_fixos_procedimento
+from solicitador_apac import DADOS_FIXOS_GENERICOS
+
+
+def _dicionario_mesclado(bloco):
+    """Reproduz o dicionário que era mantido por página: fixos + complementares + variáveis."""
+    dados_variaveis = extrair_dados_variaveis(bloco)
+    proc_principal, cnes_solicitante = extrair_principal_e_cnes(bloco)
+    registro = extrair_registro(bloco)
+    completar_registro(registro)
+    fixos = dados_fixos_procedimento(
+        proc_principal if proc_principal in MAPA_PROCEDIMENTOS_OFTALMO else "090501003-5",
+        DADOS_FIXOS_GENERICOS,
+    )
+    complementares = {campo: getattr(registro, campo) for campo in
+                      ("NOME_SOLICITANTE", "DOC_SOLICITANTE", "NOME_AUTORIZADOR", "DOC_AUTORIZADOR",
+                       "DESC_DIAGNOSTICO", "NOME_ESTABELECIMENTO", "NOME_ESTAB_SOLICITANTE")}
+    # Cópias novas das strings, como as que saíam de cada regex/consulta CSV
+    complementares = {k: "".join(list(v)) for k, v in complementares.items()}
+    return {**fixos, **complementares, "CNES_SOLICITANTE": cnes_solicitante, **dados_variaveis}
+
+
+def _registro(bloco):
+    registro = extrair_registro(bloco)
+    completar_registro(registro)
+    return registro
+
+
+def medir(construtor, blocos):
+    """Bytes alocados por item mantido (tracemalloc), descontando o texto dos blocos."""
+    tracemalloc.start()
+    inicio, _ = tracemalloc.get_traced_memory()
+    itens = [construtor(bloco) for bloco in blocos]
+    atual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (atual - inicio) / max(len(itens), 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memória por registro: dicionários x RegistroAPAC.")
+    parser.add_argument("arquivo", help="Exportação BDSIA (.txt)")
+    args = parser.parse_args(argv)
+
+    blocos = list(abrir_blocos_bdsia(args.arquivo))
+    _registro(blocos[0])  # aquece as tabelas de consulta fora da medição
+
+    antes = medir(_dicionario_mesclado, blocos)
+    depois = medir(_registro, blocos)
+    print(f"{len(blocos)} registros")
+    print(f"  dicionário mesclado:  {antes:10.0f} bytes/registro")
+    print(f"  RegistroAPAC:         {depois:10.0f} bytes/registro")
+    print(f"  redução:              {(1 - depois / antes) * 100:9.1f} %")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# benchmarks/overlay.py
+#
+# Páginas por segundo e tamanho do PDF: set_xy + cell() por campo a cada página
+# (antes) contra o layout compilado em posições de FPDF.text (depois), e o mesmo
+# sem o fundo (sobreposição ao formulário pré-impresso).
+#
+# A sobreposição já leva só o texto (nenhuma imagem; a fonte é a Helvetica
+# padrão, não embutida): ela economiza o template, gravado uma vez por
+# documento. Por isso a diferença é grande em documentos curtos e pequena nos
+# longos, em que o texto de cada página domina; a segunda tabela mostra isso.
+#
+# Uso: python -m benchmarks.overlay EXPORT.txt [--paginas N] [--variante pb]
+
+import argparse
+import itertools
+import sys
+import time
+
+from utils import (
+    VARIANTES_TEMPLATE, APAC_PDF, TAMANHO_FONTE_MARCA_SEXO, abrir_blocos_bdsia, preparar_template, texto_campo,
+)
+from registro_apac import extrair_registros
+from oftalmologia import MAPA_PROCEDIMENTOS_OFTALMO, completar_registro, dados_fixos_procedimento
+from solicitador_apac import DADOS_FIXOS_GENERICOS
+
+
+def _paginas(caminho, quantidade):
+    """(fixos, registro) de cada página, repetindo o arquivo até completar a quantidade."""
+    fixos_por_procedimento = {}
+    paginas = []
+    for registro in extrair_registros(abrir_blocos_bdsia(caminho)):
+        completar_registro(registro)
+        proc = registro.PROC_PRINCIPAL_COD
+        if proc not in MAPA_PROCEDIMENTOS_OFTALMO:
+            proc = "090501003-5"
+        if proc not in fixos_por_procedimento:
+            fixos_por_procedimento[proc] = dados_fixos_procedimento(proc, DADOS_FIXOS_GENERICOS)
+        paginas.append((fixos_por_procedimento[proc], registro))
+    return list(itertools.islice(itertools.cycle(paginas), quantidade))
+
+
+class APAC_PDF_CELL(APAC_PDF):
+    """O desenho anterior: set_xy + cell() para cada campo e marca do layout."""
+
+    def add_apac_page(self, data, fixos=None):
+        self.add_page()
+        if not self.sobreposicao:
+            self._desenhar_fundo()
+        self.set_font('Arial', '', 10)
+        self.set_text_color(0, 0, 0)
+        if fixos is not None:
+            data = {**fixos, **data}
+        for chave, x, y, largura, altura in self._layout_campos:
+            self.set_xy(x, y); self.cell(largura, altura, texto_campo(chave, data))
+        for x, y, lado in self._marcas_fixas:
+            self.set_xy(x, y); self.cell(w=lado, h=lado, text="X", border=0, align='C')
+        posicao = self._marcas_sexo.get(data.get("SEXO"))
+        if posicao:
+            original_font_size = self.font_size_pt
+            self.set_font_size(TAMANHO_FONTE_MARCA_SEXO)
+            self.set_xy(*posicao); self.cell(w=3, h=3, text="X", border=0, align='C')
+            self.set_font_size(original_font_size)
+
+
+def medir(classe, paginas, variante, sobreposicao=False):
+    """Retorna (bytes do PDF, páginas por segundo incluindo o output)."""
+    inicio = time.perf_counter()
+    pdf = classe(orientacao='P', variante_template=variante, sobreposicao=sobreposicao)
+    for fixos, registro in paginas:
+        pdf.add_apac_page(registro.como_dados(), fixos=fixos)
+    conteudo = pdf.output()
+    decorrido = time.perf_counter() - inicio
+    return len(conteudo), len(paginas) / decorrido
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render por página: cell() por campo x layout compilado.")
+    parser.add_argument("arquivo", help="Arquivo TXT exportado (BDSIA)")
+    parser.add_argument("--paginas", type=int, default=500)
+    parser.add_argument("--variante", choices=VARIANTES_TEMPLATE, default="pb")
+    args = parser.parse_args(argv)
+
+    paginas = _paginas(args.arquivo, args.paginas)
+    if not paginas:
+        print("Nenhuma APAC encontrada no arquivo.")
+        return 1
+    preparar_template(args.variante, None)  # preparo único do processo fica fora da medição
+
+    print(f"{'modo':<22} {'bytes':>12} {'pág/s':>10}")
+    modos = (
+        ("cell() por campo", APAC_PDF_CELL, False),
+        ("layout compilado", APAC_PDF, False),
+        ("só sobreposição", APAC_PDF, True),
+    )
+    for nome, classe, sobreposicao in modos:
+        tamanho, paginas_por_segundo = medir(classe, paginas, args.variante, sobreposicao)
+        print(f"{nome:<22} {tamanho:>12} {paginas_por_segundo:>10.1f}")
+
+    print()
+    print(f"{'páginas':>8} {'com fundo':>12} {'sobreposição':>14} {'redução':>9}")
+    for quantidade in sorted({1, 10, 100, len(paginas)}):
+        if quantidade > len(paginas):
+            continue
+        com_fundo = medir(APAC_PDF, paginas[:quantidade], args.variante)[0]
+        sobreposicao = medir(APAC_PDF, paginas[:quantidade], args.variante, True)[0]
+        print(f"{quantidade:>8} {com_fundo:>12} {sobreposicao:>14} {1 - sobreposicao / com_fundo:>9.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+# benchmarks/pipeline.py
+#
+# Tempo total da geração com tudo numa thread (antes) contra os estágios ligados
+# por filas limitadas (depois), gravando num disco lento simulado: cada parte é
+# montada em memória e escrita em pedaços, com pausas que imitam a vazão de um
+# compartilhamento de rede (as pausas liberam o GIL, como a E/S de verdade).
+#
+# Uso: python -m benchmarks.pipeline EXPORT.txt [--tipo oftalmologia] [--mb-por-segundo 5]
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+import escrita_pdf
+from utils import APAC_PDF
+from pipeline import CONFIGURACAO_SERIAL
+from especialidades import TIPOS_APAC
+from solicitador_apac import gerar_apacs_de_arquivo
+
+PEDACO_ESCRITA = 256 * 1024
+
+
+def _pdf_em_disco_lento(bytes_por_segundo):
+    """APAC_PDF cujo output(destino) escreve na vazão informada."""
+    class APACDiscoLento(APAC_PDF):
+        def output(self, name="", *args, **kwargs):
+            if not name:
+                return super().output(*args, **kwargs)
+            conteudo = bytes(super().output())
+            with open(name, "wb") as f:
+                for inicio in range(0, len(conteudo), PEDACO_ESCRITA):
+                    pedaco = conteudo[inicio:inicio + PEDACO_ESCRITA]
+                    f.write(pedaco)
+                    time.sleep(len(pedaco) / bytes_por_segundo)
+    return APACDiscoLento
+
+
+def medir(arquivo, tipo, estagios, paginas_por_parte):
+    """(segundos, relatório dos estágios) de uma geração completa numa pasta temporária."""
+    pasta = tempfile.mkdtemp(prefix="apac_bench_pipeline_")
+    try:
+        resultado = gerar_apacs_de_arquivo(arquivo, tipo, pasta_saida=pasta, estagios=estagios,
+                                           paginas_por_parte=paginas_por_parte)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return resultado["segundos"], resultado["pipeline"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Geração serial x estágios com filas, em disco lento simulado.")
+    parser.add_argument("arquivo", help="Arquivo TXT exportado (BDSIA)")
+    parser.add_argument("--tipo", choices=sorted(TIPOS_APAC), default="oftalmologia")
+    parser.add_argument("--mb-por-segundo", type=float, default=5.0, help="Vazão do disco simulado (0 = disco real)")
+    parser.add_argument("--paginas-por-parte", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if args.mb_por_segundo > 0:
+        escrita_pdf.APAC_PDF = _pdf_em_disco_lento(args.mb_por_segundo * 1024 * 1024)
+
+    modos = (
+        ("serial (antes)", CONFIGURACAO_SERIAL),
+        ("estágios (padrão)", None),
+        ("estágios, 2 threads gravando", {"gravacao": {"threads": 2}}),
+        ("estágios + parse em processo", {"parse": {"processos": 1}}),
+    )
+    print(f"{'modo':<30} {'segundos':>9} {'gargalo':>10} {'render bloqueado':>17} {'render esperando':>17}")
+    for nome, estagios in modos:
+        segundos, relatorio = medir(args.arquivo, args.tipo, estagios, args.paginas_por_parte)
+        render = relatorio["estagios"]["render"]
+        print(f"{nome:<30} {segundos:>9.2f} {relatorio['gargalo'] or '-':>10} "
+              f"{render['segundos_bloqueado_saida']:>17.2f} {render['segundos_esperando_entrada']:>17.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
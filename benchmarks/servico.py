@@ -0,0 +1,91 @@
+# benchmarks/servico.py
+#
+# Latência de uma exportação pequena: processo novo a cada geração
+# (python -m solicitador_apac render) contra pedidos ao serviço já aquecido
+# (python -m solicitador_apac servico), sequenciais e simultâneos.
+#
+# Uso: python -m benchmarks.servico EXPORT.txt [--tipo oftalmologia] [--repeticoes 5] [--simultaneos 4]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from especialidades import TIPOS_APAC
+from servico import ServicoAPAC
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _resumo(tempos):
+    return f"mín {min(tempos) * 1000:8.1f} ms   mediana {statistics.median(tempos) * 1000:8.1f} ms"
+
+
+def medir_cli(arquivo, tipo, repeticoes):
+    tempos = []
+    with tempfile.TemporaryDirectory(prefix="apac_bench_servico_") as pasta:
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "solicitador_apac", "render", "--tipo", tipo, "--in", arquivo,
+                            "--out", pasta, "--resumo", os.devnull], cwd=RAIZ, check=False)
+            tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+
+def _pedir(url, corpo):
+    inicio = time.perf_counter()
+    with urllib.request.urlopen(urllib.request.Request(url, data=corpo, method="POST")) as resposta:
+        resposta.read()
+    return time.perf_counter() - inicio
+
+
+def medir_servico(arquivo, tipo, repeticoes, simultaneos):
+    """(tempos sequenciais, tempos com `simultaneos` pedidos ao mesmo tempo, segundos para aquecer)."""
+    with open(arquivo, "rb") as f:
+        corpo = f.read()
+    inicio = time.perf_counter()
+    servico = ServicoAPAC(("127.0.0.1", 0), trabalhadores=simultaneos)
+    servico.aquecer()
+    aquecimento = time.perf_counter() - inicio
+    threading.Thread(target=servico.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servico.server_port}/render?tipo={tipo}"
+    try:
+        sequenciais = [_pedir(url, corpo) for _ in range(repeticoes)]
+        concorrentes = []
+        for _ in range(repeticoes):
+            threads = [threading.Thread(target=lambda: concorrentes.append(_pedir(url, corpo)))
+                       for _ in range(simultaneos)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+    finally:
+        servico.shutdown()
+        servico.server_close()
+    return sequenciais, concorrentes, aquecimento
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Processo novo por geração x serviço aquecido.")
+    parser.add_argument("arquivo", help="Arquivo TXT exportado (BDSIA), de preferência pequeno")
+    parser.add_argument("--tipo", choices=sorted(TIPOS_APAC), default="oftalmologia")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--simultaneos", type=int, default=4, help="Pedidos ao mesmo tempo (= processos do serviço)")
+    args = parser.parse_args(argv)
+
+    arquivo = os.path.abspath(args.arquivo)
+    print(f"{'processo novo (render)':<34} {_resumo(medir_cli(arquivo, args.tipo, args.repeticoes))}")
+    sequenciais, concorrentes, aquecimento = medir_servico(arquivo, args.tipo, args.repeticoes, args.simultaneos)
+    print(f"{'serviço, um pedido por vez':<34} {_resumo(sequenciais)}")
+    print(f"{f'serviço, {args.simultaneos} pedidos simultâneos':<34} {_resumo(concorrentes)}")
+    print(f"(serviço pronto em {aquecimento:.2f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# benchmarks/suite.py
+#
+# Mede cada etapa da geração separadamente (leitura, parse, consultas às tabelas,
+# render das páginas, gravação do PDF) e a execução de ponta a ponta, sobre
+# exportações sintéticas de vários tamanhos, e grava um relatório JSON que pode
+# ser comparado entre versões.
+#
+# Uso: python -m benchmarks.suite [--tamanhos 100 10000 100000] [--tipos oftalmologia risco_cirurgico]
+#          [--processos 1] [--saida relatorio.json] [--comparar relatorio_anterior.json]
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from utils import APAC_PDF, DPI_TEMPLATE, VARIANTE_TEMPLATE, abrir_blocos_bdsia, preparar_template, registro_tabelas
+from registro_apac import extrair_registro
+from solicitador_apac import DADOS_FIXOS_GENERICOS, gerar_apacs_de_arquivo
+import oftalmologia
+import risco_cirurgico
+from benchmarks.gerar_export_sintetico import gerar_export
+
+TAMANHOS_PADRAO = (100, 10000, 100000)
+TIPOS = ("oftalmologia", "risco_cirurgico")
+ETAPAS = ("leitura", "parse", "consultas", "render", "output", "ponta_a_ponta")
+
+
+def _versao():
+    """Commit atual (quando rodando de um clone git), para identificar o relatório."""
+    try:
+        resultado = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), timeout=10)
+        return resultado.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    retorno = funcao(*args)
+    return retorno, time.perf_counter() - inicio
+
+
+def _completar_e_paginar(tipo, registros):
+    """Consulta as tabelas para cada registro e devolve as (fixos, registro) que viram página."""
+    genericos = dict(DADOS_FIXOS_GENERICOS)
+    paginas = []
+    if tipo == "oftalmologia":
+        fixos_por_procedimento = {}
+        for registro in registros:
+            proc = registro.PROC_PRINCIPAL_COD
+            if proc not in oftalmologia.MAPA_PROCEDIMENTOS_OFTALMO:
+                continue
+            if proc not in fixos_por_procedimento:
+                fixos_por_procedimento[proc] = oftalmologia.dados_fixos_procedimento(proc, genericos)
+            oftalmologia.completar_registro(registro)
+            paginas.append((fixos_por_procedimento[proc], registro))
+    else:
+        fixos = risco_cirurgico.dados_fixos_risco_cirurgico(genericos)
+        for registro in registros:
+            risco_cirurgico.completar_registro(registro, genericos, "2087669")
+            paginas.append((fixos, registro))
+    return paginas
+
+
+def _renderizar(paginas):
+    pdf = APAC_PDF(orientacao='P')
+    for fixos, registro in paginas:
+        pdf.add_apac_page(registro.como_dados(), fixos=fixos)
+    return pdf
+
+
+def medir(tipo, blocos, pasta, processos=1):
+    """Tempos (s) de cada etapa para uma exportação sintética de um tipo e tamanho."""
+    caminho = os.path.join(pasta, f"export_{tipo}_{blocos}.txt")
+    gerar_export(caminho, blocos, fracao_risco=1.0 if tipo == "risco_cirurgico" else 0.0)
+
+    # Tabelas recarregadas do zero em cada medição, como numa execução nova
+    registro_tabelas.limpar()
+    tempos = {}
+    lista_blocos, tempos["leitura"] = _cronometrar(lambda: list(abrir_blocos_bdsia(caminho)))
+    registros, tempos["parse"] = _cronometrar(lambda: [r for r in map(extrair_registro, lista_blocos) if r is not None])
+    paginas, tempos["consultas"] = _cronometrar(_completar_e_paginar, tipo, registros)
+    pdf, tempos["render"] = _cronometrar(_renderizar, paginas)
+    caminho_pdf = os.path.join(pasta, f"saida_{tipo}_{blocos}.pdf")
+    _, tempos["output"] = _cronometrar(pdf.output, caminho_pdf)
+    tamanho_pdf = os.path.getsize(caminho_pdf)
+    del pdf, paginas, registros, lista_blocos
+
+    registro_tabelas.limpar()
+    pasta_e2e = os.path.join(pasta, f"e2e_{tipo}_{blocos}")
+    resultado, tempos["ponta_a_ponta"] = _cronometrar(
+        lambda: gerar_apacs_de_arquivo(caminho, tipo, pasta_saida=pasta_e2e, processos=processos))
+
+    return {
+        "tipo": tipo,
+        "blocos": blocos,
+        "paginas": resultado["paginas"],
+        "bytes_entrada": os.path.getsize(caminho),
+        "bytes_pdf": tamanho_pdf,
+        "segundos": {etapa: round(tempos[etapa], 4) for etapa in ETAPAS},
+        "us_por_bloco": {etapa: round(tempos[etapa] / max(blocos, 1) * 1e6, 2) for etapa in ETAPAS},
+        "paginas_por_segundo": round(resultado["paginas"] / tempos["ponta_a_ponta"], 1) if tempos["ponta_a_ponta"] else None,
+    }
+
+
+def comparar(atual, anterior):
+    """Imprime a razão atual/anterior do tempo de cada etapa (< 1 = mais rápido)."""
+    anteriores = {(r["tipo"], r["blocos"]): r for r in anterior["resultados"]}
+    print(f"\ncomparação com {anterior.get('versao') or 'relatório anterior'} (atual / anterior):")
+    for r in atual["resultados"]:
+        base = anteriores.get((r["tipo"], r["blocos"]))
+        if base is None:
+            continue
+        razoes = [f"{etapa}={r['segundos'][etapa] / base['segundos'][etapa]:.2f}"
+                  for etapa in ETAPAS if base["segundos"].get(etapa)]
+        print(f"  {r['tipo']:<16} {r['blocos']:>7}  " + "  ".join(razoes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tempo por etapa da geração de APACs sobre exportações sintéticas.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO))
+    parser.add_argument("--tipos", nargs="+", choices=TIPOS, default=list(TIPOS))
+    parser.add_argument("--processos", type=int, default=1, help="Processos na etapa de ponta a ponta")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON do relatório (padrão: benchmark_<data>.json)")
+    parser.add_argument("--comparar", default=None, help="Relatório JSON anterior para comparação")
+    args = parser.parse_args(argv)
+
+    relatorio = {
+        "versao": _versao(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "processos": args.processos,
+        "resultados": [],
+    }
+    preparar_template(VARIANTE_TEMPLATE, DPI_TEMPLATE)  # preparo único do processo fica fora da medição
+    pasta = tempfile.mkdtemp(prefix="apac_benchmark_")
+    try:
+        print(f"{'tipo':<16} {'blocos':>7} " + " ".join(f"{etapa:>13}" for etapa in ETAPAS) + "   (s)")
+        for blocos in args.tamanhos:
+            for tipo in args.tipos:
+                resultado = medir(tipo, blocos, pasta, args.processos)
+                relatorio["resultados"].append(resultado)
+                print(f"{tipo:<16} {blocos:>7} " + " ".join(f"{resultado['segundos'][e]:>13.3f}" for e in ETAPAS))
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    saida = args.saida or f"benchmark_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\nrelatório: {saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(relatorio, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
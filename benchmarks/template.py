@@ -0,0 +1,76 @@
+# benchmarks/template.py
+#
+# Compara as variantes do template de fundo: tamanho do PDF e tempo de render por página.
+#
+# Uso: python -m benchmarks.template [--paginas N] [--dpi 100 150 ...]
+
+import argparse
+import sys
+import time
+
+from utils import APAC_PDF, VARIANTES_TEMPLATE, preparar_template
+
+DADOS_EXEMPLO = {
+    "NOME_ESTAB_SOLICITANTE": "LEMOUR SAUDE AEROPORTO I",
+    "CNES_SOLICITANTE": "3975347",
+    "NOME_PACIENTE": "MARIA DA SILVA SOUZA",
+    "SEXO": "FEMININO",
+    "CPF_PACIENTE": "123.456.789-09",
+    "DATA_NASCIMENTO": "01/02/1970",
+    "RACA_COR": "01",
+    "NOME_MAE": "JOANA DA SILVA",
+    "ENDERECO": "RUA DAS FLORES, 100 - CENTRO",
+    "MUNICIPIO_RESIDENCIA": "FRANCA",
+    "COD_IBGE_MUNICIPIO": "351620",
+    "UF": "SP",
+    "CEP": "14400-000",
+    "PROC_PRINCIPAL_COD": "090501003-5",
+    "PROC_PRINCIPAL_NOME": "OCI AVAL. INICIAL EM OFTALMO - A PARTIR DE 9 ANOS",
+    "PROC_PRINCIPAL_QTD": "1",
+    "PROC_SEC1_COD": "021106002-0",
+    "PROC_SEC1_NOME": "BIOMICROSCOPIA DE FUNDO",
+    "PROC_SEC1_QTD": "1",
+    "CID10_PRINCIPAL": "H251",
+    "DESC_DIAGNOSTICO": "Catarata senil",
+    "NOME_SOLICITANTE": "ANA CLARA FERREIRA DE ABREU",
+    "DOC_SOLICITANTE": "702102761750292",
+    "DATA_SOLICITACAO": "01/10/2025",
+    "VALIDADE_FIM": "31/12/2025",
+    "NUMERO_APAC": "3525000000011",
+    "COD_ORGAO_EMISSOR": "M351620001",
+}
+
+
+def medir_variante(variante, dpi, paginas):
+    """Retorna (bytes do PDF, ms por página incluindo o output) de uma variante."""
+    preparar_template(variante, dpi)  # preparo único do processo fica fora da medição
+    inicio = time.perf_counter()
+    pdf = APAC_PDF(orientacao='P', variante_template=variante, dpi_template=dpi)
+    for _ in range(paginas):
+        pdf.add_apac_page(DADOS_EXEMPLO)
+    conteudo = pdf.output()
+    decorrido = time.perf_counter() - inicio
+    return len(conteudo), decorrido / paginas * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tamanho e tempo de render por variante de template.")
+    parser.add_argument("--paginas", type=int, default=50)
+    parser.add_argument("--dpi", type=int, nargs="*", default=[0, 150, 100],
+                        help="0 = resolução original do template.png")
+    args = parser.parse_args(argv)
+
+    print(f"{'variante':<10} {'dpi':>8} {'bytes':>12} {'bytes/pág':>10} {'ms/pág':>8}")
+    for variante in VARIANTES_TEMPLATE:
+        for dpi in args.dpi:
+            try:
+                tamanho, ms = medir_variante(variante, dpi or None, args.paginas)
+            except FileNotFoundError as e:
+                print(f"{variante:<10} {'-':>8} {e}")
+                break
+            print(f"{variante:<10} {dpi or 'original':>8} {tamanho:>12} {tamanho // args.paginas:>10} {ms:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+# cache_parse.py
+#
+# Cache dos registros extraídos de uma exportação, endereçado pelo conteúdo: a
+# chave é o SHA-256 do arquivo mais a versão do parser (registro_apac.VERSAO_PARSER).
+# Desligado por padrão (as entradas têm dados de pacientes): liga-se com
+# cache_parse=True em gerar_apacs_de_arquivo, --cache-parse na linha de comando
+# ou a opção correspondente na janela.
+# Carregar de novo a mesma exportação (para a outra especialidade, ou para
+# reimprimir depois de corrigir medicos.csv) pula a leitura dos blocos e o parse
+# e vai direto para a validação, as consultas e o render.
+#
+# Só entra no cache o que vem do bloco: nomes e descrições das tabelas de
+# consulta e o CNES solicitante (que depende de estabelecimentos.csv) são
+# recalculados a cada execução, então corrigir um CSV não exige limpar o cache.
+#
+# Cada entrada é um arquivo <sha256>.p<versão>.apc em ~/.solicitador_apac/cache_parse/:
+#   cabeçalho: MAGICO | versão do formato (u16) | versão do parser (u16) | registros (u32) | lotes (u32)
+#   lotes:     tamanho (u32) + zlib(marshal(tupla de registros)), cada registro
+#              uma tupla com os CAMPOS_CACHE
+# A pasta (0700) e as entradas (0600) só são acessíveis ao usuário. Entradas
+# com mais de IDADE_MAXIMA segundos desde a gravação (mtime) são apagadas na
+# próxima leitura ou gravação, e ao passar do tamanho máximo saem as usadas há
+# mais tempo (atime, atualizado a cada leitura sem mexer no mtime).
+
+import io
+import os
+import sys
+import time
+import zlib
+import struct
+import marshal
+import hashlib
+import operator
+
+from utils import LinhaProcedimento, cnes_solicitante, cnes_terceiro, criar_pasta_privada, ler_blocos_bdsia
+from registro_apac import CAMPOS_REGISTRO, CAMPOS_VARIAVEIS, VERSAO_PARSER, RegistroAPAC, internar_procedimentos
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+# Pasta do cache (padrão: ~/.solicitador_apac/cache_parse)
+VARIAVEL_AMBIENTE = "APAC_CACHE_PARSE"
+NOME_PASTA_PADRAO = "cache_parse"
+
+# Tamanho máximo da pasta do cache, somando todas as entradas
+TAMANHO_MAXIMO = 256 * 1024 * 1024
+
+# Idade máxima (s) de uma entrada, contada da gravação
+IDADE_MAXIMA = 7 * 24 * 3600
+
+# Permissões das entradas (ignoradas no Windows); a pasta é criada com utils.criar_pasta_privada
+MODO_ENTRADA = 0o600
+
+MAGICO = b"APACPRS\x00"
+VERSAO_FORMATO = 1
+_CABECALHO = struct.Struct("<8sHHII")
+_TAMANHO_LOTE = struct.Struct("<I")
+EXTENSAO = ".apc"
+
+# Registros comprimidos juntos em cada lote (a gravação e a leitura andam lote a lote)
+REGISTROS_POR_LOTE = 4096
+NIVEL_COMPRESSAO = 1
+
+# Campos guardados de cada registro; CNES_SOLICITANTE sai de PROCEDIMENTOS e
+# CNES_ESTABELECIMENTO na leitura, e os campos complementares vêm das consultas
+CAMPOS_CACHE = CAMPOS_VARIAVEIS + ("PROC_PRINCIPAL_COD", "HASH_BLOCO", "PROCEDIMENTOS")
+_POSICAO_PROCEDIMENTOS = CAMPOS_CACHE.index("PROCEDIMENTOS")
+_CAMPOS_VAZIOS = tuple(campo for campo in CAMPOS_REGISTRO if campo not in CAMPOS_CACHE and campo != "CNES_SOLICITANTE")
+
+def pasta_cache_padrao():
+    """APAC_CACHE_PARSE, se definida, ou ~/.solicitador_apac/cache_parse."""
+    return os.environ.get(VARIAVEL_AMBIENTE) or os.path.join(
+        os.path.expanduser("~"), ".solicitador_apac", NOME_PASTA_PADRAO
+    )
+
+TAMANHO_LEITURA_HASH = 1024 * 1024
+
+def hash_arquivo(caminho):
+    """SHA-256 (hex) do conteúdo do arquivo."""
+    soma = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for trecho in iter(lambda: f.read(TAMANHO_LEITURA_HASH), b""):
+            soma.update(trecho)
+    return soma.hexdigest()
+
+class _LeituraComHash(io.RawIOBase):
+    """Arquivo binário que soma ao hash cada byte lido."""
+
+    def __init__(self, arquivo, soma):
+        self._arquivo = arquivo
+        self._soma = soma
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        lidos = self._arquivo.readinto(destino)
+        if lidos:
+            self._soma.update(memoryview(destino)[:lidos])
+        return lidos
+
+    def close(self):
+        self._arquivo.close()
+        super().close()
+
+# ==============================================================================
+# REGISTROS <-> TUPLAS
+# ==============================================================================
+
+_campos_cache = operator.attrgetter(*CAMPOS_CACHE)
+
+def _registro(estado):
+    # Os valores já são str e o marshal devolve internados os que foram gravados
+    # internados, então os campos são atribuídos direto, sem RegistroAPAC.definir
+    registro = RegistroAPAC.__new__(RegistroAPAC)
+    for campo, valor in zip(CAMPOS_CACHE, estado):
+        setattr(registro, campo, valor)
+    for campo in _CAMPOS_VAZIOS:
+        setattr(registro, campo, "")
+    linhas = internar_procedimentos(LinhaProcedimento(*linha) for linha in estado[_POSICAO_PROCEDIMENTOS])
+    registro.PROCEDIMENTOS = linhas
+    registro.CNES_SOLICITANTE = sys.intern(cnes_solicitante(cnes_terceiro(linhas), registro.CNES_ESTABELECIMENTO))
+    return registro
+
+# ==============================================================================
+# CACHE
+# ==============================================================================
+
+class CacheParse:
+    """Pasta de entradas do cache, limitada a tamanho_maximo bytes (LRU pelo atime)
+    e a entradas gravadas há até idade_maxima segundos."""
+
+    def __init__(self, pasta=None, tamanho_maximo=TAMANHO_MAXIMO, idade_maxima=IDADE_MAXIMA):
+        self.pasta = pasta or pasta_cache_padrao()
+        self.tamanho_maximo = tamanho_maximo
+        self.idade_maxima = idade_maxima
+
+    def _expirada(self, mtime):
+        return time.time() - mtime > self.idade_maxima
+
+    def caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.p{VERSAO_PARSER}{EXTENSAO}")
+
+    def ler(self, chave):
+        """(total de registros, lotes comprimidos) da entrada, ou None se ela não existir ou não servir.
+
+        Os lotes ficam comprimidos na memória e só são abertos quando lidos.
+        """
+        caminho = self.caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                info = os.fstat(f.fileno())
+                dados = b"" if self._expirada(info.st_mtime) else f.read()
+        except OSError:
+            return None
+        lotes = self._separar_lotes(dados)
+        if lotes is None:
+            # Entrada vencida, truncada ou de outra versão: não volta a ser lida
+            self._remover(caminho)
+            return None
+        try:
+            # Marca o uso para o LRU; o mtime (hora da gravação) continua valendo para a idade
+            os.utime(caminho, ns=(time.time_ns(), info.st_mtime_ns))
+        except OSError:
+            pass
+        return lotes
+
+    def _separar_lotes(self, dados):
+        if len(dados) < _CABECALHO.size:
+            return None
+        magico, formato, parser, total, quantidade = _CABECALHO.unpack_from(dados)
+        if magico != MAGICO or formato != VERSAO_FORMATO or parser != VERSAO_PARSER:
+            return None
+        lotes = []
+        posicao = _CABECALHO.size
+        for _ in range(quantidade):
+            if posicao + _TAMANHO_LOTE.size > len(dados):
+                return None
+            (tamanho,) = _TAMANHO_LOTE.unpack_from(dados, posicao)
+            posicao += _TAMANHO_LOTE.size
+            lotes.append(memoryview(dados)[posicao:posicao + tamanho])
+            posicao += tamanho
+        if posicao != len(dados):
+            return None
+        return total, lotes
+
+    def gravador(self, chave):
+        return _GravadorEntrada(self, chave)
+
+    def liberar_espaco(self, manter=None):
+        """Remove as entradas vencidas e, das demais, as usadas há mais tempo até a pasta caber em tamanho_maximo."""
+        entradas = []
+        try:
+            with os.scandir(self.pasta) as iterador:
+                for entrada in iterador:
+                    if not (entrada.name.endswith(EXTENSAO) and entrada.is_file()):
+                        continue
+                    info = entrada.stat()
+                    if self._expirada(info.st_mtime) and entrada.path != manter:
+                        self._remover(entrada.path)
+                    else:
+                        entradas.append((info.st_atime_ns, info.st_size, entrada.path))
+        except OSError:
+            return
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= self.tamanho_maximo:
+                break
+            if caminho != manter:
+                self._remover(caminho)
+                total -= tamanho
+
+    @staticmethod
+    def _remover(caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+class _GravadorEntrada:
+    """Grava a entrada à medida que os registros são extraídos, num arquivo temporário
+    que só vira a entrada em concluir(); descartar() apaga o que foi gravado."""
+
+    def __init__(self, cache, chave):
+        self.cache = cache
+        self.destino = cache.caminho(chave)
+        self.total = 0
+        self.tamanho = 0
+        self._lotes = 0
+        self._pendentes = []
+        # Tabelas de procedimentos já convertidas para tuplas simples (o marshal
+        # não aceita a namedtuple); a mesma tabela vira o mesmo objeto no lote
+        self._procedimentos = {}
+        self._arquivo = None
+        self._temporario = f"{self.destino}.{os.getpid()}.{id(self)}.tmp"
+        try:
+            criar_pasta_privada(cache.pasta)
+            descritor = os.open(self._temporario, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+                                MODO_ENTRADA)
+            self._arquivo = os.fdopen(descritor, "wb")
+            self._arquivo.write(_CABECALHO.pack(MAGICO, VERSAO_FORMATO, VERSAO_PARSER, 0, 0))
+        except OSError:
+            self.descartar()
+
+    def adicionar(self, registro):
+        if self._arquivo is None:
+            return
+        estado = list(_campos_cache(registro))
+        linhas = estado[_POSICAO_PROCEDIMENTOS]
+        simples = self._procedimentos.get(linhas)
+        if simples is None:
+            simples = self._procedimentos[linhas] = tuple(tuple(linha) for linha in linhas)
+        estado[_POSICAO_PROCEDIMENTOS] = simples
+        self._pendentes.append(tuple(estado))
+        self.total += 1
+        if len(self._pendentes) >= REGISTROS_POR_LOTE:
+            self._gravar_lote()
+
+    def _gravar_lote(self):
+        comprimido = zlib.compress(marshal.dumps(tuple(self._pendentes)), NIVEL_COMPRESSAO)
+        self._pendentes = []
+        try:
+            self._arquivo.write(_TAMANHO_LOTE.pack(len(comprimido)))
+            self._arquivo.write(comprimido)
+        except OSError:
+            self.descartar()
+            return
+        self._lotes += 1
+        self.tamanho += _TAMANHO_LOTE.size + len(comprimido)
+        # Uma exportação que sozinha passa do limite não é guardada
+        if self.tamanho > self.cache.tamanho_maximo:
+            self.descartar()
+
+    def concluir(self, chave=None):
+        """Publica a entrada (troca atômica) e libera espaço; retorna False se ela não foi gravada.
+
+        chave, se informada, substitui a da criação (a do conteúdo efetivamente lido).
+        """
+        if self._arquivo is None:
+            return False
+        if chave is not None:
+            self.destino = self.cache.caminho(chave)
+        if self._pendentes:
+            self._gravar_lote()
+            if self._arquivo is None:
+                return False
+        try:
+            self._arquivo.seek(0)
+            self._arquivo.write(_CABECALHO.pack(MAGICO, VERSAO_FORMATO, VERSAO_PARSER, self.total, self._lotes))
+            self._arquivo.close()
+            self._arquivo = None
+            os.replace(self._temporario, self.destino)
+        except OSError:
+            self.descartar()
+            return False
+        self.cache.liberar_espaco(manter=self.destino)
+        return True
+
+    def descartar(self):
+        if self._arquivo is not None:
+            try:
+                self._arquivo.close()
+            except OSError:
+                pass
+            self._arquivo = None
+        self._pendentes = []
+        CacheParse._remover(self._temporario)
+
+# ==============================================================================
+# ENTRADA DE UMA EXECUÇÃO
+# ==============================================================================
+
+class EntradaCacheParse:
+    """Os registros de uma exportação numa execução da geração.
+
+    Com acerto, registros() os refaz a partir do cache; sem acerto, blocos()
+    lê o arquivo somando ao hash os mesmos bytes que vão para o parse, anotar()
+    repassa os registros extraídos gravando-os, e concluir() publica a entrada
+    com a chave desse hash quando a execução termina bem (descartar() em erro
+    ou cancelamento). Assim, um arquivo alterado depois da consulta ao cache não
+    fica guardado com a chave do conteúdo anterior.
+    """
+
+    def __init__(self, cache, caminho_arquivo):
+        self.chave = hash_arquivo(caminho_arquivo)
+        conteudo = cache.ler(self.chave)
+        self.acerto = conteudo is not None
+        self.total, self._lotes = conteudo if self.acerto else (0, ())
+        self._gravador = None if self.acerto else cache.gravador(self.chave)
+        self._chave_lida = None
+        self.gravada = False
+
+    def blocos(self, caminho_arquivo):
+        """Gera os blocos do arquivo (como utils.abrir_blocos_bdsia), calculando o hash do que foi lido."""
+        soma = hashlib.sha256()
+        with io.TextIOWrapper(io.BufferedReader(_LeituraComHash(open(caminho_arquivo, "rb", buffering=0), soma)),
+                              encoding="latin-1") as f:
+            yield from ler_blocos_bdsia(f)
+        self._chave_lida = soma.hexdigest()
+
+    def registros(self):
+        """Gera os RegistroAPAC guardados, na ordem do arquivo (novos a cada chamada)."""
+        for lote in self._lotes:
+            for estado in marshal.loads(zlib.decompress(lote)):
+                yield _registro(estado)
+
+    def anotar(self, itens):
+        """Repassa os (registro, motivos, ...) do parse, guardando cada registro antes das consultas."""
+        for item in itens:
+            if self._gravador is not None:
+                self._gravador.adicionar(item[0])
+            yield item
+
+    def concluir(self):
+        if self._gravador is not None:
+            if self._chave_lida is None:
+                # O arquivo não foi lido até o fim por blocos(): nada a publicar
+                self.descartar()
+                return
+            self.chave = self._chave_lida
+            self.total = self._gravador.total
+            self.gravada = self._gravador.concluir(self.chave)
+            self._gravador = None
+
+    def descartar(self):
+        if self._gravador is not None:
+            self._gravador.descartar()
+            self._gravador = None
+
+    def estatisticas(self):
+        return {"chave": self.chave, "acerto": self.acerto, "registros": self.total, "gravada": self.gravada}
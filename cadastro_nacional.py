@@ -0,0 +1,243 @@
+# cadastro_nacional.py
+#
+# Cadastro local (SQLite) de profissionais e estabelecimentos, importado dos
+# extratos oficiais do CNES (milhões de linhas). As consultas vão direto ao índice
+# do banco, com um cache LRU pequeno na frente, sem carregar a base na memória.
+# É consultado quando medicos.csv / estabelecimentos.csv não resolvem o código.
+
+import os
+import csv
+import time
+import pathlib
+import sqlite3
+import functools
+import itertools
+import threading
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+NOME_CADASTRO_PADRAO = "cadastro_nacional.sqlite3"
+
+# Caminho alternativo do banco (ex.: uma cópia compartilhada na rede)
+VARIAVEL_AMBIENTE = "APAC_CADASTRO"
+
+# Linhas por transação na importação
+LINHAS_POR_LOTE = 50_000
+
+# Consultas guardadas no cache LRU de cada tabela (inclui as não encontradas)
+TAMANHO_CACHE = 4096
+
+# Intervalo mínimo (s) entre duas verificações da existência do banco
+INTERVALO_VERIFICACAO = 5.0
+
+# Colunas aceitas em cada extrato, da preferida para a alternativa:
+# nomes dos arquivos do CNES (tbDadosProfissionalSus, tbEstabelecimento) e dos CSVs locais
+COLUNAS_PROFISSIONAIS = {
+    "cartao_sus": ("CO_CNS", "cartao_sus", "CNS"),
+    "nome_completo": ("NO_PROFISSIONAL", "nome_completo", "NOME"),
+}
+COLUNAS_ESTABELECIMENTOS = {
+    "cod_solicitante": ("CO_CNES", "cod_solicitante", "CNES"),
+    "desc_solicitante": ("NO_FANTASIA", "desc_solicitante", "NO_RAZAO_SOCIAL"),
+}
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS profissionais (
+    cartao_sus TEXT PRIMARY KEY,
+    nome_completo TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS estabelecimentos (
+    cod_solicitante TEXT PRIMARY KEY,
+    desc_solicitante TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS importacoes (
+    tabela TEXT NOT NULL,
+    arquivo TEXT NOT NULL,
+    linhas INTEGER NOT NULL,
+    importado_em TEXT NOT NULL
+);
+"""
+
+def caminho_cadastro_padrao():
+    """APAC_CADASTRO, se definida, ou ~/.solicitador_apac/cadastro_nacional.sqlite3."""
+    return os.environ.get(VARIAVEL_AMBIENTE) or os.path.join(
+        os.path.expanduser("~"), ".solicitador_apac", NOME_CADASTRO_PADRAO
+    )
+
+def somente_digitos(valor):
+    """CNS e CNES são comparados só pelos dígitos ("702 1027 6175 0292" = "702102761750292")."""
+    if valor is None:
+        return ""
+    return "".join(c for c in str(valor) if c.isdigit())
+
+# ==============================================================================
+# IMPORTAÇÃO
+# ==============================================================================
+
+def _abrir_para_escrita(caminho):
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    conexao = sqlite3.connect(caminho)
+    # Sem WAL: o cadastro é aberto só para leitura (mode=ro), inclusive em pastas sem escrita.
+    # Uma importação interrompida é simplesmente refeita; não precisa de fsync a cada lote
+    conexao.execute("PRAGMA synchronous=OFF")
+    conexao.executescript(_ESQUEMA)
+    return conexao
+
+def _colunas(cabecalho, aceitas, caminho_csv):
+    """Posição no cabeçalho de cada coluna do banco, pelo primeiro nome aceito presente."""
+    normalizado = [coluna.strip().strip('"').upper() for coluna in cabecalho]
+    posicoes = []
+    for coluna_banco, nomes in aceitas.items():
+        for nome in nomes:
+            if nome.upper() in normalizado:
+                posicoes.append(normalizado.index(nome.upper()))
+                break
+        else:
+            raise ValueError(f"Coluna '{coluna_banco}' não encontrada em {caminho_csv} (aceitas: {', '.join(nomes)})")
+    return posicoes
+
+def _linhas_extrato(leitor, posicao_chave, posicao_valor):
+    for linha in leitor:
+        try:
+            chave, valor = somente_digitos(linha[posicao_chave]), linha[posicao_valor].strip()
+        except IndexError:
+            continue
+        if chave and valor:
+            yield chave, valor
+
+def importar_extrato(caminho_banco, tabela, caminho_csv, encoding="latin-1", delimitador=";", substituir=True,
+                     progresso=None):
+    """Importa um extrato CSV para a tabela "profissionais" ou "estabelecimentos" do cadastro.
+
+    O arquivo é lido em fluxo e gravado em transações de LINHAS_POR_LOTE linhas.
+    Com substituir, o conteúdo anterior da tabela é apagado antes (extrato novo
+    do mês); senão as linhas são acrescentadas. Em ambos os casos vale a primeira
+    ocorrência de cada código, como nos CSVs locais. progresso(linhas), se
+    informado, é chamado a cada lote. Retorna o número de linhas lidas.
+    """
+    if tabela == "profissionais":
+        aceitas = COLUNAS_PROFISSIONAIS
+    elif tabela == "estabelecimentos":
+        aceitas = COLUNAS_ESTABELECIMENTOS
+    else:
+        raise ValueError(f"Tabela desconhecida: {tabela}")
+    coluna_chave, coluna_valor = aceitas
+
+    conexao = _abrir_para_escrita(caminho_banco)
+    try:
+        with open(caminho_csv, encoding=encoding, newline="") as f:
+            leitor = csv.reader(f, delimiter=delimitador)
+            posicao_chave, posicao_valor = _colunas(next(leitor, []), aceitas, caminho_csv)
+            linhas = _linhas_extrato(leitor, posicao_chave, posicao_valor)
+            sql = f"INSERT OR IGNORE INTO {tabela} ({coluna_chave}, {coluna_valor}) VALUES (?, ?)"
+            if substituir:
+                with conexao:
+                    conexao.execute(f"DELETE FROM {tabela}")
+            total = 0
+            while True:
+                lote = list(itertools.islice(linhas, LINHAS_POR_LOTE))
+                if not lote:
+                    break
+                with conexao:
+                    conexao.executemany(sql, lote)
+                total += len(lote)
+                if progresso:
+                    progresso(total)
+        with conexao:
+            conexao.execute(
+                "INSERT INTO importacoes VALUES (?, ?, ?, datetime('now', 'localtime'))",
+                (tabela, os.path.abspath(caminho_csv), total),
+            )
+        conexao.execute("PRAGMA optimize")
+    finally:
+        conexao.close()
+    return total
+
+# ==============================================================================
+# CONSULTA
+# ==============================================================================
+
+class CadastroNacional:
+    """Consultas ao cadastro SQLite (somente leitura), com cache LRU por tabela.
+
+    Pode ser usado por várias threads; cada processo abre a sua conexão.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        # Somente leitura: a geração nunca altera o cadastro, e o arquivo pode estar numa pasta compartilhada
+        uri = pathlib.Path(os.path.abspath(caminho)).as_uri() + "?mode=ro"
+        self._conexao = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.nome_profissional = functools.lru_cache(maxsize=TAMANHO_CACHE)(self._nome_profissional)
+        self.descricao_estabelecimento = functools.lru_cache(maxsize=TAMANHO_CACHE)(self._descricao_estabelecimento)
+
+    def _consultar(self, sql, chave):
+        chave = somente_digitos(chave)
+        if not chave:
+            return None
+        try:
+            with self._lock:
+                linha = self._conexao.execute(sql, (chave,)).fetchone()
+        except sqlite3.Error:
+            # Banco sem a tabela (nada importado ainda) ou corrompido: trata como não encontrado
+            linha = None
+        if linha is None:
+            self.falhas += 1
+            return None
+        self.acertos += 1
+        return linha[0]
+
+    def _nome_profissional(self, cartao_sus):
+        return self._consultar("SELECT nome_completo FROM profissionais WHERE cartao_sus = ?", cartao_sus)
+
+    def _descricao_estabelecimento(self, cnes):
+        return self._consultar("SELECT desc_solicitante FROM estabelecimentos WHERE cod_solicitante = ?", cnes)
+
+    def estatisticas(self):
+        """Mesmo formato das estatísticas das tabelas CSV, com os acertos do cache LRU."""
+        cache = self.nome_profissional.cache_info()
+        cache_estabelecimentos = self.descricao_estabelecimento.cache_info()
+        return {
+            "arquivo": self.caminho,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "acertos_cache": cache.hits + cache_estabelecimentos.hits,
+        }
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+_cadastro = None
+_pid_cadastro = None
+_ultima_verificacao = None
+_lock_cadastro = threading.Lock()
+
+def cadastro_padrao():
+    """CadastroNacional do caminho padrão, aberto uma vez por processo; None se o banco não existir."""
+    global _cadastro, _pid_cadastro, _ultima_verificacao
+    # Conexões SQLite não sobrevivem a um fork: cada processo (ex.: do pool do lote) abre a sua
+    if _cadastro is not None and _pid_cadastro == os.getpid():
+        return _cadastro
+    agora = time.monotonic()
+    if (_pid_cadastro == os.getpid() and _ultima_verificacao is not None
+            and agora - _ultima_verificacao < INTERVALO_VERIFICACAO):
+        return None
+    with _lock_cadastro:
+        if _cadastro is not None and _pid_cadastro == os.getpid():
+            return _cadastro
+        _ultima_verificacao = agora
+        _pid_cadastro = os.getpid()
+        caminho = caminho_cadastro_padrao()
+        _cadastro = None
+        if os.path.exists(caminho):
+            try:
+                _cadastro = CadastroNacional(caminho)
+            except sqlite3.Error as e:
+                print(f"ERRO ao abrir o cadastro nacional '{caminho}': {e}")
+        return _cadastro
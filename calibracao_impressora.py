@@ -0,0 +1,93 @@
+# calibracao_impressora.py
+#
+# Impressão sobre o formulário de APAC pré-impresso: perfis de calibração por
+# impressora (deslocamento e escala, em mm) e a página de alinhamento usada para
+# acertá-los. Os perfis ficam num JSON:
+#
+#   {"sala_impressao_1": {"deslocamento_x": 1.5, "deslocamento_y": -0.8,
+#                         "escala_x": 1.0, "escala_y": 0.997}}
+
+import os
+import json
+
+from utils import CALIBRACAO_NEUTRA, APAC_PDF, ErroGeracaoAPAC
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+NOME_PERFIS_PADRAO = "impressoras.json"
+
+# Caminho alternativo dos perfis (ex.: um arquivo compartilhado pela sala de impressão)
+VARIAVEL_AMBIENTE = "APAC_IMPRESSORAS"
+
+def caminho_perfis_padrao():
+    """APAC_IMPRESSORAS, se definida, ou ~/.solicitador_apac/impressoras.json."""
+    return os.environ.get(VARIAVEL_AMBIENTE) or os.path.join(
+        os.path.expanduser("~"), ".solicitador_apac", NOME_PERFIS_PADRAO
+    )
+
+# ==============================================================================
+# PERFIS
+# ==============================================================================
+
+def carregar_perfis(caminho=None):
+    """{impressora: calibração} do arquivo de perfis; vazio se ele não existir."""
+    caminho = caminho or caminho_perfis_padrao()
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            perfis = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        raise ErroGeracaoAPAC(f"Não foi possível ler os perfis de impressora '{caminho}': {e}") from e
+    if not isinstance(perfis, dict):
+        raise ErroGeracaoAPAC(f"Perfis de impressora inválidos em '{caminho}'.")
+    return perfis
+
+def calibracao_da_impressora(impressora, caminho=None):
+    """Calibração completa (valores ausentes = neutros) da impressora; ErroGeracaoAPAC se não houver perfil."""
+    perfis = carregar_perfis(caminho)
+    if impressora not in perfis:
+        disponiveis = ", ".join(sorted(perfis)) or "nenhum"
+        raise ErroGeracaoAPAC(f"Impressora sem perfil de calibração: {impressora} (perfis: {disponiveis})")
+    perfil = perfis[impressora]
+    try:
+        return {chave: float(perfil.get(chave, neutro)) for chave, neutro in CALIBRACAO_NEUTRA.items()}
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ErroGeracaoAPAC(f"Perfil de calibração inválido para {impressora}: {e}") from e
+
+def salvar_calibracao(impressora, calibracao, caminho=None):
+    """Cria ou atualiza o perfil da impressora (só as chaves informadas); retorna o perfil gravado."""
+    caminho = caminho or caminho_perfis_padrao()
+    perfis = carregar_perfis(caminho)
+    perfil = {**CALIBRACAO_NEUTRA, **perfis.get(impressora, {})}
+    perfil.update((chave, float(valor)) for chave, valor in calibracao.items() if valor is not None)
+    perfis[impressora] = perfil
+
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(perfis, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temporario, caminho)
+    return perfil
+
+# ==============================================================================
+# PÁGINA DE ALINHAMENTO
+# ==============================================================================
+
+def gerar_pagina_alinhamento(destino, impressora=None, calibracao=None, com_fundo=False, caminho_perfis=None):
+    """Grava em destino a página de alinhamento com a calibração da impressora (ou a informada).
+
+    Sem com_fundo a página sai como será impressa sobre o formulário; com ele, o
+    template aparece por baixo, para conferir na tela. Retorna a calibração usada.
+    """
+    if calibracao is None:
+        calibracao = calibracao_da_impressora(impressora, caminho_perfis) if impressora else dict(CALIBRACAO_NEUTRA)
+    titulo = f"Página de alinhamento - {impressora}" if impressora else "Página de alinhamento"
+    pdf = APAC_PDF(orientacao='P', sobreposicao=not com_fundo, calibracao=calibracao)
+    pdf.add_pagina_alinhamento(titulo)
+    pasta = os.path.dirname(os.path.abspath(destino))
+    os.makedirs(pasta, exist_ok=True)
+    pdf.output(destino)
+    return calibracao
@@ -0,0 +1,114 @@
+# diario_apac.py
+#
+# Diário persistente das APACs já emitidas (SQLite), para retomar execuções
+# interrompidas e não reimprimir APACs de exportações que se sobrepõem.
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from utils import ErroGeracaoAPAC
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+NOME_DIARIO_PADRAO = "diario_apac.sqlite3"
+
+# retomar: pula a APAC se o mesmo bloco (número + conteúdo) já foi emitido;
+#          um bloco alterado na exportação é emitido de novo.
+# pular:   pula a APAC se o número já foi emitido, qualquer que seja o conteúdo.
+# forcar:  emite tudo e apenas atualiza o diário.
+MODOS_DIARIO = ("retomar", "pular", "forcar")
+MODO_DIARIO_PADRAO = "retomar"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS apacs_emitidas (
+    numero_apac TEXT NOT NULL,
+    hash_bloco TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    arquivo_saida TEXT NOT NULL,
+    emitida_em TEXT NOT NULL,
+    PRIMARY KEY (numero_apac, hash_bloco)
+) WITHOUT ROWID;
+"""
+
+def caminho_diario_padrao():
+    """Diário usado pela interface: ~/.solicitador_apac/diario_apac.sqlite3."""
+    return os.path.join(os.path.expanduser("~"), ".solicitador_apac", NOME_DIARIO_PADRAO)
+
+# ==============================================================================
+# DIÁRIO
+# ==============================================================================
+
+class DiarioAPAC:
+    """Registro em disco das APACs já renderizadas, indexado por (NUMERO_APAC, hash do bloco).
+
+    As APACs só entram no diário depois que o PDF onde foram desenhadas é gravado
+    com sucesso; se a execução cair no meio, as que ficaram sem arquivo são
+    emitidas de novo na próxima. APACs repetidas dentro da mesma execução também
+    são puladas (exceto no modo forcar).
+    """
+
+    def __init__(self, caminho, modo=MODO_DIARIO_PADRAO):
+        if modo not in MODOS_DIARIO:
+            raise ErroGeracaoAPAC(f"Modo de diário desconhecido: {modo}")
+        self.caminho = caminho
+        self.modo = modo
+        pasta = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(pasta, exist_ok=True)
+        try:
+            # A geração roda numa thread separada da que abriu o diário (GUI)
+            self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.executescript(_ESQUEMA)
+        except sqlite3.Error as e:
+            raise ErroGeracaoAPAC(f"Não foi possível abrir o diário de APACs '{caminho}': {e}") from e
+        self._lock = threading.Lock()
+        self._nesta_execucao = set()
+        self.puladas = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        with self._lock:
+            if self._conexao is not None:
+                self._conexao.close()
+                self._conexao = None
+
+    def _ja_emitida(self, numero_apac, hash_bloco):
+        if self.modo == "pular" and numero_apac:
+            sql, parametros = "SELECT 1 FROM apacs_emitidas WHERE numero_apac = ? LIMIT 1", (numero_apac,)
+        else:
+            sql, parametros = "SELECT 1 FROM apacs_emitidas WHERE numero_apac = ? AND hash_bloco = ?", (numero_apac, hash_bloco)
+        with self._lock:
+            return self._conexao.execute(sql, parametros).fetchone() is not None
+
+    def deve_pular(self, registro):
+        """Indica se a APAC já foi emitida (neste diário ou nesta execução) e deve ser pulada."""
+        if self.modo == "forcar":
+            return False
+        chave = registro.NUMERO_APAC if self.modo == "pular" and registro.NUMERO_APAC else (registro.NUMERO_APAC, registro.HASH_BLOCO)
+        if chave in self._nesta_execucao or self._ja_emitida(registro.NUMERO_APAC, registro.HASH_BLOCO):
+            self.puladas += 1
+            return True
+        self._nesta_execucao.add(chave)
+        return False
+
+    def registrar(self, chaves, tipo, arquivo_saida):
+        """Grava, numa única transação, as (NUMERO_APAC, hash) desenhadas em arquivo_saida."""
+        emitida_em = datetime.now().isoformat(timespec="seconds")
+        linhas = [(numero, hash_bloco, tipo, arquivo_saida, emitida_em) for numero, hash_bloco in chaves]
+        with self._lock, self._conexao:
+            self._conexao.executemany("INSERT OR REPLACE INTO apacs_emitidas VALUES (?, ?, ?, ?, ?)", linhas)
+
+    def estatisticas(self):
+        with self._lock:
+            total, = self._conexao.execute("SELECT COUNT(*) FROM apacs_emitidas").fetchone()
+        return {"caminho": self.caminho, "modo": self.modo, "registradas": total, "puladas": self.puladas}
@@ -0,0 +1,224 @@
+# escrita_pdf.py
+#
+# Gravação incremental dos PDFs: as páginas vão para disco em partes à medida que
+# são desenhadas, em vez de ficarem todas em memória até o fim da execução.
+
+import gc
+import os
+import collections
+
+from utils import APAC_PDF
+from instrumentacao import INSTRUMENTACAO_DESLIGADA
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+# Limites de cada parte; ao atingir qualquer um, a parte é gravada e outra começa.
+# None desliga o limite correspondente. Por padrão só o limite de bytes vale:
+# cada saída continua um arquivo só, a não ser que passe dele.
+PAGINAS_POR_PARTE = None
+BYTES_POR_PARTE = 200 * 1024 * 1024  # estimativa pelo fluxo de conteúdo das páginas + imagens
+
+# Soma das partes abertas de todas as saídas de uma execução (uma por CNES na
+# oftalmologia); acima disso a parte da saída parada há mais tempo é gravada
+BYTES_EM_MEMORIA = 256 * 1024 * 1024
+
+def nome_parte(caminho_base, numero):
+    """apac_x.pdf -> apac_x_parte001.pdf"""
+    raiz, extensao = os.path.splitext(caminho_base)
+    return f"{raiz}_parte{numero:03d}{extensao}"
+
+def dividir_em_partes(caminho_base, paginas, paginas_por_parte=PAGINAS_POR_PARTE):
+    """Divide as páginas de uma saída em {caminho da parte: fatia}, com a mesma nomenclatura do EscritorPDF."""
+    if not paginas_por_parte or len(paginas) <= paginas_por_parte:
+        return {caminho_base: paginas}
+    return {
+        nome_parte(caminho_base, numero): paginas[inicio:inicio + paginas_por_parte]
+        for numero, inicio in enumerate(range(0, len(paginas), paginas_por_parte), start=1)
+    }
+
+# ==============================================================================
+# ESCRITOR
+# ==============================================================================
+
+class EscritorPDF:
+    """Recebe as páginas de um arquivo de saída e grava em partes de tamanho limitado.
+
+    Se tudo couber em uma parte, o arquivo sai com o nome de caminho_base, como
+    antes; senão as partes são apac_x_parte001.pdf, apac_x_parte002.pdf...
+
+    ao_gravar(caminho, chaves), se informado, é chamado depois que cada parte é
+    gravada com sucesso, com as chaves passadas em adicionar() para as páginas
+    dela (usado pelo diário de APACs emitidas). Falhas de gravação ficam em
+    falhas, e as páginas da parte que falhou são perdidas.
+
+    instrumentacao, se informada, recebe os tempos de render e de gravação.
+
+    limite (LimiteMemoriaPartes), compartilhado entre os escritores de uma
+    execução, grava a parte de quem está parado há mais tempo quando as partes
+    abertas de todos juntos passam do limite; a saída dele ganha uma parte a mais.
+
+    gravador (pipeline.Gravador), se informado, grava as partes em segundo
+    plano enquanto as próximas páginas são desenhadas. Os resultados são
+    recolhidos nesta thread, na ordem das partes: partes, falhas e ao_gravar
+    ficam iguais aos da gravação síncrona, só que conhecidos um pouco depois
+    (todos, com certeza, ao final de fechar()).
+    """
+
+    def __init__(self, caminho_base, paginas_por_parte=PAGINAS_POR_PARTE, bytes_por_parte=BYTES_POR_PARTE,
+                 opcoes_pdf=None, ao_gravar=None, instrumentacao=None, gravador=None, limite=None):
+        self.caminho_base = caminho_base
+        self.paginas_por_parte = paginas_por_parte
+        self.bytes_por_parte = bytes_por_parte
+        self.opcoes_pdf = opcoes_pdf or {}
+        self.ao_gravar = ao_gravar
+        self.instrumentacao = instrumentacao or INSTRUMENTACAO_DESLIGADA
+        self.gravador = gravador
+        self.limite = limite
+        self.partes = []
+        self.falhas = []
+        self.paginas = 0
+        self._pdf = None
+        self._chaves = []
+        self._paginas_parte = 0
+        self._bytes_parte = 0
+        self._numero_parte = 0
+        self._pendentes = []
+
+    def adicionar(self, data, fixos=None, chave=None):
+        """Desenha uma página; grava a parte atual antes, se ela já atingiu o limite."""
+        if self._pdf is not None and self._parte_cheia():
+            self._gravar_parte(nome_parte(self.caminho_base, self._numero_parte + 1))
+        if self._pendentes:
+            self._recolher(esperar=False)
+
+        if self._pdf is None:
+            self._pdf = APAC_PDF(orientacao='P', **self.opcoes_pdf)
+
+        with self.instrumentacao.etapa("render"):
+            self._pdf.add_apac_page(data, fixos=fixos)
+        if not self._paginas_parte:
+            # O template entra uma vez em cada parte
+            self._bytes_parte = self._tamanho_template()
+        self._bytes_parte += len(self._pdf.pages[self._pdf.page].contents)
+        self._paginas_parte += 1
+        self.paginas += 1
+        if chave is not None:
+            self._chaves.append(chave)
+        if self.limite is not None:
+            self.limite.usar(self)
+
+    @property
+    def bytes_em_memoria(self):
+        """Estimativa da parte aberta (0 se não houver)."""
+        return self._bytes_parte if self._pdf is not None else 0
+
+    def liberar(self):
+        """Grava a parte aberta, se houver; as próximas páginas vão para a parte seguinte."""
+        if self._pdf is not None:
+            self._gravar_parte(nome_parte(self.caminho_base, self._numero_parte + 1))
+
+    def fechar(self, esperar=True):
+        """Grava a última parte e retorna a lista de arquivos gravados.
+
+        Com gravador e esperar=False, a última parte só é enviada; aguardar()
+        completa o fechamento (útil para enviar as partes de várias saídas antes
+        de esperar por qualquer uma delas).
+        """
+        if self._pdf is not None:
+            destino = self.caminho_base if not self._numero_parte else nome_parte(self.caminho_base, self._numero_parte + 1)
+            self._gravar_parte(destino)
+        if esperar:
+            self._recolher(esperar=True)
+        return self.partes
+
+    def aguardar(self):
+        """Espera as partes enviadas ao gravador e retorna a lista de arquivos gravados."""
+        self._recolher(esperar=True)
+        return self.partes
+
+    def _parte_cheia(self):
+        return ((self.paginas_por_parte and self._paginas_parte >= self.paginas_por_parte)
+                or (self.bytes_por_parte and self._bytes_parte >= self.bytes_por_parte))
+
+    def _tamanho_template(self):
+        try:
+            return os.path.getsize(self._pdf._template_path) if self._pdf._template_path else 0
+        except OSError:
+            return 0
+
+    def _gravar_parte(self, destino):
+        # A parte vai numa lista para que _gravar solte a última referência ao PDF
+        parte, chaves = [self._pdf], self._chaves
+        # Libera a parte antes de gravar a próxima: a memória fica limitada a uma
+        # parte por saída (mais as que esperam o gravador)
+        self._pdf, self._chaves = None, []
+        self._paginas_parte = self._bytes_parte = 0
+        self._numero_parte += 1
+        if self.gravador is None:
+            try:
+                self._gravar(parte, destino)
+            except Exception as e:
+                self._concluir(destino, chaves, e)
+            else:
+                self._concluir(destino, chaves, None)
+            return
+        self._pendentes.append((destino, chaves, self.gravador.enviar(self._gravar, parte, destino)))
+
+    def _gravar(self, parte, destino):
+        """Grava a parte (na thread do gravador, se houver um)."""
+        pdf = parte.pop()
+        try:
+            with self.instrumentacao.etapa("gravacao"):
+                pdf.output(destino)
+        finally:
+            # O FPDF tem referências circulares: sem coletar agora, a parte gravada
+            # continua na memória enquanto a próxima cresce
+            del pdf
+            gc.collect()
+
+    def _recolher(self, esperar):
+        """Conclui as partes já gravadas pelo gravador, em ordem; com esperar, todas."""
+        while self._pendentes:
+            destino, chaves, futuro = self._pendentes[0]
+            if not esperar and not futuro.done():
+                return
+            self._pendentes.pop(0)
+            self._concluir(destino, chaves, futuro.exception())
+
+    def _concluir(self, destino, chaves, erro):
+        if erro is not None:
+            self.falhas.append(f"Falha ao salvar {os.path.basename(destino)}: {erro}")
+            return
+        self.partes.append(destino)
+        if self.ao_gravar is not None:
+            self.ao_gravar(destino, chaves)
+
+class LimiteMemoriaPartes:
+    """Limita a soma das partes abertas de vários EscritorPDF (ver BYTES_EM_MEMORIA).
+
+    Os escritores ficam em ordem de uso; quando a soma passa de bytes_maximos,
+    as partes dos que estão parados há mais tempo são gravadas (liberar()) até
+    caber. Abaixo do limite nada muda: cada saída continua um arquivo só.
+    """
+
+    def __init__(self, bytes_maximos=BYTES_EM_MEMORIA):
+        self.bytes_maximos = bytes_maximos
+        self.liberadas = 0
+        self._escritores = collections.OrderedDict()
+
+    def usar(self, escritor):
+        """Marca o escritor como o último usado e libera os ociosos se o limite foi passado."""
+        self._escritores[escritor] = None
+        self._escritores.move_to_end(escritor)
+        if not self.bytes_maximos:
+            return
+        total = sum(e.bytes_em_memoria for e in self._escritores)
+        while total > self.bytes_maximos and len(self._escritores) > 1:
+            ocioso = next(iter(self._escritores))
+            del self._escritores[ocioso]
+            total -= ocioso.bytes_em_memoria
+            if ocioso.bytes_em_memoria:
+                ocioso.liberar()
+                self.liberadas += 1
@@ -0,0 +1,31 @@
+# especialidades.py
+#
+# Registro das especialidades de APAC. O módulo de cada gerador (e com ele o
+# fpdf e as tabelas) só é importado na primeira vez que o gerador é pedido.
+
+import importlib
+
+# ==============================================================================
+# REGISTRO
+# ==============================================================================
+
+# tipo -> (módulo, função geradora)
+ESPECIALIDADES = {
+    "oftalmologia": ("oftalmologia", "gerar_apac_oftalmologia"),
+    "risco_cirurgico": ("risco_cirurgico", "gerar_apac_risco_cirurgico"),
+}
+
+TIPOS_APAC = tuple(ESPECIALIDADES)
+
+_geradores = {}
+
+def obter_gerador(tipo):
+    """Retorna a função geradora do tipo (importando o módulo na primeira vez), ou None se o tipo não existir."""
+    gerador = _geradores.get(tipo)
+    if gerador is None:
+        entrada = ESPECIALIDADES.get(tipo)
+        if entrada is None:
+            return None
+        modulo, funcao = entrada
+        gerador = _geradores[tipo] = getattr(importlib.import_module(modulo), funcao)
+    return gerador
@@ -0,0 +1,275 @@
+# geracao_apac.py
+#
+# Fluxo de geração comum às especialidades: leitura e validação dos registros,
+# diário, escrita (ou render paralelo) dos PDFs, arquivos de erros e relatório.
+# Cada especialidade só diz como agrupar as páginas em PDFs e como completar
+# o registro (ver Especialidade).
+
+import os
+from datetime import datetime
+from utils import (
+    ErroGeracaoAPAC,
+    GeracaoCancelada,
+    pasta_saida_padrao,
+    verificar_cancelamento,
+)
+from validacao_apac import descrever_motivos, gravar_rejeitadas
+from instrumentacao import INSTRUMENTACAO_DESLIGADA
+from renderizacao_paralela import paralelismo_disponivel, renderizar_saidas
+from escrita_pdf import PAGINAS_POR_PARTE, EscritorPDF, LimiteMemoriaPartes, dividir_em_partes
+from relatorio_apac import RelatorioExecucao
+from pipeline import CONFIGURACAO_SERIAL, Pipeline
+
+# ==============================================================================
+# GANCHOS DA ESPECIALIDADE
+# ==============================================================================
+
+class RegistroRecusado(Exception):
+    """Registro válido que a especialidade não sabe desenhar; vai para o arquivo de erros."""
+
+    def __init__(self, mensagem, motivo):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.motivo = motivo
+
+class Especialidade:
+    """Ganchos de uma especialidade para gerar_apacs.
+
+    tipo vai para o resultado, o diário e o relatório; com gravar_contagem sai
+    também apac_contagem_<data>.txt.
+    """
+
+    tipo = None
+    gravar_contagem = False
+
+    def __init__(self, dados_fixos_genericos):
+        self.dados_fixos_genericos = dados_fixos_genericos
+
+    def enriquecer(self, registro):
+        """Completa o registro com as tabelas de consulta (estágio de enriquecimento do pipeline).
+
+        Só é chamado para os registros aprovados na validação; o retorno chega
+        a pagina() como enriquecido.
+        """
+        return None
+
+    def pagina(self, registro, enriquecido):
+        """(grupo, fixos, código do principal, nome do principal) da página do registro.
+
+        Cada grupo vira um PDF (ver caminho_saida); levanta RegistroRecusado
+        para deixar o registro de fora.
+        """
+        raise NotImplementedError
+
+    def caminho_saida(self, pasta, carimbo, grupo):
+        """Caminho do PDF de um grupo."""
+        raise NotImplementedError
+
+# ==============================================================================
+# GERAÇÃO
+# ==============================================================================
+
+def gerar_apacs(especialidade, blocos_apac, processos=1, pasta_saida=None, progresso=None, cancelar=None,
+                diario=None, instrumentacao=None, paginas_por_parte=PAGINAS_POR_PARTE, validar=True,
+                opcoes_pdf=None, pipeline=None):
+    """Gera as APACs da especialidade; blocos_apac pode ser uma lista ou um gerador (lido uma única vez).
+
+    Cada bloco é extraído uma única vez para um RegistroAPAC, reaproveitado pelo
+    render, pelo arquivo de erros e pelo relatório. Com processos > 1 (e pypdf
+    instalado) as páginas são renderizadas em paralelo.
+
+    progresso(blocos, paginas) é chamado a cada bloco e cancelar (threading.Event)
+    é verificado entre os blocos; ao ser acionado levanta GeracaoCancelada.
+
+    Cada grupo da especialidade tem o seu PDF (ver escrita_pdf.EscritorPDF),
+    que só vira ..._parte001.pdf etc. com paginas_por_parte (None = sem
+    limite) ou acima do limite de bytes. As partes abertas de todos os grupos
+    juntas ficam abaixo de escrita_pdf.BYTES_EM_MEMORIA: passando disso, a do
+    grupo parado há mais tempo é gravada.
+
+    diario (DiarioAPAC), se informado, pula as APACs já emitidas e registra as
+    novas depois que cada parte é gravada.
+
+    Com validar, os registros passam pela validação prévia (validacao_apac:
+    dígitos verificadores, datas e campos obrigatórios) antes de qualquer
+    trabalho de PDF; os reprovados vão para o arquivo de erros e para
+    apac_rejeitadas_<data>.csv.
+
+    opcoes_pdf são repassadas ao APAC_PDF; {"sobreposicao": True, "calibracao": ...}
+    gera só o texto, para imprimir sobre o formulário pré-impresso.
+
+    pipeline (pipeline.Pipeline), se informado, liga a leitura, o parse, as
+    consultas e a gravação das partes em estágios com filas limitadas, que
+    andam junto com o render; sem ele tudo roda nesta thread, um passo de cada vez.
+
+    instrumentacao (Instrumentacao), se informada, recebe os tempos de cada
+    etapa (leitura, parse, validacao, consultas, render, gravacao) e os contadores.
+
+    Retorna um dicionário com o resumo da execução; levanta ErroGeracaoAPAC se
+    nenhuma APAC for encontrada.
+    """
+    tipo = especialidade.tipo
+    erros = []
+    rejeitadas = []
+    total_blocos = 0
+    paginas = 0
+    paralelo = processos > 1 and paralelismo_disponivel()
+    escritores_por_grupo = {}
+    limite_memoria = LimiteMemoriaPartes()
+    paginas_por_grupo = {}
+    relatorio = RelatorioExecucao(tipo)
+    instrumentacao = instrumentacao or INSTRUMENTACAO_DESLIGADA
+    pipeline = pipeline or Pipeline(CONFIGURACAO_SERIAL)
+    gravador = pipeline.gravador()
+
+    # Mesmo carimbo de data/hora em todos os arquivos desta execução
+    carimbo = datetime.now().strftime('%Y%m%d%H%M%S')
+    pasta_downloads = pasta_saida or pasta_saida_padrao()
+
+    def caminho_saida(grupo):
+        return especialidade.caminho_saida(pasta_downloads, carimbo, grupo)
+
+    def registrar_no_diario(caminho, chaves):
+        diario.registrar(chaves, tipo, caminho)
+
+    def enriquecer(registro, motivos):
+        # Estágio de enriquecimento: consultas só para os registros que serão desenhados
+        if motivos:
+            return None
+        with instrumentacao.etapa("consultas"):
+            return especialidade.enriquecer(registro)
+
+    for registro, motivos, enriquecido in pipeline.registros(blocos_apac, instrumentacao, validar, enriquecer):
+        verificar_cancelamento(cancelar)
+        if progresso:
+            progresso(total_blocos, paginas)
+        total_blocos += 1
+        if diario is not None and diario.deve_pular(registro):
+            continue
+
+        numero_apac = registro.NUMERO_APAC
+        if motivos:
+            erros.append(f"{numero_apac} - Validação: {descrever_motivos(motivos)}")
+            rejeitadas.append((numero_apac, registro.NOME_PACIENTE, motivos))
+            relatorio.rejeitar(numero_apac, *motivos)
+            continue
+
+        try:
+            grupo, fixos, cod_procedimento, nome_procedimento = especialidade.pagina(registro, enriquecido)
+        except RegistroRecusado as e:
+            erros.append(f"{numero_apac} - {e.mensagem}")
+            relatorio.rejeitar(numero_apac, e.motivo)
+            continue
+
+        if paralelo:
+            # Só acumula os registros; o desenho das páginas fica para o pool de processos
+            paginas_por_grupo.setdefault(grupo, []).append((fixos, registro))
+        else:
+            # Um escritor por grupo; as partes cheias já vão para o disco durante o laço
+            escritor = escritores_por_grupo.get(grupo)
+            if escritor is None:
+                if not escritores_por_grupo:
+                    os.makedirs(pasta_downloads, exist_ok=True)
+                escritor = escritores_por_grupo[grupo] = EscritorPDF(
+                    caminho_saida(grupo),
+                    paginas_por_parte=paginas_por_parte,
+                    opcoes_pdf=opcoes_pdf,
+                    ao_gravar=registrar_no_diario if diario is not None else None,
+                    instrumentacao=instrumentacao,
+                    gravador=gravador,
+                    limite=limite_memoria,
+                )
+            escritor.adicionar(
+                registro.como_dados(),
+                fixos=fixos,
+                chave=(numero_apac, registro.HASH_BLOCO) if diario is not None else None,
+            )
+
+        relatorio.adicionar(registro, cod_procedimento, nome_procedimento)
+        paginas += 1
+
+    if not total_blocos:
+        raise ErroGeracaoAPAC("Nenhum bloco de APAC foi encontrado no arquivo de texto.")
+    verificar_cancelamento(cancelar)
+    if progresso:
+        progresso(total_blocos, paginas)
+    instrumentacao.contar("blocos", total_blocos)
+    instrumentacao.contar("paginas", paginas)
+    instrumentacao.contar("rejeitados", len(erros))
+
+    # -----------------------
+    # Salvar PDFs
+    # -----------------------
+    os.makedirs(pasta_downloads, exist_ok=True)
+    falhas_gravacao = []
+    arquivos = []
+
+    # Sem páginas novas (todas já constavam no diário) não há PDF a gravar
+    if paralelo and paginas_por_grupo:
+        # Cada grupo é dividido nas mesmas partes que o EscritorPDF geraria
+        partes = {}
+        for grupo, paginas_grupo in paginas_por_grupo.items():
+            partes.update(dividir_em_partes(caminho_saida(grupo), paginas_grupo, paginas_por_parte))
+        try:
+            # Desenho e gravação acontecem juntos nos processos filhos
+            with instrumentacao.etapa("render_e_gravacao_paralelos"):
+                renderizar_saidas(partes, processos=processos, opcoes_pdf=opcoes_pdf, cancelar=cancelar)
+        except GeracaoCancelada:
+            raise
+        except Exception as e:
+            falhas_gravacao.append(f"Falha ao salvar PDFs: {e}")
+        else:
+            arquivos.extend(partes)
+            if diario is not None:
+                for caminho, paginas_parte in partes.items():
+                    registrar_no_diario(caminho, [(r.NUMERO_APAC, r.HASH_BLOCO) for _, r in paginas_parte])
+    else:
+        # As últimas partes de todos os grupos vão para o gravador antes de esperar por elas
+        for escritor in escritores_por_grupo.values():
+            escritor.fechar(esperar=False)
+        for escritor in escritores_por_grupo.values():
+            arquivos.extend(escritor.aguardar())
+            falhas_gravacao.extend(escritor.falhas)
+
+    # -----------------------
+    # Salvar arquivo de erros
+    # -----------------------
+    caminho_erros = None
+    if erros:
+        caminho_erros = os.path.join(pasta_downloads, f"apac_erros_{carimbo}.txt")
+        with open(caminho_erros, "w", encoding="utf-8") as f:
+            f.write("\n".join(erros))
+    caminho_rejeitadas = gravar_rejeitadas(pasta_downloads, carimbo, rejeitadas)
+
+    # -----------------------
+    # Salvar contagem detalhada e relatório estruturado
+    # -----------------------
+    caminho_contagem = None
+    if especialidade.gravar_contagem and relatorio.total:
+        caminho_contagem = os.path.join(pasta_downloads, f"apac_contagem_{carimbo}.txt")
+        with open(caminho_contagem, "w", encoding="utf-8") as f:
+            f.write(relatorio.texto_contagem())
+    arquivos_relatorio = relatorio.gravar(
+        pasta_downloads, carimbo,
+        total_blocos=total_blocos,
+        puladas_diario=diario.puladas if diario is not None else 0,
+        arquivos=arquivos,
+        falhas_gravacao=falhas_gravacao,
+    )
+
+    return {
+        "tipo": tipo,
+        "pasta_saida": pasta_downloads,
+        "arquivos": arquivos,
+        "arquivo_erros": caminho_erros,
+        "arquivo_rejeitadas": caminho_rejeitadas,
+        "arquivo_contagem": caminho_contagem,
+        "total_blocos": total_blocos,
+        "paginas": paginas,
+        "paginas_por_cnes": relatorio.por_cnes_solicitante(),
+        "erros": erros,
+        "falhas_gravacao": falhas_gravacao,
+        "puladas_diario": diario.puladas if diario is not None else 0,
+        "carimbo": carimbo,
+        **arquivos_relatorio,
+    }
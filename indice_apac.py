@@ -0,0 +1,238 @@
+# indice_apac.py
+#
+# Índice de blocos de um arquivo exportado (BDSIA): para cada bloco de APAC, o
+# trecho de bytes que ele ocupa, o número da APAC e os CNES do bloco. Com o
+# índice, reimprimir uma APAC, uma lista delas ou as de um CNES lê só os blocos
+# pedidos, sem passar pelo resto do arquivo.
+#
+# O índice fica num arquivo ao lado da exportação (<arquivo>.idx) ou, se a pasta
+# não aceitar escrita, no cache temporário; é refeito quando o arquivo muda.
+
+import os
+import re
+import mmap
+import zlib
+import time
+
+from utils import (
+    MARCADOR_BLOCO,
+    PASTA_CACHE,
+    ErroGeracaoAPAC,
+    INICIO_PROCEDIMENTOS,
+    FIM_PROCEDIMENTOS,
+    cnes_solicitante,
+    ler_pacote_tabela,
+    gravar_pacote_tabela,
+)
+from especialidades import obter_gerador
+from solicitador_apac import DADOS_FIXOS_GENERICOS
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+VERSAO_INDICE = 2
+EXTENSAO_INDICE = ".idx"
+
+# Bytes do início e do fim do arquivo que entram na assinatura (além de tamanho e mtime)
+BYTES_ASSINATURA = 4096
+
+_MARCADOR = MARCADOR_BLOCO.encode("latin-1")
+_RE_NUMERO_APAC = re.compile(rb'NUMERO DO APAC:\s+([\d\-]+)')
+_RE_UNIDADE = re.compile(rb'CODIGO DA UNIDADE:\s*([\d-]+)')
+_RE_PROCEDIMENTOS = re.compile(rb'PROCEDIMENTOS REALIZADOS:(.*?)(?=MOTIVO DE SAIDA)', re.DOTALL | re.IGNORECASE)
+# CNES TERC: 6 ou 7 dígitos no fim de uma linha que começa por código de procedimento
+_RE_CNES_TERC = re.compile(rb'^[ \t]*\d{9}-\d(?![\d-])[^\n]*?[ \t](\d{6,7})[ \t\r]*$', re.MULTILINE)
+_INICIO_PROCEDIMENTOS = INICIO_PROCEDIMENTOS.encode("latin-1")
+_FIM_PROCEDIMENTOS = FIM_PROCEDIMENTOS.encode("latin-1")
+
+def somente_digitos(numero_apac):
+    """Chave de busca de uma APAC: "352500000001-1" e "3525000000011" são a mesma."""
+    return "".join(c for c in str(numero_apac) if c.isdigit())
+
+# ==============================================================================
+# CONSTRUÇÃO
+# ==============================================================================
+
+def _cnes_terceiro(bloco):
+    """CNES terceiro da última linha de procedimento que o informa (mesma regra de utils.extrair_procedimentos), em bytes."""
+    inicio = bloco.find(_INICIO_PROCEDIMENTOS)
+    fim = bloco.find(_FIM_PROCEDIMENTOS, inicio) if inicio >= 0 else -1
+    if fim < 0:
+        secao = _RE_PROCEDIMENTOS.search(bloco)
+        if not secao:
+            return ""
+        inicio, fim = secao.span(1)
+    cnes = b""
+    for match in _RE_CNES_TERC.finditer(bloco, inicio, fim):
+        cnes = match.group(1)
+    return cnes.decode("latin-1")
+
+def _entrada_do_bloco(dados, inicio, fim):
+    """(número da APAC só com dígitos, CNES da unidade, CNES terceiro, início, fim), ou None."""
+    bloco = dados[inicio:fim]
+    if b"NUMERO DO APAC" not in bloco:
+        return None
+    numero = _RE_NUMERO_APAC.search(bloco)
+    unidade = _RE_UNIDADE.search(bloco)
+    return (
+        somente_digitos(numero.group(1).decode("latin-1")) if numero else "",
+        unidade.group(1).decode("latin-1") if unidade else "",
+        _cnes_terceiro(bloco),
+        inicio,
+        fim,
+    )
+
+def indexar_blocos(dados):
+    """Percorre os marcadores *BDSIA de dados (bytes ou mmap) e retorna as entradas do índice.
+
+    Os limites de cada bloco são os mesmos de ler_blocos_bdsia: do fim de um
+    marcador ao início do próximo (ou do início do arquivo ao primeiro marcador).
+    """
+    entradas = []
+    inicio = 0
+    while True:
+        marcador = dados.find(_MARCADOR, inicio)
+        fim = marcador if marcador >= 0 else len(dados)
+        entrada = _entrada_do_bloco(dados, inicio, fim)
+        if entrada is not None:
+            entradas.append(entrada)
+        if marcador < 0:
+            return entradas
+        inicio = marcador + len(_MARCADOR)
+
+def _assinatura_arquivo(caminho, dados):
+    info = os.stat(caminho)
+    return (VERSAO_INDICE, info.st_size, info.st_mtime_ns,
+            zlib.crc32(dados[:BYTES_ASSINATURA]), zlib.crc32(dados[-BYTES_ASSINATURA:]))
+
+def caminhos_indice(caminho_arquivo):
+    """Onde o índice é procurado/gravado: ao lado do arquivo e, em seguida, em utils.PASTA_CACHE."""
+    caminho_absoluto = os.path.abspath(caminho_arquivo)
+    nome_cache = f"{os.path.basename(caminho_absoluto)}.{zlib.crc32(caminho_absoluto.encode('utf-8')):08x}{EXTENSAO_INDICE}"
+    return caminho_absoluto + EXTENSAO_INDICE, os.path.join(PASTA_CACHE, nome_cache)
+
+# ==============================================================================
+# ÍNDICE
+# ==============================================================================
+
+class IndiceAPAC:
+    """Índice de um arquivo exportado, aberto com mmap para leitura dos blocos por posição.
+
+    Uso:
+        with IndiceAPAC(caminho) as indice:
+            posicoes, nao_encontradas = indice.por_numero(["352500000001-1"])
+            blocos = indice.blocos(posicoes)
+    """
+
+    def __init__(self, caminho_arquivo, reconstruir=False):
+        self.caminho_arquivo = caminho_arquivo
+        self._arquivo = open(caminho_arquivo, "rb")
+        try:
+            self._dados = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Arquivo vazio: o mmap não aceita tamanho zero
+            self._dados = b""
+        self.reconstruido = False
+        self.entradas = self._carregar(reconstruir)
+        self._por_numero = {}
+        for posicao, entrada in enumerate(self.entradas):
+            self._por_numero.setdefault(entrada[0], []).append(posicao)
+
+    def _carregar(self, reconstruir):
+        assinatura = _assinatura_arquivo(self.caminho_arquivo, self._dados)
+        caminhos = caminhos_indice(self.caminho_arquivo)
+        if not reconstruir:
+            for caminho in caminhos:
+                entradas = ler_pacote_tabela(caminho, assinatura)
+                if entradas is not None:
+                    return entradas
+        entradas = indexar_blocos(self._dados)
+        self.reconstruido = True
+        for caminho in caminhos:
+            if gravar_pacote_tabela(caminho, assinatura, entradas):
+                break
+        return entradas
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def por_numero(self, numeros_apac):
+        """(posições encontradas na ordem pedida, números não encontrados)."""
+        posicoes, nao_encontrados = [], []
+        for numero in numeros_apac:
+            encontradas = self._por_numero.get(somente_digitos(numero))
+            if encontradas:
+                posicoes.extend(encontradas)
+            else:
+                nao_encontrados.append(numero)
+        return posicoes, nao_encontrados
+
+    def por_cnes(self, cnes):
+        """Posições das APACs agrupadas no CNES informado (mesma regra usada na geração)."""
+        cnes = str(cnes).strip()
+        return [
+            posicao
+            for posicao, (_, unidade, terceiro, _, _) in enumerate(self.entradas)
+            if cnes_solicitante(terceiro, unidade) == cnes
+        ]
+
+    def bloco(self, posicao):
+        """Texto do bloco como ler_blocos_bdsia o entregaria (latin-1, quebras de linha normalizadas)."""
+        _, _, _, inicio, fim = self.entradas[posicao]
+        return self._dados[inicio:fim].decode("latin-1").replace("\r\n", "\n").replace("\r", "\n")
+
+    def blocos(self, posicoes):
+        return [self.bloco(posicao) for posicao in posicoes]
+
+    def fechar(self):
+        if isinstance(self._dados, mmap.mmap):
+            self._dados.close()
+        self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+        return False
+
+# ==============================================================================
+# REIMPRESSÃO
+# ==============================================================================
+
+def reimprimir_apacs(caminho_arquivo, tipo, numeros_apac=None, cnes=None, pasta_saida=None, dados_fixos=None):
+    """Gera de novo só as APACs pedidas (por número ou por CNES) de um arquivo exportado.
+
+    Usa o gerador normal da especialidade sobre os blocos lidos pelo índice, de
+    modo que os PDFs saem iguais aos da geração completa. O diário não é
+    consultado: a reimpressão sempre emite as APACs pedidas.
+
+    Retorna o resumo do gerador acrescido de nao_encontradas e segundos;
+    levanta ErroGeracaoAPAC se nada for selecionado.
+    """
+    gerador = obter_gerador(tipo)
+    if gerador is None:
+        raise ErroGeracaoAPAC(f"Tipo de APAC desconhecido: {tipo}")
+    if not numeros_apac and not cnes:
+        raise ErroGeracaoAPAC("Informe os números das APACs ou o CNES a reimprimir.")
+
+    inicio = time.perf_counter()
+    with IndiceAPAC(caminho_arquivo) as indice:
+        nao_encontradas = []
+        if numeros_apac:
+            posicoes, nao_encontradas = indice.por_numero(numeros_apac)
+        else:
+            posicoes = indice.por_cnes(cnes)
+        if not posicoes:
+            alvo = ", ".join(nao_encontradas) if numeros_apac else f"CNES {cnes}"
+            raise ErroGeracaoAPAC(f"Nenhuma APAC encontrada no arquivo para: {alvo}")
+        blocos = indice.blocos(posicoes)
+        indice_reconstruido = indice.reconstruido
+
+    resultado = gerador(blocos, (dados_fixos or DADOS_FIXOS_GENERICOS).copy(), pasta_saida=pasta_saida)
+    resultado["arquivo_entrada"] = os.path.abspath(caminho_arquivo)
+    resultado["nao_encontradas"] = nao_encontradas
+    resultado["indice_reconstruido"] = indice_reconstruido
+    resultado["segundos"] = round(time.perf_counter() - inicio, 3)
+    return resultado
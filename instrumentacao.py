@@ -0,0 +1,225 @@
+# instrumentacao.py
+#
+# Tempos por etapa, contadores e memória de uma execução de geração, gravados
+# num arquivo de métricas ao lado do relatório de contagem.
+
+import os
+import sys
+import json
+import time
+import contextlib
+from datetime import datetime
+
+try:
+    import resource  # não existe no Windows
+except ImportError:
+    resource = None
+
+# Liga a instrumentação quando a geração é chamada sem escolher (ex.: pela interface)
+VARIAVEL_AMBIENTE = "APAC_METRICAS"
+
+PERFIS = ("cprofile", "tracemalloc")
+
+# Quantas linhas de alocação entram no relatório do tracemalloc
+LINHAS_TRACEMALLOC = 30
+
+# ==============================================================================
+# MEMÓRIA
+# ==============================================================================
+
+def pico_rss_bytes():
+    """Pico de memória residente do processo, ou None se a plataforma não informar."""
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss vem em kB no Linux e em bytes no macOS
+        return pico if sys.platform == "darwin" else pico * 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().peak_wset
+
+# ==============================================================================
+# INSTRUMENTAÇÃO
+# ==============================================================================
+
+class _Etapa:
+    """Acumula o tempo de uma etapa: chamadas, total e a chamada mais lenta."""
+    __slots__ = ("chamadas", "total", "maximo")
+
+    def __init__(self):
+        self.chamadas = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def somar(self, decorrido):
+        self.chamadas += 1
+        self.total += decorrido
+        if decorrido > self.maximo:
+            self.maximo = decorrido
+
+    def como_dict(self):
+        return {
+            "chamadas": self.chamadas,
+            "segundos": round(self.total, 6),
+            "ms_por_chamada": round(self.total / self.chamadas * 1000, 4) if self.chamadas else 0.0,
+            "ms_maximo": round(self.maximo * 1000, 4),
+        }
+
+class _Cronometro:
+    __slots__ = ("etapa", "inicio")
+
+    def __init__(self, etapa):
+        self.etapa = etapa
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.etapa.somar(time.perf_counter() - self.inicio)
+        return False
+
+class Instrumentacao:
+    """Coleta tempos por etapa e contadores de uma execução.
+
+    Uso nos trechos quentes:
+        with instrumentacao.etapa("parse"):
+            ...
+        for bloco in instrumentacao.iterar("leitura", blocos): ...
+        instrumentacao.contar("paginas")
+
+    perfil ("cprofile" ou "tracemalloc") liga também o perfilador escolhido
+    entre iniciar() e gravar().
+    """
+    ativa = True
+
+    def __init__(self, perfil=None):
+        if perfil is not None and perfil not in PERFIS:
+            raise ValueError(f"Perfil desconhecido: {perfil}")
+        self.perfil = perfil
+        self._etapas = {}
+        self._contadores = {}
+        self._valores = {}
+        self._inicio = None
+        self._fim = None
+        self._perfilador = None
+        self._memoria = None
+
+    def iniciar(self):
+        self._inicio = time.perf_counter()
+        if self.perfil == "cprofile":
+            import cProfile
+            self._perfilador = cProfile.Profile()
+            self._perfilador.enable()
+        elif self.perfil == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+
+    def parar(self):
+        """Encerra a medição e os perfiladores (também chamado quando a geração falha)."""
+        if self._fim is not None:
+            return
+        self._fim = time.perf_counter()
+        if self._perfilador is not None:
+            self._perfilador.disable()
+        elif self.perfil == "tracemalloc":
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                self._memoria = (tracemalloc.take_snapshot(), *tracemalloc.get_traced_memory())
+                tracemalloc.stop()
+
+    def etapa(self, nome):
+        etapa = self._etapas.get(nome)
+        if etapa is None:
+            etapa = self._etapas[nome] = _Etapa()
+        return _Cronometro(etapa)
+
+    def iterar(self, nome, iteravel):
+        """Repassa os itens de iteravel cronometrando cada next() como a etapa nome."""
+        iterador = iter(iteravel)
+        etapa = self._etapas.setdefault(nome, _Etapa())
+        while True:
+            inicio = time.perf_counter()
+            try:
+                item = next(iterador)
+            except StopIteration:
+                return
+            etapa.somar(time.perf_counter() - inicio)
+            yield item
+
+    def contar(self, nome, quantidade=1):
+        self._contadores[nome] = self._contadores.get(nome, 0) + quantidade
+
+    def registrar(self, nome, valor):
+        """Guarda um valor avulso no relatório (ex.: estatísticas das tabelas)."""
+        self._valores[nome] = valor
+
+    def relatorio(self):
+        self.parar()
+        total = (self._fim - self._inicio) if self._inicio is not None else None
+        blocos = self._contadores.get("blocos", 0)
+        return {
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "segundos_total": round(total, 4) if total is not None else None,
+            "etapas": {nome: etapa.como_dict() for nome, etapa in self._etapas.items()},
+            "ms_por_bloco": {
+                nome: round(etapa.total / blocos * 1000, 4) for nome, etapa in self._etapas.items()
+            } if blocos else {},
+            "contadores": dict(self._contadores),
+            "pico_rss_bytes": pico_rss_bytes(),
+            **self._valores,
+        }
+
+    def gravar(self, pasta, sufixo):
+        """Grava apac_metricas_<sufixo>.json (e o perfil, se ligado) em pasta; retorna os caminhos."""
+        self.parar()
+        os.makedirs(pasta, exist_ok=True)
+        caminhos = {"arquivo_metricas": os.path.join(pasta, f"apac_metricas_{sufixo}.json")}
+        if self._perfilador is not None:
+            caminhos["arquivo_perfil"] = os.path.join(pasta, f"apac_perfil_{sufixo}.prof")
+            self._perfilador.dump_stats(caminhos["arquivo_perfil"])
+        elif self._memoria is not None:
+            caminhos["arquivo_perfil"] = os.path.join(pasta, f"apac_memoria_{sufixo}.txt")
+            instantaneo, atual, pico = self._memoria
+            with open(caminhos["arquivo_perfil"], "w", encoding="utf-8") as f:
+                f.write(f"Memória rastreada: atual {atual} bytes, pico {pico} bytes\n\n")
+                for estatistica in instantaneo.statistics("lineno")[:LINHAS_TRACEMALLOC]:
+                    f.write(f"{estatistica}\n")
+
+        with open(caminhos["arquivo_metricas"], "w", encoding="utf-8") as f:
+            json.dump(self.relatorio(), f, ensure_ascii=False, indent=2)
+        return caminhos
+
+class _InstrumentacaoDesligada:
+    """Mesma interface de Instrumentacao sem fazer nada (custo de uma chamada de método)."""
+    ativa = False
+    perfil = None
+    _nulo = contextlib.nullcontext()
+
+    def iniciar(self):
+        pass
+
+    def parar(self):
+        pass
+
+    def etapa(self, nome):
+        return self._nulo
+
+    def iterar(self, nome, iteravel):
+        return iteravel
+
+    def contar(self, nome, quantidade=1):
+        pass
+
+    def registrar(self, nome, valor):
+        pass
+
+INSTRUMENTACAO_DESLIGADA = _InstrumentacaoDesligada()
+
+def instrumentacao_do_ambiente():
+    """Instrumentação pedida pela variável APAC_METRICAS: vazia/0 desliga, 1 liga, ou o nome de um perfil."""
+    valor = os.environ.get(VARIAVEL_AMBIENTE, "").strip().lower()
+    if not valor or valor == "0":
+        return INSTRUMENTACAO_DESLIGADA
+    return Instrumentacao(perfil=valor if valor in PERFIS else None)
@@ -0,0 +1,266 @@
+# lote.py
+#
+# Modo lote: varre (ou vigia, por polling) uma pasta de exportações e processa
+# cada arquivo novo num pool limitado de processos. Cada processo do pool carrega
+# as tabelas de consulta uma vez e as reaproveita em todos os arquivos que atender.
+#
+# Estrutura da pasta vigiada:
+#   entrada/*.txt               -> tipo padrão (--tipo)
+#   entrada/<tipo>/*.txt        -> tipo da subpasta (oftalmologia, risco_cirurgico)
+#   entrada/processados/        -> arquivos concluídos (mesmo com blocos rejeitados)
+#   entrada/falhas/             -> arquivos que não geraram os PDFs
+# Os PDFs de cada arquivo vão para <saida>/<nome do arquivo>/, e o relatório do
+# lote para <saida>/apac_lote_<data>.json.
+
+import os
+import json
+import time
+import shutil
+import signal
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from utils import TABELAS_CONSULTA, ErroGeracaoAPAC, pasta_saida_padrao, registro_tabelas
+from especialidades import TIPOS_APAC
+from diario_apac import MODO_DIARIO_PADRAO
+from escrita_pdf import PAGINAS_POR_PARTE
+from solicitador_apac import gerar_apacs_de_arquivo, status_do_resultado
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+EXTENSOES_EXPORTACAO = (".txt",)
+PASTA_PROCESSADOS = "processados"
+PASTA_FALHAS = "falhas"
+
+# Segundos entre duas varreduras da pasta no modo contínuo
+INTERVALO_VARREDURA = 5
+
+# ==============================================================================
+# DESCOBERTA DOS ARQUIVOS
+# ==============================================================================
+
+def listar_exportacoes(pasta_entrada, tipo_padrao=None):
+    """Retorna [(caminho, tipo)] das exportações na pasta e nas subpastas de tipo.
+
+    Arquivos na raiz sem tipo_padrao são ignorados (ficam na pasta).
+    """
+    encontrados = []
+    pastas = [(pasta_entrada, tipo_padrao)]
+    pastas += [(os.path.join(pasta_entrada, tipo), tipo) for tipo in TIPOS_APAC]
+    for pasta, tipo in pastas:
+        if tipo is None:
+            continue
+        try:
+            entradas = os.scandir(pasta)
+        except OSError:
+            continue
+        with entradas:
+            for entrada in entradas:
+                if entrada.is_file() and entrada.name.lower().endswith(EXTENSOES_EXPORTACAO):
+                    encontrados.append((entrada.path, tipo))
+    encontrados.sort()
+    return encontrados
+
+class _Estabilidade:
+    """Só libera um arquivo quando tamanho e mtime não mudaram entre duas varreduras
+    (evita pegar uma exportação que ainda está sendo copiada para a pasta)."""
+
+    def __init__(self):
+        self._assinaturas = {}
+
+    def prontos(self, candidatos):
+        prontos = []
+        assinaturas = {}
+        for caminho, tipo in candidatos:
+            try:
+                info = os.stat(caminho)
+            except OSError:
+                continue
+            assinatura = (info.st_size, info.st_mtime_ns)
+            assinaturas[caminho] = assinatura
+            if self._assinaturas.get(caminho) == assinatura:
+                prontos.append((caminho, tipo))
+        self._assinaturas = assinaturas
+        return prontos
+
+def _mover(caminho, pasta_destino):
+    """Move o arquivo para pasta_destino sem sobrescrever um homônimo; retorna o novo caminho."""
+    os.makedirs(pasta_destino, exist_ok=True)
+    destino = os.path.join(pasta_destino, os.path.basename(caminho))
+    if os.path.exists(destino):
+        raiz, extensao = os.path.splitext(destino)
+        destino = f"{raiz}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}{extensao}"
+    shutil.move(caminho, destino)
+    return destino
+
+# ==============================================================================
+# PROCESSOS DO POOL
+# ==============================================================================
+
+def _iniciar_trabalhador():
+    """Carrega as tabelas de consulta uma vez por processo do pool."""
+    # O Ctrl+C é tratado só pelo processo principal, que espera os arquivos em andamento
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for caminho_csv, coluna_chave, coluna_valor in TABELAS_CONSULTA:
+        registro_tabelas.tabela(caminho_csv, coluna_chave, coluna_valor).existe
+
+def _processar_arquivo(caminho, tipo, pasta_saida, opcoes):
+    """Executado no processo do pool: gera as APACs de um arquivo e retorna o resumo dele."""
+    resumo = {"arquivo_entrada": os.path.abspath(caminho), "tipo": tipo}
+    try:
+        resultado = gerar_apacs_de_arquivo(caminho, tipo, pasta_saida=pasta_saida, **opcoes)
+    except (ErroGeracaoAPAC, OSError) as e:
+        resumo.update(status="falha", mensagem=str(e))
+        return resumo
+    resumo.update(
+        status=status_do_resultado(resultado),
+        pasta_saida=resultado["pasta_saida"],
+        arquivos=resultado["arquivos"],
+        arquivo_erros=resultado["arquivo_erros"],
+        arquivo_rejeitadas=resultado.get("arquivo_rejeitadas"),
+        arquivo_contagem=resultado["arquivo_contagem"],
+        arquivo_relatorio=resultado.get("arquivo_relatorio"),
+        total_blocos=resultado["total_blocos"],
+        paginas=resultado["paginas"],
+        rejeitados=len(resultado["erros"]),
+        falhas_gravacao=resultado["falhas_gravacao"],
+        puladas_diario=resultado["puladas_diario"],
+        segundos=resultado["segundos"],
+    )
+    return resumo
+
+# ==============================================================================
+# RELATÓRIO
+# ==============================================================================
+
+def _totalizar(arquivos):
+    totais = {"arquivos": len(arquivos), "ok": 0, "concluido_com_rejeitados": 0, "falha": 0,
+              "blocos": 0, "paginas": 0, "rejeitados": 0, "puladas_diario": 0}
+    for resumo in arquivos:
+        totais[resumo["status"]] += 1
+        totais["blocos"] += resumo.get("total_blocos", 0)
+        totais["paginas"] += resumo.get("paginas", 0)
+        totais["rejeitados"] += resumo.get("rejeitados", 0)
+        totais["puladas_diario"] += resumo.get("puladas_diario", 0)
+    return totais
+
+def _gravar_relatorio(caminho, relatorio):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+# ==============================================================================
+# LOTE
+# ==============================================================================
+
+def processar_lote(pasta_entrada, tipo_padrao=None, pasta_saida=None, trabalhadores=None, continuo=False,
+                   intervalo=INTERVALO_VARREDURA, caminho_diario=None, modo_diario=MODO_DIARIO_PADRAO,
+                   paginas_por_parte=PAGINAS_POR_PARTE, opcoes_pdf=None, parar=None, ao_concluir=None):
+    """Processa as exportações de pasta_entrada com até `trabalhadores` arquivos ao mesmo tempo.
+
+    Sem continuo, processa os arquivos presentes e retorna. Com continuo, vigia
+    a pasta a cada `intervalo` segundos até parar (threading.Event) ser acionado
+    ou um KeyboardInterrupt; os arquivos em andamento são concluídos antes de sair.
+    No modo contínuo um arquivo só é pego depois de ficar igual em duas varreduras.
+
+    Cada arquivo terminado vai para processados/ ou falhas/ dentro de
+    pasta_entrada, ao_concluir(resumo) é chamado e o relatório agregado
+    (apac_lote_<data>.json em pasta_saida) é regravado. Retorna o relatório.
+    """
+    pasta_saida = pasta_saida or pasta_saida_padrao()
+    os.makedirs(pasta_saida, exist_ok=True)
+    trabalhadores = max(1, trabalhadores or os.cpu_count() or 1)
+    opcoes = {
+        "caminho_diario": caminho_diario,
+        "modo_diario": modo_diario,
+        "paginas_por_parte": paginas_por_parte,
+        "opcoes_pdf": opcoes_pdf,
+    }
+
+    inicio = time.perf_counter()
+    carimbo = datetime.now().strftime('%Y%m%d%H%M%S')
+    caminho_relatorio = os.path.join(pasta_saida, f"apac_lote_{carimbo}.json")
+    relatorio = {
+        "pasta_entrada": os.path.abspath(pasta_entrada),
+        "pasta_saida": os.path.abspath(pasta_saida),
+        "iniciado_em": datetime.now().isoformat(timespec="seconds"),
+        "trabalhadores": trabalhadores,
+        "arquivo_relatorio": caminho_relatorio,
+        "arquivos": [],
+    }
+    estabilidade = _Estabilidade()
+    em_andamento = {}  # futuro -> (caminho, tipo)
+    nao_movidos = set()  # não voltam a ser processados a cada varredura
+
+    def concluir(futuro):
+        caminho, tipo = em_andamento.pop(futuro)
+        try:
+            resumo = futuro.result()
+        except Exception as e:
+            resumo = {"arquivo_entrada": os.path.abspath(caminho), "tipo": tipo, "status": "falha", "mensagem": str(e)}
+        destino = PASTA_FALHAS if resumo["status"] == "falha" else PASTA_PROCESSADOS
+        try:
+            resumo["arquivo_movido_para"] = _mover(caminho, os.path.join(pasta_entrada, destino))
+        except OSError as e:
+            resumo["mensagem_mover"] = str(e)
+            nao_movidos.add(caminho)
+        relatorio["arquivos"].append(resumo)
+        relatorio["totais"] = _totalizar(relatorio["arquivos"])
+        relatorio["segundos"] = round(time.perf_counter() - inicio, 3)
+        _gravar_relatorio(caminho_relatorio, relatorio)
+        if ao_concluir:
+            ao_concluir(resumo)
+
+    with ProcessPoolExecutor(max_workers=trabalhadores, initializer=_iniciar_trabalhador) as executor:
+        try:
+            while True:
+                candidatos = listar_exportacoes(pasta_entrada, tipo_padrao)
+                pendentes = estabilidade.prontos(candidatos) if continuo else candidatos
+                ativos = {caminho for caminho, _ in em_andamento.values()}
+                for caminho, tipo in pendentes:
+                    if caminho in ativos or caminho in nao_movidos:
+                        continue
+                    nome = os.path.splitext(os.path.basename(caminho))[0]
+                    futuro = executor.submit(_processar_arquivo, caminho, tipo, os.path.join(pasta_saida, nome), opcoes)
+                    em_andamento[futuro] = (caminho, tipo)
+
+                if not continuo:
+                    while em_andamento:
+                        concluidos, _ = wait(list(em_andamento), return_when=FIRST_COMPLETED)
+                        for futuro in concluidos:
+                            concluir(futuro)
+                    break
+
+                # Espera a próxima varredura recolhendo os que terminarem nesse meio tempo
+                limite = time.monotonic() + intervalo
+                while not (parar is not None and parar.is_set()):
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    if em_andamento:
+                        concluidos, _ = wait(list(em_andamento), timeout=min(restante, 1), return_when=FIRST_COMPLETED)
+                        for futuro in concluidos:
+                            concluir(futuro)
+                    else:
+                        time.sleep(min(restante, 1))
+                if parar is not None and parar.is_set():
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Os que nem começaram ficam na pasta para a próxima execução;
+            # os que já estão rodando são concluídos e movidos normalmente
+            for futuro in list(em_andamento):
+                if futuro.cancel():
+                    em_andamento.pop(futuro)
+            for futuro in list(em_andamento):
+                concluir(futuro)
+
+    relatorio["totais"] = _totalizar(relatorio["arquivos"])
+    relatorio["segundos"] = round(time.perf_counter() - inicio, 3)
+    relatorio["concluido_em"] = datetime.now().isoformat(timespec="seconds")
+    _gravar_relatorio(caminho_relatorio, relatorio)
+    return relatorio
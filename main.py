@@ -1,20 +1,19 @@
 # main.py
 
 import tkinter as tk
-from tkinter import filedialog, messagebox
-from ttkthemes import ThemedTk
+from tkinter import filedialog, messagebox, ttk
 from datetime import datetime
 import os
+import time
 import locale
-import re
-from fpdf import FPDF
+import queue
+import threading
+import multiprocessing
 
-# Importa a lógica específica de cada tipo de APAC
-from risco_cirurgico import gerar_apac_risco_cirurgico
-from oftalmologia import gerar_apac_oftalmologia
-
-# Importa as funções e classes de utilidade
-from utils import (extrair_dados_variaveis, APAC_PDF, buscar_nome_medico_por_cns, extrair, buscar_descricao_cid, buscar_descricao_cnes, extrair_principal_e_cnes)
+# Só o tkinter é importado antes da janela aparecer. A geração (solicitador_apac,
+# e com ela fpdf, utils e as especialidades) é importada na thread de geração, no
+# primeiro clique em "GERAR APAC'S"; o tema (ttkthemes) é aplicado depois que a
+# janela já está na tela.
 
 # ==============================================================================
 # VARIÁVEIS DE ESTADO E CONFIGURAÇÕES DA GUI
@@ -34,19 +33,33 @@ FONTE_PEQUENA = ("Arial", 8)
 FONTE_OCI_TITULO = ("Arial", 10, "bold")
 FONTE_OCI_DESCRICAO = ("Arial", 9)
 
-# DADOS FIXOS GENÉRICOS (recuperados)
-DADOS_FIXOS_GENERICOS = {
-    "NOME_ESTABELECIMENTO": "NGA 16",
-    "MUNICIPIO_RESIDENCIA": "FRANCA",
-    "COD_IBGE_MUNICIPIO": "351620",
-    "UF": "SP",
-    "NOME_EXECUTANTE": "NGA 16",
-}
+# Processos usados para renderizar os PDFs. O padrão é 1 (serial): é o modo que
+# grava as partes à medida que as páginas são desenhadas, com memória limitada.
+# O paralelo (exige pypdf) guarda todos os registros até o fim da leitura e só
+# compensa com vários núcleos; liga-se definindo APAC_PROCESSOS_RENDERIZACAO.
+VARIAVEL_PROCESSOS_RENDERIZACAO = "APAC_PROCESSOS_RENDERIZACAO"
+PROCESSOS_RENDERIZACAO = int(os.environ.get(VARIAVEL_PROCESSOS_RENDERIZACAO) or 1)
+
+# Intervalos (ms) de leitura da fila da thread de geração e (s) entre avisos de progresso
+INTERVALO_ACOMPANHAMENTO_MS = 100
+INTERVALO_PROGRESSO_S = 0.1
+
+# Tema ttk aplicado depois da abertura da janela
+TEMA_TTK = "black"
+
+# Se definida, a janela grava time.time() neste arquivo assim que fica visível e
+# fecha (usado por benchmarks/inicializacao.py)
+VARIAVEL_MEDIR_INICIALIZACAO = "APAC_MEDIR_INICIALIZACAO"
 
 # Variáveis de controle de estado
 caminho_arquivo = None
 tipo_apac_selecionado = None
 
+# Estado da geração em segundo plano (a thread só conversa com a GUI pela fila)
+fila_geracao = queue.Queue()
+evento_cancelar = None
+gerando = False
+
 
 # ==============================================================================
 # FUNÇÕES DE AÇÃO DA GUI
@@ -68,7 +81,11 @@ def carregar_arquivo():
     verificar_status_botoes()
 
 def gerar_apacs():
-    """Inicia o processo de geração das APACs com base na seleção do usuário."""
+    """Inicia o processo de geração das APACs em uma thread, sem travar a janela."""
+    global evento_cancelar, gerando
+    if gerando:
+        return
+
     if not caminho_arquivo:
         messagebox.showerror("Erro", "Por favor, carregue um arquivo primeiro.")
         return
@@ -77,31 +94,138 @@ def gerar_apacs():
         messagebox.showerror("Erro", "Por favor, selecione um tipo de APAC.")
         return
 
-    try:
-        with open(caminho_arquivo, 'r', encoding='latin-1') as f:
-            conteudo = f.read()
+    gerando = True
+    evento_cancelar = threading.Event()
+    barra_progresso.config(value=0)
+    label_progresso.config(text="Lendo o arquivo...")
+    label_btn_cancelar.config(state=tk.NORMAL, bg=COR_BOTAO_PADRAO, relief="raised")
+    verificar_status_botoes()
+
+    # O diário sempre registra o que foi emitido; com a opção marcada, também pula o que já foi
+    modo_diario = "retomar" if pular_ja_geradas.get() else "forcar"
 
-        blocos = re.split(r'\*BDSIA', conteudo)
-        lista_apacs = [bloco for bloco in blocos if "NUMERO DO APAC" in bloco]
+    threading.Thread(
+        target=executar_geracao,
+        args=(caminho_arquivo, tipo_apac_selecionado, evento_cancelar, modo_diario, guardar_cache_leitura.get()),
+        daemon=True,
+    ).start()
+    root.after(INTERVALO_ACOMPANHAMENTO_MS, acompanhar_geracao)
 
-        if not lista_apacs:
-            messagebox.showerror("Erro", "Nenhum registro de APAC válido foi encontrado no arquivo.")
+def executar_geracao(caminho, tipo, cancelar, modo_diario, cache_parse):
+    """Roda na thread de geração: nunca toca nos widgets, só publica eventos na fila."""
+    ultimo_aviso = [0.0]
+
+    def avisar_progresso(progresso):
+        if progresso["segundos"] - ultimo_aviso[0] >= INTERVALO_PROGRESSO_S:
+            ultimo_aviso[0] = progresso["segundos"]
+            fila_geracao.put(("progresso", progresso))
+
+    try:
+        # Importado aqui para não pesar na abertura da janela
+        from solicitador_apac import DADOS_FIXOS_GENERICOS, gerar_apacs_de_arquivo
+        from diario_apac import caminho_diario_padrao
+
+        resultado = gerar_apacs_de_arquivo(
+            caminho,
+            tipo,
+            processos=PROCESSOS_RENDERIZACAO,
+            dados_fixos=DADOS_FIXOS_GENERICOS,
+            progresso=avisar_progresso,
+            cancelar=cancelar,
+            caminho_diario=caminho_diario_padrao(),
+            modo_diario=modo_diario,
+            cache_parse=cache_parse,
+        )
+    except Exception as e:
+        fila_geracao.put(("erro", e))
+    else:
+        fila_geracao.put(("fim", resultado))
+
+def acompanhar_geracao():
+    """Lê a fila da thread de geração (no thread principal, via root.after)."""
+    ultimo_progresso = None
+    while True:
+        try:
+            tipo_evento, conteudo = fila_geracao.get_nowait()
+        except queue.Empty:
+            break
+        if tipo_evento == "progresso":
+            ultimo_progresso = conteudo
+        else:
+            finalizar_geracao(tipo_evento, conteudo)
             return
 
-        # ATUALIZADO: Remove a lógica de CNES fixo, pois é variável
-        # A lógica de CNES fixo é agora tratada dentro de cada função de especialidade
-        dados_fixos_cnes = DADOS_FIXOS_GENERICOS.copy()
+    if ultimo_progresso:
+        atualizar_progresso(ultimo_progresso)
+    root.after(INTERVALO_ACOMPANHAMENTO_MS, acompanhar_geracao)
+
+def atualizar_progresso(progresso):
+    """Atualiza a barra com páginas por segundo e tempo restante estimado."""
+    fracao, segundos = progresso["fracao"], progresso["segundos"]
+    paginas_por_segundo = progresso["paginas"] / segundos if segundos else 0
+    texto = f"{progresso['paginas']} páginas  |  {paginas_por_segundo:.1f} pág/s"
+    if fracao > 0:
+        restante = int(segundos * (1 - fracao) / fracao)
+        texto += f"  |  restante {restante // 60:02d}:{restante % 60:02d}"
+    if evento_cancelar is not None and evento_cancelar.is_set():
+        texto = "Cancelando..."
+    barra_progresso.config(value=fracao * 100)
+    label_progresso.config(text=texto)
+
+def finalizar_geracao(tipo_evento, conteudo):
+    """Devolve a GUI ao estado inicial e mostra o resultado ou o erro da thread."""
+    global gerando
+    gerando = False
+    label_btn_cancelar.config(state=tk.DISABLED, bg=COR_BOTAO_DESABILITADO, relief="flat")
+    verificar_status_botoes()
 
-        if tipo_apac_selecionado == "oftalmologia":
-            gerar_apac_oftalmologia(lista_apacs, dados_fixos_cnes)
+    if tipo_evento == "fim":
+        barra_progresso.config(value=100)
+        label_progresso.config(text=f"Concluído: {conteudo['paginas']} páginas em {conteudo['segundos']:.1f} s")
+        mostrar_resultado(conteudo)
+        return
 
-        elif tipo_apac_selecionado == "risco_cirurgico":
-            gerar_apac_risco_cirurgico(lista_apacs, dados_fixos_cnes)
-        
-        #messagebox.showinfo("Deu bom!", f"Processo de geração concluído. Arquivos PDF salvos em: {os.path.join(os.path.expanduser('~'), 'Downloads')}")
+    barra_progresso.config(value=0)
+    from utils import ErroGeracaoAPAC, GeracaoCancelada  # já carregado pela thread de geração
+    if isinstance(conteudo, GeracaoCancelada):
+        label_progresso.config(text="Geração cancelada. As partes já concluídas foram mantidas.")
+    elif isinstance(conteudo, ErroGeracaoAPAC):
+        label_progresso.config(text="")
+        messagebox.showerror("Erro", str(conteudo))
+    else:
+        label_progresso.config(text="")
+        messagebox.showerror("Erro", f"Ocorreu um erro ao processar o arquivo: {conteudo}")
+
+def cancelar_geracao():
+    """Pede à thread de geração que pare no próximo bloco."""
+    if gerando and evento_cancelar is not None:
+        evento_cancelar.set()
+        label_progresso.config(text="Cancelando...")
+
+def mostrar_resultado(resultado):
+    """Mostra ao usuário o resumo retornado pela geração."""
+    for falha in resultado["falhas_gravacao"]:
+        messagebox.showerror("Erro", falha)
+
+    puladas = resultado["puladas_diario"]
+    aviso_puladas = f"\n\n{puladas} APAC(s) já geradas anteriormente foram puladas." if puladas else ""
+    if not resultado["arquivos"] and puladas:
+        messagebox.showinfo("Processo Concluído", f"Nenhuma APAC nova para gerar.{aviso_puladas}")
+        return
 
-    except Exception as e:
-        messagebox.showerror("Erro", f"Ocorreu um erro ao processar o arquivo: {e}")
+    if resultado["tipo"] == "oftalmologia":
+        msg = "APACs de oftalmologia geradas com sucesso.\n\n"
+        msg += f"Arquivos salvos em: {resultado['pasta_saida']}\n"
+        if resultado["erros"]:
+            msg += f"\nAlguns blocos apresentaram problemas. Consulte o arquivo de erros."
+        msg += aviso_puladas
+        messagebox.showinfo("Processo Concluído", msg)
+    else:
+        arquivos = "\n".join(resultado["arquivos"])
+        aviso_erros = ""
+        if resultado["erros"]:
+            aviso_erros = f"\n\n{len(resultado['erros'])} APAC(s) recusadas na validação. Consulte o arquivo de erros."
+        messagebox.showinfo("Sucesso", f"APACs geradas com sucesso!\nSalvas em: {arquivos}{aviso_erros}{aviso_puladas}")
 
 def selecionar_tipo_apac(tipo):
     """Controla a seleção visual e lógica das opções de APAC."""
@@ -120,11 +244,27 @@ def selecionar_tipo_apac(tipo):
 
 def verificar_status_botoes():
     """Habilita o botão 'Gerar' se as condições forem atendidas."""
-    if caminho_arquivo and tipo_apac_selecionado:
+    if caminho_arquivo and tipo_apac_selecionado and not gerando:
         label_btn_gerar.config(state=tk.NORMAL, bg=COR_TITULO, relief="raised")
     else:
         label_btn_gerar.config(state=tk.DISABLED, bg=COR_BOTAO_DESABILITADO, relief="flat")
 
+def aplicar_tema():
+    """Aplica o tema ttk (ttkthemes) depois que a janela já foi desenhada."""
+    try:
+        from ttkthemes import ThemedStyle
+    except ImportError:
+        return
+    ThemedStyle(root).set_theme(TEMA_TTK)
+
+def medir_inicializacao(caminho_saida):
+    """Grava o instante em que a janela ficou visível e encerra (benchmarks/inicializacao.py)."""
+    root.wait_visibility()
+    root.update()
+    with open(caminho_saida, "w", encoding="utf-8") as f:
+        f.write(repr(time.time()))
+    root.destroy()
+
 def atualizar_relogio():
     """Atualiza a data e hora na barra inferior."""
     agora = datetime.now()
@@ -136,122 +276,188 @@ def atualizar_relogio():
 # ==============================================================================
 # CONSTRUÇÃO DA INTERFACE GRÁFICA
 # ==============================================================================
-locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
-
-root = ThemedTk(theme="black")
-root.title("Gerador de APAC")
-root.geometry("600x320")
-root.configure(bg=COR_FUNDO)
-
-titulo_top_frame = tk.Frame(root, bg=COR_BORDA, bd=2)
-titulo_top_frame.pack(side="top", fill="x")
-titulo_top = tk.Label(
-    titulo_top_frame,
-    text="Secretaria Municipal de Saúde de Franca/SP\nGerador de APAC's",
-    bg=COR_BORDA,
-    fg=COR_TEXTO,
-    font=FONTE_TITULO
-)
-titulo_top.pack(fill="x", padx=10, pady=5)
-
-main_frame = tk.Frame(root, bg=COR_FUNDO)
-main_frame.pack(fill="both", expand=True, padx=20, pady=20)
-main_frame.grid_columnconfigure(0, weight=1)
-main_frame.grid_columnconfigure(1, weight=1)
-
-bloco_carregar_frame = tk.Frame(main_frame, bg=COR_FUNDO)
-bloco_carregar_frame.grid(row=0, column=0, padx=10, pady=5, sticky="ew")
-bloco_carregar_frame.grid_columnconfigure(0, weight=1)
-
-label_btn_carregar = tk.Label(
-    bloco_carregar_frame,
-    text="CARREGAR ARQUIVO\n\nArquivo não carregado",
-    height=5,
-    bg=COR_TITULO,
-    fg=COR_TEXTO,
-    font=FONTE_PEQUENA,
-    relief="raised",
-    justify="center"
-)
-label_btn_carregar.pack(fill="x")
-label_btn_carregar.bind("<Button-1>", lambda e: carregar_arquivo())
-
-bloco_risco_cirurgico_frame = tk.Frame(main_frame, bg=COR_FUNDO)
-bloco_risco_cirurgico_frame.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
-bloco_risco_cirurgico_frame.grid_columnconfigure(0, weight=1)
-
-label_risco_cirurgico = tk.Label(
-    bloco_risco_cirurgico_frame,
-    text="OCI DE RISCO CIRÚRGICO\n\nGera um arquivo único com as\nOCI's de risco cirúrgico",
-    bg=COR_BOTAO_PADRAO,
-    fg=COR_TEXTO,
-    font=FONTE_PADRAO,
-    padx=10,
-    pady=10,
-    relief="raised",
-    justify="center"
-)
-label_risco_cirurgico.pack(fill="x")
-label_risco_cirurgico.bind("<Button-1>", lambda e: selecionar_tipo_apac("risco_cirurgico"))
-
-bloco_gerar_frame = tk.Frame(main_frame, bg=COR_FUNDO)
-bloco_gerar_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
-bloco_gerar_frame.grid_columnconfigure(0, weight=1)
-
-label_btn_gerar = tk.Label(
-    bloco_gerar_frame,
-    text="GERAR APAC'S",
-    height=5,
-    bg=COR_BOTAO_DESABILITADO,
-    fg=COR_TEXTO,
-    font=FONTE_PEQUENA,
-    relief="flat",
-    state=tk.DISABLED,
-    justify="center"
-)
-label_btn_gerar.pack(fill="x")
-label_btn_gerar.bind("<Button-1>", lambda e: gerar_apacs())
-
-bloco_oftalmologia_frame = tk.Frame(main_frame, bg=COR_FUNDO)
-bloco_oftalmologia_frame.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
-bloco_oftalmologia_frame.grid_columnconfigure(0, weight=1)
-
-label_oftalmologia = tk.Label(
-    bloco_oftalmologia_frame,
-    text="OCI OFTALMOLÓGICA\n\nGera um arquivo para cada\nunidade solicitante digitada",
-    bg=COR_BOTAO_PADRAO,
-    fg=COR_TEXTO,
-    font=FONTE_PADRAO,
-    padx=10,
-    pady=10,
-    relief="raised",
-    justify="center"
-)
-label_oftalmologia.pack(fill="x")
-label_oftalmologia.bind("<Button-1>", lambda e: selecionar_tipo_apac("oftalmologia"))
-
-footer_frame = tk.Frame(root, bg=COR_BORDA, bd=2)
-footer_frame.pack(side="bottom", fill="x")
-
-assinatura_label = tk.Label(
-    footer_frame,
-    text="Desenvolvido por PH",
-    bg=COR_BORDA,
-    fg=COR_TEXTO,
-    font=FONTE_PEQUENA
-)
-assinatura_label.pack(side="left", padx=10, pady=5)
-
-relogio_label = tk.Label(
-    footer_frame,
-    text="",
-    bg=COR_BORDA,
-    fg=COR_TEXTO,
-    font=FONTE_PEQUENA
-)
-relogio_label.pack(side="right", padx=10, pady=5)
-
-locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
-
-atualizar_relogio()
-root.mainloop()
\ No newline at end of file
+if __name__ == "__main__":
+    # Necessário para o pool de processos no executável do PyInstaller (Windows)
+    multiprocessing.freeze_support()
+
+    locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
+
+    root = tk.Tk()
+    root.title("Gerador de APAC")
+    root.geometry("600x400")
+    root.configure(bg=COR_FUNDO)
+
+    titulo_top_frame = tk.Frame(root, bg=COR_BORDA, bd=2)
+    titulo_top_frame.pack(side="top", fill="x")
+    titulo_top = tk.Label(
+        titulo_top_frame,
+        text="Secretaria Municipal de Saúde de Franca/SP\nGerador de APAC's",
+        bg=COR_BORDA,
+        fg=COR_TEXTO,
+        font=FONTE_TITULO
+    )
+    titulo_top.pack(fill="x", padx=10, pady=5)
+
+    main_frame = tk.Frame(root, bg=COR_FUNDO)
+    main_frame.pack(fill="both", expand=True, padx=20, pady=20)
+    main_frame.grid_columnconfigure(0, weight=1)
+    main_frame.grid_columnconfigure(1, weight=1)
+
+    bloco_carregar_frame = tk.Frame(main_frame, bg=COR_FUNDO)
+    bloco_carregar_frame.grid(row=0, column=0, padx=10, pady=5, sticky="ew")
+    bloco_carregar_frame.grid_columnconfigure(0, weight=1)
+
+    label_btn_carregar = tk.Label(
+        bloco_carregar_frame,
+        text="CARREGAR ARQUIVO\n\nArquivo não carregado",
+        height=5,
+        bg=COR_TITULO,
+        fg=COR_TEXTO,
+        font=FONTE_PEQUENA,
+        relief="raised",
+        justify="center"
+    )
+    label_btn_carregar.pack(fill="x")
+    label_btn_carregar.bind("<Button-1>", lambda e: carregar_arquivo())
+
+    bloco_risco_cirurgico_frame = tk.Frame(main_frame, bg=COR_FUNDO)
+    bloco_risco_cirurgico_frame.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
+    bloco_risco_cirurgico_frame.grid_columnconfigure(0, weight=1)
+
+    label_risco_cirurgico = tk.Label(
+        bloco_risco_cirurgico_frame,
+        text="OCI DE RISCO CIRÚRGICO\n\nGera um arquivo único com as\nOCI's de risco cirúrgico",
+        bg=COR_BOTAO_PADRAO,
+        fg=COR_TEXTO,
+        font=FONTE_PADRAO,
+        padx=10,
+        pady=10,
+        relief="raised",
+        justify="center"
+    )
+    label_risco_cirurgico.pack(fill="x")
+    label_risco_cirurgico.bind("<Button-1>", lambda e: selecionar_tipo_apac("risco_cirurgico"))
+
+    bloco_gerar_frame = tk.Frame(main_frame, bg=COR_FUNDO)
+    bloco_gerar_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+    bloco_gerar_frame.grid_columnconfigure(0, weight=1)
+
+    label_btn_gerar = tk.Label(
+        bloco_gerar_frame,
+        text="GERAR APAC'S",
+        height=5,
+        bg=COR_BOTAO_DESABILITADO,
+        fg=COR_TEXTO,
+        font=FONTE_PEQUENA,
+        relief="flat",
+        state=tk.DISABLED,
+        justify="center"
+    )
+    label_btn_gerar.pack(fill="x")
+    label_btn_gerar.bind("<Button-1>", lambda e: gerar_apacs())
+
+    bloco_oftalmologia_frame = tk.Frame(main_frame, bg=COR_FUNDO)
+    bloco_oftalmologia_frame.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
+    bloco_oftalmologia_frame.grid_columnconfigure(0, weight=1)
+
+    label_oftalmologia = tk.Label(
+        bloco_oftalmologia_frame,
+        text="OCI OFTALMOLÓGICA\n\nGera um arquivo para cada\nunidade solicitante digitada",
+        bg=COR_BOTAO_PADRAO,
+        fg=COR_TEXTO,
+        font=FONTE_PADRAO,
+        padx=10,
+        pady=10,
+        relief="raised",
+        justify="center"
+    )
+    label_oftalmologia.pack(fill="x")
+    label_oftalmologia.bind("<Button-1>", lambda e: selecionar_tipo_apac("oftalmologia"))
+
+    bloco_progresso_frame = tk.Frame(main_frame, bg=COR_FUNDO)
+    bloco_progresso_frame.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
+    bloco_progresso_frame.grid_columnconfigure(0, weight=1)
+
+    barra_progresso = ttk.Progressbar(bloco_progresso_frame, mode="determinate", maximum=100)
+    barra_progresso.grid(row=0, column=0, sticky="ew")
+
+    label_btn_cancelar = tk.Label(
+        bloco_progresso_frame,
+        text="CANCELAR",
+        bg=COR_BOTAO_DESABILITADO,
+        fg=COR_TEXTO,
+        font=FONTE_PEQUENA,
+        padx=10,
+        relief="flat",
+        state=tk.DISABLED,
+    )
+    label_btn_cancelar.grid(row=0, column=1, padx=(10, 0))
+    label_btn_cancelar.bind("<Button-1>", lambda e: cancelar_geracao())
+
+    label_progresso = tk.Label(
+        bloco_progresso_frame,
+        text="",
+        bg=COR_FUNDO,
+        fg=COR_TEXTO,
+        font=FONTE_PEQUENA,
+        anchor="w"
+    )
+    label_progresso.grid(row=1, column=0, columnspan=2, sticky="ew")
+
+    pular_ja_geradas = tk.BooleanVar(value=False)
+    check_pular_ja_geradas = tk.Checkbutton(
+        bloco_progresso_frame,
+        text="Pular APACs já geradas em execuções anteriores",
+        variable=pular_ja_geradas,
+        bg=COR_FUNDO,
+        fg=COR_TEXTO,
+        selectcolor=COR_BOTAO_PADRAO,
+        activebackground=COR_FUNDO,
+        activeforeground=COR_TEXTO,
+        font=FONTE_PEQUENA,
+        anchor="w"
+    )
+    check_pular_ja_geradas.grid(row=2, column=0, columnspan=2, sticky="ew")
+
+    # Desligado por padrão: o cache guarda dados dos pacientes em disco (por até 7 dias)
+    guardar_cache_leitura = tk.BooleanVar(value=False)
+    check_guardar_cache_leitura = tk.Checkbutton(
+        bloco_progresso_frame,
+        text="Guardar a leitura do arquivo para reabri-lo mais rápido (dados de pacientes em disco)",
+        variable=guardar_cache_leitura,
+        bg=COR_FUNDO,
+        fg=COR_TEXTO,
+        selectcolor=COR_BOTAO_PADRAO,
+        activebackground=COR_FUNDO,
+        activeforeground=COR_TEXTO,
+        font=FONTE_PEQUENA,
+        anchor="w"
+    )
+    check_guardar_cache_leitura.grid(row=3, column=0, columnspan=2, sticky="ew")
+
+    footer_frame = tk.Frame(root, bg=COR_BORDA, bd=2)
+    footer_frame.pack(side="bottom", fill="x")
+
+    assinatura_label = tk.Label(
+        footer_frame,
+        text="Desenvolvido por PH",
+        bg=COR_BORDA,
+        fg=COR_TEXTO,
+        font=FONTE_PEQUENA
+    )
+    assinatura_label.pack(side="left", padx=10, pady=5)
+
+    relogio_label = tk.Label(
+        footer_frame,
+        text="",
+        bg=COR_BORDA,
+        fg=COR_TEXTO,
+        font=FONTE_PEQUENA
+    )
+    relogio_label.pack(side="right", padx=10, pady=5)
+
+    atualizar_relogio()
+    root.after(0, aplicar_tema)
+    if os.environ.get(VARIAVEL_MEDIR_INICIALIZACAO):
+        root.after(0, medir_inicializacao, os.environ[VARIAVEL_MEDIR_INICIALIZACAO])
+    root.mainloop()
\ No newline at end of file
@@ -0,0 +1,507 @@
+# pipeline.py
+#
+# Geração em estágios ligados por filas limitadas:
+#
+#   leitura -> parse -> enriquecimento -> render -> gravacao
+#
+# leitura, parse e enriquecimento rodam cada um na sua thread (ou num pool de
+# threads/processos), o render fica na thread que chamou a geração e a gravação
+# das partes em outra thread. Uma fila cheia segura o estágio anterior
+# (contrapressão), então a memória fica limitada pela capacidade das filas
+# enquanto o disco grava uma parte, a próxima é desenhada e os blocos seguintes
+# são lidos e extraídos. As métricas de cada estágio (tempo trabalhando, esperas
+# por entrada e por saída, profundidade das filas) mostram onde está o gargalo,
+# por exemplo uma pasta Downloads num compartilhamento de rede lento.
+
+import queue
+import itertools
+import threading
+import collections
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from validacao_apac import registros_validados, validar_registros
+from instrumentacao import INSTRUMENTACAO_DESLIGADA
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+ESTAGIOS = ("leitura", "parse", "enriquecimento", "render", "gravacao")
+
+# Por estágio: threads (0 = roda na thread do estágio seguinte, como antes; na
+# gravação, partes gravadas ao mesmo tempo),
+# processos (pool de processos; só parse e render) e capacidade da fila de saída
+# (itens; na gravação, partes esperando o disco). render.processos é o
+# "processos" da geração (renderização paralela em partes).
+#
+# Por padrão só os estágios que esperam disco (leitura e gravação) ganham
+# thread: parse e enriquecimento são Python puro e disputariam o GIL com o
+# render; para eles valem processos (parse) ou threads quando as consultas
+# esperam E/S (cadastro nacional em disco de rede).
+CONFIGURACAO_PADRAO = {
+    "leitura": {"threads": 1, "capacidade": 512},
+    "parse": {"threads": 0, "processos": 0, "capacidade": 512},
+    "enriquecimento": {"threads": 0, "capacidade": 512},
+    "render": {"processos": 0},
+    "gravacao": {"threads": 2, "capacidade": 1},
+}
+
+# Tudo na thread que chamou a geração (o fluxo de antes dos estágios)
+CONFIGURACAO_SERIAL = {
+    "leitura": {"threads": 0},
+    "parse": {"threads": 0, "processos": 0},
+    "enriquecimento": {"threads": 0},
+    "gravacao": {"threads": 0},
+}
+
+# Blocos enviados de uma vez a cada processo do parse
+BLOCOS_POR_TAREFA_PARSE = 256
+
+# Intervalo com que um estágio bloqueado confere se a geração foi encerrada
+INTERVALO_VERIFICACAO = 0.1
+
+def configuracao_pipeline(configuracao=None):
+    """CONFIGURACAO_PADRAO com as chaves informadas por estágio; ValueError para estágio ou chave desconhecidos."""
+    final = {nome: dict(valores) for nome, valores in CONFIGURACAO_PADRAO.items()}
+    for nome, valores in (configuracao or {}).items():
+        if nome not in final:
+            raise ValueError(f"Estágio desconhecido: {nome} (estágios: {', '.join(ESTAGIOS)})")
+        for chave, valor in valores.items():
+            if chave not in final[nome]:
+                raise ValueError(f"Opção desconhecida para o estágio {nome}: {chave}")
+            if valor is not None:
+                final[nome][chave] = max(int(valor), 0)
+    # O arquivo de entrada é lido em sequência, por uma thread só
+    final["leitura"]["threads"] = min(final["leitura"]["threads"], 1)
+    for valores in final.values():
+        if "capacidade" in valores:
+            valores["capacidade"] = max(valores["capacidade"], 1)
+    return final
+
+def ler_especificacao_estagio(texto):
+    """"parse:processos=2,capacidade=256" -> ("parse", {"processos": 2, "capacidade": 256})."""
+    nome, _, opcoes = texto.partition(":")
+    nome = nome.strip()
+    if nome not in ESTAGIOS or not opcoes:
+        raise ValueError(f"Especificação de estágio inválida: {texto!r} (use ESTAGIO:CHAVE=VALOR[,CHAVE=VALOR])")
+    valores = {}
+    for opcao in opcoes.split(","):
+        chave, igual, valor = opcao.partition("=")
+        if not igual or not valor.strip().isdecimal():
+            raise ValueError(f"Especificação de estágio inválida: {texto!r} (valores são inteiros)")
+        valores[chave.strip()] = int(valor)
+    return nome, valores
+
+# ==============================================================================
+# MÉTRICAS
+# ==============================================================================
+
+class MetricasEstagio:
+    """Tempos e filas de um estágio; atualizada pelas threads do próprio estágio."""
+
+    def __init__(self, nome, modo, trabalhadores, capacidade=None):
+        self.nome = nome
+        self.modo = modo
+        self.trabalhadores = trabalhadores
+        self.capacidade = capacidade
+        self.itens = 0
+        self.inicio = None
+        self.fim = None
+        self.trabalhando = 0.0  # só nos pools: soma do tempo das tarefas
+        self.espera_entrada = 0.0
+        self.bloqueado_saida = 0.0
+        self.soma_fila = 0
+        self.amostras_fila = 0
+        self.fila_maxima = 0
+        self._lock = threading.Lock()
+
+    def comecar(self):
+        if self.inicio is None:
+            self.inicio = perf_counter()
+
+    def terminar(self):
+        if self.inicio is not None and self.fim is None:
+            self.fim = perf_counter()
+
+    def amostrar_fila(self, profundidade):
+        self.soma_fila += profundidade
+        self.amostras_fila += 1
+        if profundidade > self.fila_maxima:
+            self.fila_maxima = profundidade
+
+    def somar_tarefa(self, decorrido):
+        with self._lock:
+            self.trabalhando += decorrido
+
+    def segundos_trabalhando(self):
+        """Nos pools, o tempo médio das tarefas por trabalhador; nas threads, o que sobra das esperas."""
+        if self.modo in ("threads", "processos"):
+            return self.trabalhando / max(self.trabalhadores, 1)
+        ativo = ((self.fim or perf_counter()) - self.inicio) if self.inicio is not None else 0.0
+        return max(ativo - self.espera_entrada - self.bloqueado_saida, 0.0)
+
+    def como_dict(self):
+        ativo = ((self.fim or perf_counter()) - self.inicio) if self.inicio is not None else 0.0
+        trabalhando = self.segundos_trabalhando()
+        return {
+            "modo": self.modo,
+            "trabalhadores": self.trabalhadores,
+            "capacidade_fila": self.capacidade,
+            "itens": self.itens,
+            "segundos_ativo": round(ativo, 4),
+            "segundos_trabalhando": round(trabalhando, 4),
+            "segundos_esperando_entrada": round(self.espera_entrada, 4),
+            "segundos_bloqueado_saida": round(self.bloqueado_saida, 4),
+            "utilizacao": round(trabalhando / ativo, 4) if ativo else 0.0,
+            "fila_media": round(self.soma_fila / self.amostras_fila, 2) if self.amostras_fila else 0.0,
+            "fila_maxima": self.fila_maxima,
+        }
+
+# Estágio da thread atual: quem espera numa fila de entrada soma a espera nele
+_local = threading.local()
+
+def _metricas_da_thread(padrao):
+    return getattr(_local, "metricas", None) or padrao
+
+# ==============================================================================
+# FILAS
+# ==============================================================================
+
+_FIM = object()
+
+class _Falha:
+    """Exceção de um estágio, entregue pela fila para ser levantada no estágio seguinte."""
+    __slots__ = ("erro",)
+
+    def __init__(self, erro):
+        self.erro = erro
+
+def _cronometrar(funcao, item):
+    """Executado no trabalhador (thread ou processo): (segundos, resultado)."""
+    inicio = perf_counter()
+    resultado = funcao(item)
+    return perf_counter() - inicio, resultado
+
+def _registros_do_lote(args):
+    """Executado no processo do parse: (registro, motivos) de um lote de blocos."""
+    blocos, validar = args
+    return list(registros_validados(blocos, validar=validar))
+
+def _em_lotes(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while True:
+        lote = list(itertools.islice(iterador, tamanho))
+        if not lote:
+            return
+        yield lote
+
+# ==============================================================================
+# PIPELINE
+# ==============================================================================
+
+class Pipeline:
+    """Liga os estágios da geração; criado por execução e encerrado no fim dela.
+
+    Uso nas especialidades:
+        for registro, motivos, extra in pipeline.registros(blocos, instrumentacao, validar, enriquecer):
+            ...
+        escritor = EscritorPDF(..., gravador=pipeline.gravador())
+
+    Quem cria o Pipeline chama encerrar() no final (inclusive em erro ou
+    cancelamento), o que para os estágios e espera as gravações pendentes.
+
+    Com a configuração serial nenhuma thread é criada e tudo roda como antes.
+    """
+
+    def __init__(self, configuracao=None, cache_parse=None):
+        self.configuracao = configuracao_pipeline(configuracao)
+        self.cache_parse = cache_parse
+        self.metricas = {}
+        self._parar = threading.Event()
+        self._threads = []
+        self._executores = []
+        self._gravador = None
+        self._consumidor = MetricasEstagio("render", "thread_principal", max(self.configuracao["render"]["processos"], 1))
+
+    # --------------------------------------------------------------------------
+    # Estágios
+    # --------------------------------------------------------------------------
+
+    def fluxo(self, nome, iteravel):
+        """Consome iteravel numa thread do estágio nome e entrega os itens, em ordem, por uma fila limitada."""
+        configuracao = self.configuracao[nome]
+        if not configuracao.get("threads"):
+            return iteravel
+        metricas = self.metricas[nome] = MetricasEstagio(nome, "thread", 1, configuracao["capacidade"])
+        return self._iniciar(metricas, self._produzir, iter(iteravel))
+
+    def mapear(self, nome, funcao, iteravel):
+        """Aplica funcao aos itens com o pool do estágio nome, entregando os resultados na ordem de entrada.
+
+        Com processos, funcao e os itens precisam ser serializáveis (pickle).
+        No máximo capacidade itens ficam em andamento ao mesmo tempo.
+        """
+        configuracao = self.configuracao[nome]
+        processos, threads = configuracao.get("processos", 0), configuracao.get("threads", 0)
+        if processos:
+            executor = ProcessPoolExecutor(max_workers=processos)
+            metricas = MetricasEstagio(nome, "processos", processos, configuracao["capacidade"])
+        elif threads:
+            executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"apac-{nome}")
+            metricas = MetricasEstagio(nome, "threads", threads, configuracao["capacidade"])
+        else:
+            return map(funcao, iteravel)
+        self._executores.append(executor)
+        self.metricas[nome] = metricas
+        return self._iniciar(metricas, self._produzir_mapeado, iter(iteravel), executor, funcao)
+
+    def registros(self, blocos_apac, instrumentacao=None, validar=True, enriquecer=None):
+        """leitura -> parse (+ validação) -> enriquecimento: gera (registro, motivos, enriquecido).
+
+        enriquecer(registro, motivos), se informado, roda no estágio de
+        enriquecimento (consultas às tabelas) e o seu retorno vem em enriquecido.
+
+        Com cache_parse (cache_parse.EntradaCacheParse) com acerto, blocos_apac
+        não é lido: os registros saem do cache direto para a validação; sem
+        acerto, os registros extraídos são gravados no cache antes das consultas.
+        """
+        self._consumidor.comecar()
+        instrumentacao = instrumentacao or INSTRUMENTACAO_DESLIGADA
+        if self.cache_parse is not None and self.cache_parse.acerto:
+            registros = instrumentacao.iterar("cache_parse", self.cache_parse.registros())
+            return self._enriquecer(validar_registros(registros, instrumentacao, validar), enriquecer)
+
+        blocos = self.fluxo("leitura", blocos_apac)
+        if self.configuracao["parse"]["processos"]:
+            lotes = self.mapear(
+                "parse", _registros_do_lote,
+                ((lote, validar) for lote in _em_lotes(blocos, BLOCOS_POR_TAREFA_PARSE)),
+            )
+            itens = itertools.chain.from_iterable(lotes)
+        else:
+            itens = self.fluxo("parse", registros_validados(blocos, instrumentacao, validar))
+        if self.cache_parse is not None:
+            itens = self.cache_parse.anotar(itens)
+        return self._enriquecer(itens, enriquecer)
+
+    def _enriquecer(self, itens, enriquecer):
+        if enriquecer is None:
+            itens = ((registro, motivos, None) for registro, motivos in itens)
+        else:
+            def enriquecer_item(item):
+                registro, motivos = item
+                return registro, motivos, enriquecer(registro, motivos)
+
+            itens = self.mapear("enriquecimento", enriquecer_item, itens)
+        return self._entregar(itens)
+
+    def _entregar(self, itens):
+        """Saída do último estágio para o render (conta os itens consumidos)."""
+        for item in itens:
+            self._consumidor.itens += 1
+            yield item
+
+    def gravador(self):
+        """Gravador das partes (compartilhado pelos escritores da execução), ou None se a gravação for síncrona."""
+        configuracao = self.configuracao["gravacao"]
+        if not configuracao["threads"]:
+            return None
+        if self._gravador is None:
+            metricas = self.metricas["gravacao"] = MetricasEstagio(
+                "gravacao", "threads", configuracao["threads"], configuracao["capacidade"]
+            )
+            self._gravador = Gravador(metricas, configuracao["threads"], configuracao["capacidade"], self._consumidor)
+        return self._gravador
+
+    # --------------------------------------------------------------------------
+    # Encerramento e relatório
+    # --------------------------------------------------------------------------
+
+    def encerrar(self):
+        """Para os estágios que ainda estiverem rodando (cancelamento ou erro) e espera as threads."""
+        self._parar.set()
+        for thread in self._threads:
+            thread.join()
+        for executor in self._executores:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if self._gravador is not None:
+            self._gravador.encerrar()
+        self._consumidor.terminar()
+
+    def relatorio(self):
+        """{estágio: métricas} na ordem do fluxo, mais o estágio que mais trabalhou (o gargalo)."""
+        self.metricas["render"] = self._consumidor
+        estagios = {nome: self.metricas[nome].como_dict() for nome in ESTAGIOS if nome in self.metricas}
+        gargalo = max(estagios, key=lambda nome: estagios[nome]["segundos_trabalhando"], default=None)
+        return {"estagios": estagios, "gargalo": gargalo}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.encerrar()
+
+    # --------------------------------------------------------------------------
+    # Threads dos estágios
+    # --------------------------------------------------------------------------
+
+    def _iniciar(self, metricas, alvo, *args):
+        fila = queue.Queue(metricas.capacidade)
+        parar = threading.Event()
+        thread = threading.Thread(target=alvo, args=(metricas, fila, parar) + args,
+                                  name=f"apac-{metricas.nome}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+        return self._consumir(metricas, fila, parar)
+
+    def _colocar(self, metricas, fila, parar, item):
+        """Põe o item na fila; com ela cheia, espera (contrapressão) até haver vaga ou a geração parar."""
+        try:
+            fila.put_nowait(item)
+        except queue.Full:
+            inicio = perf_counter()
+            while True:
+                if parar.is_set() or self._parar.is_set():
+                    return False
+                try:
+                    fila.put(item, timeout=INTERVALO_VERIFICACAO)
+                    break
+                except queue.Full:
+                    continue
+            metricas.bloqueado_saida += perf_counter() - inicio
+        metricas.amostrar_fila(fila.qsize())
+        return True
+
+    def _produzir(self, metricas, fila, parar, iterador):
+        _local.metricas = metricas
+        metricas.comecar()
+        try:
+            for item in iterador:
+                if not self._colocar(metricas, fila, parar, item):
+                    return
+                metricas.itens += 1
+        except BaseException as erro:
+            self._colocar(metricas, fila, parar, _Falha(erro))
+        else:
+            self._colocar(metricas, fila, parar, _FIM)
+        finally:
+            fechar = getattr(iterador, "close", None)
+            if fechar is not None:
+                fechar()
+            metricas.terminar()
+
+    def _produzir_mapeado(self, metricas, fila, parar, iterador, executor, funcao):
+        _local.metricas = metricas
+        metricas.comecar()
+        em_andamento = collections.deque()
+
+        def entregar_primeiro():
+            decorrido, resultado = em_andamento.popleft().result()
+            metricas.somar_tarefa(decorrido)
+            metricas.itens += 1
+            return self._colocar(metricas, fila, parar, resultado)
+
+        try:
+            for item in iterador:
+                em_andamento.append(executor.submit(_cronometrar, funcao, item))
+                if len(em_andamento) >= metricas.capacidade and not entregar_primeiro():
+                    return
+            while em_andamento:
+                if not entregar_primeiro():
+                    return
+        except BaseException as erro:
+            self._colocar(metricas, fila, parar, _Falha(erro))
+        else:
+            self._colocar(metricas, fila, parar, _FIM)
+        finally:
+            for futuro in em_andamento:
+                futuro.cancel()
+            fechar = getattr(iterador, "close", None)
+            if fechar is not None:
+                fechar()
+            metricas.terminar()
+
+    def _consumir(self, metricas, fila, parar):
+        """Lado de saída de um estágio: a espera por itens conta para o estágio de quem consome."""
+        consumidor = _metricas_da_thread(self._consumidor)
+        consumidor.comecar()
+        terminou = False
+        try:
+            while True:
+                try:
+                    item = fila.get_nowait()
+                except queue.Empty:
+                    inicio = perf_counter()
+                    while True:
+                        try:
+                            item = fila.get(timeout=INTERVALO_VERIFICACAO)
+                            break
+                        except queue.Empty:
+                            if self._parar.is_set():
+                                return
+                    consumidor.espera_entrada += perf_counter() - inicio
+                if item is _FIM:
+                    terminou = True
+                    return
+                if isinstance(item, _Falha):
+                    terminou = True
+                    raise item.erro
+                yield item
+        finally:
+            if not terminou:
+                # Consumidor abandonou o fluxo (cancelamento ou erro): libera o produtor
+                parar.set()
+                try:
+                    while True:
+                        fila.get_nowait()
+                except queue.Empty:
+                    pass
+
+# ==============================================================================
+# GRAVAÇÃO
+# ==============================================================================
+
+class Gravador:
+    """Grava as partes em threads próprias, com no máximo capacidade partes esperando o disco.
+
+    enviar() devolve um Future; quem envia decide quando recolher o resultado
+    (o EscritorPDF recolhe na própria thread, então ao_gravar/diário não mudam
+    de thread). Com a fila cheia, enviar() espera: a espera conta como bloqueio
+    de saída do render.
+    """
+
+    def __init__(self, metricas, threads, capacidade, metricas_render):
+        self.metricas = metricas
+        self._metricas_render = metricas_render
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="apac-gravacao")
+        self._vagas = threading.BoundedSemaphore(capacidade + threads)
+        self._pendentes = 0
+        self._lock = threading.Lock()
+
+    def enviar(self, funcao, *args):
+        metricas_origem = _metricas_da_thread(self._metricas_render)
+        if not self._vagas.acquire(blocking=False):
+            inicio = perf_counter()
+            self._vagas.acquire()
+            metricas_origem.bloqueado_saida += perf_counter() - inicio
+        self.metricas.comecar()
+        with self._lock:
+            self._pendentes += 1
+            self.metricas.amostrar_fila(self._pendentes)
+        return self._executor.submit(self._executar, funcao, args)
+
+    def _executar(self, funcao, args):
+        inicio = perf_counter()
+        try:
+            return funcao(*args)
+        finally:
+            self.metricas.somar_tarefa(perf_counter() - inicio)
+            with self._lock:
+                self._pendentes -= 1
+                self.metricas.itens += 1
+            self._vagas.release()
+
+    def encerrar(self):
+        self._executor.shutdown(wait=True)
+        self.metricas.terminar()
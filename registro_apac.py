@@ -0,0 +1,186 @@
+# registro_apac.py
+
+import sys
+import hashlib
+
+from utils import SECUNDARIOS_NO_FORMULARIO, extrair_dados_variaveis, extrair_procedimentos
+
+# ==============================================================================
+# CAMPOS DO REGISTRO
+# ==============================================================================
+
+# Extraídos do bloco por extrair_dados_variaveis
+CAMPOS_VARIAVEIS = (
+    "CPF_PACIENTE",
+    "NOME_PACIENTE",
+    "SEXO",
+    "DATA_NASCIMENTO",
+    "RACA_COR",
+    "NOME_MAE",
+    "NOME_RESPONSAVEL",
+    "ENDERECO",
+    "CEP",
+    "DATA_SOLICITACAO",
+    "VALIDADE_FIM",
+    "NUMERO_APAC",
+    "CNES_ESTABELECIMENTO",
+    "CID10_PRINCIPAL",
+    "CNS_SOLICITANTE",
+    "CNS_AUTORIZADOR",
+)
+
+# Extraídos da seção de procedimentos por extrair_procedimentos
+CAMPOS_PROCEDIMENTO = (
+    "PROC_PRINCIPAL_COD",
+    "CNES_SOLICITANTE",
+)
+
+# Preenchidos pela especialidade a partir das tabelas de consulta
+CAMPOS_COMPLEMENTARES = (
+    "NOME_SOLICITANTE",
+    "DOC_SOLICITANTE",
+    "NOME_AUTORIZADOR",
+    "DOC_AUTORIZADOR",
+    "DESC_DIAGNOSTICO",
+    "NOME_ESTABELECIMENTO",
+    "NOME_ESTAB_SOLICITANTE",
+)
+
+CAMPOS_REGISTRO = CAMPOS_VARIAVEIS + CAMPOS_PROCEDIMENTO + CAMPOS_COMPLEMENTARES
+
+# Controle interno; não vão para o PDF. PROCEDIMENTOS guarda as linhas
+# (utils.LinhaProcedimento) da tabela do arquivo, a principal primeiro.
+CAMPOS_CONTROLE = (
+    "HASH_BLOCO",
+    "PROCEDIMENTOS",
+)
+
+_CAMPOS_ESTADO = CAMPOS_REGISTRO + CAMPOS_CONTROLE
+
+# Valores que se repetem entre APACs: ficam internados (uma única cópia por processo)
+CAMPOS_INTERNADOS = frozenset((
+    "SEXO",
+    "RACA_COR",
+    "CEP",
+    "DATA_SOLICITACAO",
+    "VALIDADE_FIM",
+    "CNES_ESTABELECIMENTO",
+    "CID10_PRINCIPAL",
+    "CNS_SOLICITANTE",
+    "CNS_AUTORIZADOR",
+    "PROC_PRINCIPAL_COD",
+    "CNES_SOLICITANTE",
+    "NOME_SOLICITANTE",
+    "DOC_SOLICITANTE",
+    "NOME_AUTORIZADOR",
+    "DOC_AUTORIZADOR",
+    "DESC_DIAGNOSTICO",
+    "NOME_ESTABELECIMENTO",
+    "NOME_ESTAB_SOLICITANTE",
+))
+
+# Tabelas de procedimentos iguais (mesmos códigos, CBO e CNES) compartilham uma única tupla
+_PROCEDIMENTOS_INTERNADOS = {}
+
+def internar_procedimentos(linhas):
+    linhas = tuple(linhas or ())
+    return _PROCEDIMENTOS_INTERNADOS.setdefault(linhas, linhas)
+
+# ==============================================================================
+# REGISTRO
+# ==============================================================================
+
+class RegistroAPAC:
+    """Uma APAC extraída uma única vez do bloco e reaproveitada por render, erros e contagem.
+
+    Os atributos têm o mesmo nome das chaves usadas no layout do PDF.
+    """
+    __slots__ = _CAMPOS_ESTADO
+
+    def __init__(self, **valores):
+        for campo in _CAMPOS_ESTADO:
+            self.definir(campo, valores.get(campo, ""))
+
+    def definir(self, campo, valor):
+        """Atribui um campo, internando os valores que se repetem entre APACs."""
+        if campo == "PROCEDIMENTOS":
+            setattr(self, campo, internar_procedimentos(valor))
+            return
+        valor = "" if valor is None else str(valor)
+        if campo in CAMPOS_INTERNADOS:
+            valor = sys.intern(valor)
+        setattr(self, campo, valor)
+
+    def completar(self, **valores):
+        for campo, valor in valores.items():
+            self.definir(campo, valor)
+
+    def como_dados(self, dados_fixos=None):
+        """Monta o dicionário de uma página: dados fixos da especialidade + campos do registro."""
+        dados = dict(dados_fixos) if dados_fixos else {}
+        for campo in CAMPOS_REGISTRO:
+            dados[campo] = getattr(self, campo)
+        return dados
+
+    def procedimentos_do_formulario(self, secundarios_padrao=()):
+        """(quantidade do principal, secundários (cod, nome, qtd)) como constam na tabela do arquivo.
+
+        Vão no máximo SECUNDARIOS_NO_FORMULARIO secundários (as linhas do
+        formulário). Sem secundários na tabela, ficam os secundarios_padrao
+        (dicionários cod/nome/qtd da especialidade); o nome padrão também cobre
+        uma linha que venha sem descrição.
+        """
+        nomes_padrao = {sec["cod"]: sec["nome"] for sec in secundarios_padrao}
+        principal = self.PROCEDIMENTOS[:1]
+        qtd_principal = (principal[0].qtd if principal else "") or "1"
+        linhas = self.PROCEDIMENTOS[1:1 + SECUNDARIOS_NO_FORMULARIO]
+        if linhas:
+            secundarios = tuple(
+                (linha.cod, linha.descricao or nomes_padrao.get(linha.cod, ""), linha.qtd or "1")
+                for linha in linhas
+            )
+        else:
+            secundarios = tuple((sec["cod"], sec["nome"], sec["qtd"]) for sec in secundarios_padrao)
+        return qtd_principal, secundarios
+
+    def __getstate__(self):
+        return tuple(getattr(self, campo) for campo in _CAMPOS_ESTADO)
+
+    def __setstate__(self, estado):
+        for campo, valor in zip(_CAMPOS_ESTADO, estado):
+            self.definir(campo, valor)
+
+    def __repr__(self):
+        return f"RegistroAPAC(NUMERO_APAC={self.NUMERO_APAC!r}, NOME_PACIENTE={self.NOME_PACIENTE!r})"
+
+# Versão da extração (extrair_registro): entra na chave do cache_parse, então
+# qualquer mudança no que é extraído de um bloco precisa aumentá-la
+VERSAO_PARSER = 1
+
+def hash_bloco(bloco):
+    """Hash do conteúdo do bloco, usado pelo diário para reconhecer a mesma APAC entre exportações."""
+    return hashlib.blake2b(bloco.strip().encode("utf-8"), digest_size=16).hexdigest()
+
+def extrair_registro(bloco):
+    """Extrai o RegistroAPAC de um bloco de texto, ou None se o bloco não for uma APAC."""
+    dados_variaveis = extrair_dados_variaveis(bloco)
+    if not dados_variaveis:
+        return None
+
+    principal, secundarios, cod_cnes_solicitante = extrair_procedimentos(
+        bloco, cnes_unidade=dados_variaveis["CNES_ESTABELECIMENTO"]
+    )
+    return RegistroAPAC(
+        HASH_BLOCO=hash_bloco(bloco),
+        PROCEDIMENTOS=(principal,) + secundarios if principal else (),
+        PROC_PRINCIPAL_COD=principal.cod if principal else "",
+        CNES_SOLICITANTE=cod_cnes_solicitante,
+        **dados_variaveis,
+    )
+
+def extrair_registros(blocos_apac):
+    """Gera um RegistroAPAC por bloco válido, sob demanda."""
+    for bloco in blocos_apac:
+        registro = extrair_registro(bloco)
+        if registro is not None:
+            yield registro
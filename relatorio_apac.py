@@ -0,0 +1,235 @@
+# relatorio_apac.py
+#
+# Relatório estruturado de uma execução (JSON e CSV), acumulado registro a
+# registro durante a geração: contagens por CNES solicitante/executante e por
+# procedimento, faixa numérica das APACs com lacunas e erros por motivo. Não há
+# nenhuma passada extra pelos dados.
+
+import os
+import csv
+import json
+import bisect
+from datetime import datetime
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+# Lacunas listadas uma a uma no JSON; acima disso só entram os totais
+LACUNAS_LISTADAS = 1000
+
+# Planilhas em português: ';' como separador e BOM para o Excel reconhecer o UTF-8
+DELIMITADOR_CSV = ";"
+ENCODING_CSV = "utf-8-sig"
+
+COLUNAS_CSV = (
+    "tipo",
+    "cnes_solicitante",
+    "estabelecimento_solicitante",
+    "cnes_executante",
+    "estabelecimento_executante",
+    "procedimento_cod",
+    "procedimento_nome",
+    "quantidade",
+)
+
+def sequencial_apac(numero_apac):
+    """Parte sequencial do número da APAC (sem o dígito verificador), como inteiro, ou None."""
+    digitos = "".join(c for c in numero_apac if c.isdigit())
+    if len(digitos) < 2:
+        return None
+    return int(digitos[:-1])
+
+# ==============================================================================
+# FAIXAS DE NÚMEROS
+# ==============================================================================
+
+class _Faixas:
+    """Conjunto de inteiros guardado como faixas contínuas [início, fim] ordenadas.
+
+    Numa exportação as APACs são quase sempre sequenciais, então o número de
+    faixas fica pequeno e cada inclusão custa uma busca binária.
+    """
+    __slots__ = ("inicios", "fins", "repetidos")
+
+    def __init__(self):
+        self.inicios = []
+        self.fins = []
+        self.repetidos = 0
+
+    def adicionar(self, n):
+        i = bisect.bisect_right(self.inicios, n) - 1
+        if i >= 0 and n <= self.fins[i]:
+            self.repetidos += 1
+            return
+        junta_anterior = i >= 0 and self.fins[i] == n - 1
+        junta_proxima = i + 1 < len(self.inicios) and self.inicios[i + 1] == n + 1
+        if junta_anterior and junta_proxima:
+            self.fins[i] = self.fins[i + 1]
+            del self.inicios[i + 1], self.fins[i + 1]
+        elif junta_anterior:
+            self.fins[i] = n
+        elif junta_proxima:
+            self.inicios[i + 1] = n
+        else:
+            self.inicios.insert(i + 1, n)
+            self.fins.insert(i + 1, n)
+
+    def lacunas(self):
+        """Faixas [início, fim] ausentes entre o menor e o maior número."""
+        return [(fim + 1, inicio - 1) for fim, inicio in zip(self.fins, self.inicios[1:])]
+
+# ==============================================================================
+# RELATÓRIO
+# ==============================================================================
+
+class RelatorioExecucao:
+    """Agregador alimentado durante a geração, uma chamada por APAC.
+
+        relatorio.adicionar(registro, cod_procedimento, nome_procedimento)  # APAC desenhada
+        relatorio.rejeitar(numero_apac, motivo, ...)                        # APAC recusada
+
+    No fim, gravar() escreve apac_relatorio_<carimbo>.json e .csv.
+    """
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+        self.total = 0
+        self.rejeitadas = 0
+        # (cnes solicitante, cnes executante, procedimento) -> quantidade, na ordem em que aparecem
+        self._contagens = {}
+        self._nomes_procedimentos = {}
+        self._nomes_estabelecimentos = {}
+        self._erros_por_motivo = {}
+        self._faixas = _Faixas()
+        self._menor = self._maior = None  # (sequencial, número como veio no arquivo)
+
+    def _numero(self, numero_apac):
+        sequencial = sequencial_apac(numero_apac) if numero_apac else None
+        if sequencial is None:
+            return
+        self._faixas.adicionar(sequencial)
+        if self._menor is None or sequencial < self._menor[0]:
+            self._menor = (sequencial, numero_apac)
+        if self._maior is None or sequencial > self._maior[0]:
+            self._maior = (sequencial, numero_apac)
+
+    def adicionar(self, registro, cod_procedimento, nome_procedimento):
+        chave = (registro.CNES_SOLICITANTE, registro.CNES_ESTABELECIMENTO, cod_procedimento)
+        self._contagens[chave] = self._contagens.get(chave, 0) + 1
+        self._nomes_procedimentos.setdefault(cod_procedimento, nome_procedimento)
+        self._nomes_estabelecimentos.setdefault(registro.CNES_SOLICITANTE, registro.NOME_ESTAB_SOLICITANTE)
+        self._nomes_estabelecimentos.setdefault(registro.CNES_ESTABELECIMENTO, registro.NOME_ESTABELECIMENTO)
+        self.total += 1
+        self._numero(registro.NUMERO_APAC)
+
+    def rejeitar(self, numero_apac, *motivos):
+        """Uma APAC recusada, com um ou mais motivos (cada um contado em erros_por_motivo)."""
+        for motivo in motivos:
+            self._erros_por_motivo[motivo] = self._erros_por_motivo.get(motivo, 0) + 1
+        self.rejeitadas += 1
+        self._numero(numero_apac)
+
+    # --------------------------------------------------------------------------
+    # Totais derivados
+    # --------------------------------------------------------------------------
+
+    def _somar_por(self, posicao):
+        totais = {}
+        for chave, quantidade in self._contagens.items():
+            totais[chave[posicao]] = totais.get(chave[posicao], 0) + quantidade
+        return totais
+
+    def por_cnes_solicitante(self):
+        return self._somar_por(0)
+
+    def por_cnes_executante(self):
+        return self._somar_por(1)
+
+    def por_procedimento(self):
+        return self._somar_por(2)
+
+    def procedimentos_por_cnes_solicitante(self):
+        """{cnes solicitante: {nome do procedimento: quantidade}}, na ordem em que apareceram."""
+        resumo = {}
+        for (solicitante, _, procedimento), quantidade in self._contagens.items():
+            nomes = resumo.setdefault(solicitante, {})
+            nome = self._nomes_procedimentos[procedimento]
+            nomes[nome] = nomes.get(nome, 0) + quantidade
+        return resumo
+
+    def faixa_apacs(self):
+        lacunas = self._faixas.lacunas()
+        return {
+            "inicial": self._menor[1] if self._menor else "",
+            "final": self._maior[1] if self._maior else "",
+            "numeros_distintos": sum(fim - inicio + 1 for inicio, fim in zip(self._faixas.inicios, self._faixas.fins)),
+            "repetidos": self._faixas.repetidos,
+            "total_lacunas": len(lacunas),
+            "numeros_faltando": sum(fim - inicio + 1 for inicio, fim in lacunas),
+            # Sequenciais sem o dígito verificador, com os 12 dígitos do número da APAC
+            "lacunas": [
+                {"de": f"{inicio:012d}", "ate": f"{fim:012d}", "quantidade": fim - inicio + 1}
+                for inicio, fim in lacunas[:LACUNAS_LISTADAS]
+            ],
+        }
+
+    # --------------------------------------------------------------------------
+    # Saída
+    # --------------------------------------------------------------------------
+
+    def como_dict(self, **extras):
+        nomes = self._nomes_estabelecimentos
+        return {
+            "tipo": self.tipo,
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            **extras,
+            "total_apacs": self.total,
+            "total_rejeitadas": self.rejeitadas,
+            "erros_por_motivo": dict(self._erros_por_motivo),
+            "apacs": self.faixa_apacs(),
+            "por_cnes_solicitante": [
+                {"cnes": cnes, "estabelecimento": nomes.get(cnes, ""), "quantidade": quantidade}
+                for cnes, quantidade in self.por_cnes_solicitante().items()
+            ],
+            "por_cnes_executante": [
+                {"cnes": cnes, "estabelecimento": nomes.get(cnes, ""), "quantidade": quantidade}
+                for cnes, quantidade in self.por_cnes_executante().items()
+            ],
+            "por_procedimento": [
+                {"cod": cod, "nome": self._nomes_procedimentos[cod], "quantidade": quantidade}
+                for cod, quantidade in self.por_procedimento().items()
+            ],
+        }
+
+    def linhas_csv(self):
+        """Uma linha por (CNES solicitante, CNES executante, procedimento), pronta para planilha."""
+        nomes = self._nomes_estabelecimentos
+        for (solicitante, executante, procedimento), quantidade in self._contagens.items():
+            yield (self.tipo, solicitante, nomes.get(solicitante, ""), executante, nomes.get(executante, ""),
+                   procedimento, self._nomes_procedimentos[procedimento], quantidade)
+
+    def texto_contagem(self):
+        """Conteúdo do apac_contagem_<data>.txt (formato livre usado desde a primeira versão)."""
+        linhas = []
+        for cnes, procedimentos in self.procedimentos_por_cnes_solicitante().items():
+            linhas.append(f"CNES {cnes}: {sum(procedimentos.values())} APAC(s)")
+            linhas.extend(f"{nome}: {quantidade}" for nome, quantidade in procedimentos.items())
+            linhas.append("")
+        linhas.append(f"Total Geral: {self.total}\n")
+        if self._menor and self._maior:
+            linhas.append(f"APAC Inicial: {self._menor[1]}")
+            linhas.append(f"APAC Final: {self._maior[1]}")
+        return "\n".join(linhas) + "\n"
+
+    def gravar(self, pasta, carimbo, **extras):
+        """Grava apac_relatorio_<carimbo>.json e .csv em pasta; retorna os caminhos."""
+        caminho_json = os.path.join(pasta, f"apac_relatorio_{carimbo}.json")
+        caminho_csv = os.path.join(pasta, f"apac_relatorio_{carimbo}.csv")
+        with open(caminho_json, "w", encoding="utf-8") as f:
+            json.dump(self.como_dict(**extras), f, ensure_ascii=False, indent=2)
+        with open(caminho_csv, "w", encoding=ENCODING_CSV, newline="") as f:
+            escritor = csv.writer(f, delimiter=DELIMITADOR_CSV)
+            escritor.writerow(COLUNAS_CSV)
+            escritor.writerows(self.linhas_csv())
+        return {"arquivo_relatorio": caminho_json, "arquivo_relatorio_csv": caminho_csv}
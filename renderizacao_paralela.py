@@ -0,0 +1,133 @@
+# renderizacao_paralela.py
+
+import os
+import math
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from utils import APAC_PDF, GeracaoCancelada, verificar_cancelamento
+
+try:
+    # pypdf é opcional: sem ele não há como juntar as partes, e a renderização fica serial
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+# Abaixo disso, dividir o trabalho custa mais (processos + junção) do que renderizar direto
+PAGINAS_MINIMAS_POR_FATIA = 200
+
+# Segundos entre verificações do cancelamento enquanto as fatias são desenhadas
+INTERVALO_CANCELAMENTO = 0.2
+
+def paralelismo_disponivel():
+    """Indica se a renderização paralela pode ser usada (pypdf instalado)."""
+    return PdfWriter is not None
+
+def processos_efetivos(processos, total_paginas):
+    """Número de processos realmente usados; 1 significa renderização serial."""
+    if not processos or processos <= 1 or not paralelismo_disponivel():
+        return 1
+    return max(1, min(processos, total_paginas // PAGINAS_MINIMAS_POR_FATIA))
+
+# ==============================================================================
+# RENDERIZAÇÃO
+# ==============================================================================
+
+# Nos processos filhos: evento (multiprocessing.Event) acionado quando a geração é cancelada
+_cancelamento_pool = None
+
+def _iniciar_processo(cancelamento):
+    global _cancelamento_pool
+    _cancelamento_pool = cancelamento
+
+def _renderizar_fatia(paginas, caminho_parte, opcoes_pdf):
+    """Executado no processo filho: renderiza uma fatia de páginas em um APAC_PDF próprio.
+
+    Uma fatia em andamento para na página seguinte ao cancelamento, sem gravar a parte.
+    """
+    pdf = APAC_PDF(orientacao='P', **opcoes_pdf)
+    for dados_fixos, registro in paginas:
+        if _cancelamento_pool is not None and _cancelamento_pool.is_set():
+            raise GeracaoCancelada("Geração cancelada pelo usuário.")
+        pdf.add_apac_page(registro.como_dados(), fixos=dados_fixos)
+    pdf.output(caminho_parte)
+    return caminho_parte
+
+def _juntar_partes(caminhos_partes, caminho_saida):
+    """Junta as partes na ordem original; o template repetido em cada parte é deduplicado."""
+    writer = PdfWriter()
+    for caminho_parte in caminhos_partes:
+        writer.append(caminho_parte)
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    with open(caminho_saida, "wb") as f:
+        writer.write(f)
+
+def _aguardar(futuros, cancelar, cancelamento):
+    """Espera as fatias terminarem, verificando o cancelamento entre uma e outra."""
+    pendentes = set(futuros)
+    while pendentes:
+        if cancelar is not None and cancelar.is_set():
+            # Os processos filhos param na próxima página
+            cancelamento.set()
+            verificar_cancelamento(cancelar)
+        _, pendentes = wait(pendentes, timeout=INTERVALO_CANCELAMENTO, return_when=FIRST_COMPLETED)
+
+def renderizar_saidas(paginas_por_saida, processos=1, opcoes_pdf=None, cancelar=None):
+    """Renderiza cada PDF de saída a partir das suas páginas.
+
+    paginas_por_saida: {caminho_saida: [(dados_fixos, RegistroAPAC), ...]} na ordem desejada.
+    Os dicionários de cada página só são montados dentro do processo que a desenha.
+    Com processos > 1, as páginas de todas as saídas são divididas em fatias
+    renderizadas por um pool de processos e depois juntadas em cada arquivo final,
+    na ordem original. Sem pypdf, ou com poucas páginas, tudo é feito em série.
+
+    cancelar (threading.Event) é verificado entre as saídas (em série) ou
+    enquanto as fatias são desenhadas; ao ser acionado, as fatias que ainda não
+    começaram são descartadas, as em andamento param na página seguinte e
+    GeracaoCancelada é levantada.
+    """
+    opcoes_pdf = opcoes_pdf or {}
+    total_paginas = sum(len(paginas) for paginas in paginas_por_saida.values())
+    processos = processos_efetivos(processos, total_paginas)
+
+    if processos == 1:
+        for caminho_saida, paginas in paginas_por_saida.items():
+            verificar_cancelamento(cancelar)
+            _renderizar_fatia(paginas, caminho_saida, opcoes_pdf)
+        return
+
+    tamanho_fatia = max(PAGINAS_MINIMAS_POR_FATIA, math.ceil(total_paginas / processos))
+    pasta_partes = tempfile.mkdtemp(prefix="apac_partes_", dir=os.path.dirname(next(iter(paginas_por_saida))) or None)
+    try:
+        cancelamento = multiprocessing.Event()
+        executor = ProcessPoolExecutor(
+            max_workers=processos, initializer=_iniciar_processo, initargs=(cancelamento,)
+        )
+        try:
+            futuros_por_saida = {}
+            for n_saida, (caminho_saida, paginas) in enumerate(paginas_por_saida.items()):
+                futuros = []
+                for n_fatia, inicio in enumerate(range(0, len(paginas), tamanho_fatia)):
+                    caminho_parte = os.path.join(pasta_partes, f"saida{n_saida}_parte{n_fatia:05d}.pdf")
+                    fatia = paginas[inicio:inicio + tamanho_fatia]
+                    futuros.append(executor.submit(_renderizar_fatia, fatia, caminho_parte, opcoes_pdf))
+                futuros_por_saida[caminho_saida] = futuros
+
+            for caminho_saida, futuros in futuros_por_saida.items():
+                _aguardar(futuros, cancelar, cancelamento)
+                caminhos_partes = [futuro.result() for futuro in futuros]
+                if len(caminhos_partes) == 1:
+                    shutil.move(caminhos_partes[0], caminho_saida)
+                else:
+                    _juntar_partes(caminhos_partes, caminho_saida)
+        finally:
+            # Em erro ou cancelamento, as fatias ainda na fila não chegam a ser desenhadas
+            executor.shutdown(wait=True, cancel_futures=True)
+    finally:
+        shutil.rmtree(pasta_partes, ignore_errors=True)
@@ -1,17 +1,12 @@
 # risco_cirurgico.py
 
 import os
-from tkinter import messagebox
-from fpdf import FPDF
-from datetime import datetime
 from utils import (
-    extrair_dados_variaveis,
-    extrair_principal_e_cnes,
-    APAC_PDF,
     buscar_nome_medico_por_cns,
     buscar_descricao_cnes,
     buscar_descricao_cid
 )
+from geracao_apac import Especialidade, gerar_apacs
 
 # ============================================================================== 
 # CONFIGURAÇÃO FIXA PARA RISCO CIRÚRGICO
@@ -28,80 +23,87 @@ PROC_SECUNDARIOS = [
     {"cod": "030101007-2", "nome": "CONSULTA MEDICA EM ATENCAO ESPECIALIZADA", "qtd": "2"},
 ]
 
+def dados_fixos_risco_cirurgico(dados_fixos_genericos, secundarios=None, qtd_principal=None):
+    """Campos que só dependem dos procedimentos (montados uma vez por combinação).
+
+    secundarios são (cod, nome, qtd) da tabela do arquivo
+    (RegistroAPAC.procedimentos_do_formulario); sem eles ficam PROC_SECUNDARIOS.
+    """
+    if secundarios is None:
+        secundarios = [(sec["cod"], sec["nome"], sec["qtd"]) for sec in PROC_SECUNDARIOS]
+    dados = {
+        **dados_fixos_genericos,
+        "PROC_PRINCIPAL_COD": PROC_PRINCIPAL["cod"],
+        "PROC_PRINCIPAL_NOME": PROC_PRINCIPAL["descricao"],
+        "PROC_PRINCIPAL_QTD": qtd_principal or PROC_PRINCIPAL["qtd"],
+        "COD_ORGAO_EMISSOR": "M351620001",
+        "OBSERVACOES": "Avaliação cardiológica pré-operatória",
+    }
+    for j, (cod, nome, qtd) in enumerate(secundarios, start=1):
+        dados[f"PROC_SEC{j}_COD"] = cod
+        dados[f"PROC_SEC{j}_NOME"] = nome
+        dados[f"PROC_SEC{j}_QTD"] = qtd
+    return dados
+
+def procedimentos_do_formulario(registro):
+    """(quantidade do principal, secundários) do formulário de risco cirúrgico.
+
+    A tabela do arquivo só é usada quando o principal dela é o de risco
+    cirúrgico; em qualquer outro caso o formulário mantém os procedimentos fixos.
+    """
+    if registro.PROC_PRINCIPAL_COD != PROC_PRINCIPAL["cod"]:
+        return PROC_PRINCIPAL["qtd"], None
+    return registro.procedimentos_do_formulario(PROC_SECUNDARIOS)
+
+def completar_registro(registro, dados_fixos_genericos, cnes_padrao):
+    """Preenche no registro os nomes e descrições vindos das tabelas de consulta."""
+    # Usa o CNES do bloco (caso exista) ou o CNES padrão do estabelecimento
+    cnes_solicitante = registro.CNES_SOLICITANTE or cnes_padrao
+    registro.completar(
+        # O formulário de risco cirúrgico sempre usa o procedimento principal fixo
+        PROC_PRINCIPAL_COD=PROC_PRINCIPAL["cod"],
+        CNES_SOLICITANTE=cnes_solicitante,
+        NOME_ESTAB_SOLICITANTE=buscar_descricao_cnes(cnes_solicitante),
+        DESC_DIAGNOSTICO=buscar_descricao_cid(registro.CID10_PRINCIPAL),
+        NOME_SOLICITANTE=buscar_nome_medico_por_cns(registro.CNS_SOLICITANTE),
+        DOC_SOLICITANTE=registro.CNS_SOLICITANTE,
+        NOME_AUTORIZADOR=buscar_nome_medico_por_cns(registro.CNS_AUTORIZADOR),
+        DOC_AUTORIZADOR=registro.CNS_AUTORIZADOR,
+        NOME_ESTABELECIMENTO=dados_fixos_genericos.get("NOME_ESTABELECIMENTO", ""),
+    )
+
 # ============================================================================== 
-# FUNÇÃO PRINCIPAL
+# GERAÇÃO
 # ==============================================================================
 
-def gerar_apac_risco_cirurgico(blocos_apac, dados_fixos_genericos):
-    if not blocos_apac:
-        messagebox.showerror("Erro", "Nenhum bloco de APAC foi encontrado no arquivo de texto.")
-        return False
-    
-    pdf = APAC_PDF(orientacao='P')
-
-    # CNES padrão do estabelecimento
-    cnes_padrao = str(dados_fixos_genericos.get("COD_ESTABELECIMENTO", "2087669"))
-    desc_cnes_padrao = str(buscar_descricao_cnes(cnes_padrao))
-
-    for bloco in blocos_apac:
-        # Extrai dados variáveis do bloco
-        dados_variaveis = extrair_dados_variaveis(bloco)
-        if not dados_variaveis:
-            continue
-
-        # Tenta extrair o CNES do bloco (caso exista)
-        _, cnes_solicitante = extrair_principal_e_cnes(bloco)
-        if not cnes_solicitante:
-            cnes_solicitante = cnes_padrao
-        desc_cnes_solicitante = str(buscar_descricao_cnes(cnes_solicitante))
-
-        cid_principal = dados_variaveis.get("CID10_PRINCIPAL", "")
-        desc_cid_principal = buscar_descricao_cid(cid_principal)
-
-        cns_solicitante = str(dados_variaveis.get("CNS_SOLICITANTE", ""))
-        nome_solicitante = str(buscar_nome_medico_por_cns(cns_solicitante))
-        
-        cns_autorizador = str(dados_variaveis.get("CNS_AUTORIZADOR", ""))
-        nome_autorizador = str(buscar_nome_medico_por_cns(cns_autorizador))
-
-        dados_fixos_temp = {
-            "PROC_PRINCIPAL_COD": PROC_PRINCIPAL["cod"],
-            "PROC_PRINCIPAL_NOME": PROC_PRINCIPAL["descricao"],
-            "PROC_PRINCIPAL_QTD": PROC_PRINCIPAL["qtd"],
-            "NOME_SOLICITANTE": nome_solicitante,
-            "DOC_SOLICITANTE": cns_solicitante,
-            "NOME_AUTORIZADOR": nome_autorizador,
-            "DOC_AUTORIZADOR": cns_autorizador,
-            "NOME_ESTABELECIMENTO": dados_fixos_genericos.get("NOME_ESTABELECIMENTO", ""),
-            "CNES_SOLICITANTE": cnes_solicitante,
-            "NOME_ESTAB_SOLICITANTE": desc_cnes_solicitante,
-            "COD_ORGAO_EMISSOR": "M351620001",
-            "OBSERVACOES": "Avaliação cardiológica pré-operatória",
-        }
-
-        for j, sec in enumerate(PROC_SECUNDARIOS, start=1):
-            dados_fixos_temp[f"PROC_SEC{j}_COD"] = sec["cod"]
-            dados_fixos_temp[f"PROC_SEC{j}_NOME"] = sec["nome"]
-            dados_fixos_temp[f"PROC_SEC{j}_QTD"] = sec["qtd"]
-
-        # Combina todos os dados
-        dados_completos = {
-            **dados_fixos_genericos,
-            **dados_fixos_temp,
-            **dados_variaveis,
-            "DESC_DIAGNOSTICO": desc_cid_principal,
-            "CID10_PRINCIPAL": cid_principal
-        }
-        
-        # Debug real para CNES
-       # print(f"CNES do solicitante usado: {cnes_solicitante}, descrição: {desc_cnes_solicitante}")
-
-        pdf.add_apac_page(dados_completos)
-
-    # Salvar PDF
-    pasta_downloads = os.path.join(os.path.expanduser("~"), "Downloads")
-    nome_saida = f"apac_risco_cirurgico_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-    caminho_saida = os.path.join(pasta_downloads, nome_saida)
-    pdf.output(caminho_saida)
-    messagebox.showinfo("Sucesso", f"APACs geradas com sucesso!\nSalvas em: {caminho_saida}")
-    return True
+class RiscoCirurgico(Especialidade):
+    """Todas as páginas num PDF só, sempre com o procedimento principal PROC_PRINCIPAL."""
+
+    tipo = "risco_cirurgico"
+
+    def __init__(self, dados_fixos_genericos):
+        super().__init__(dados_fixos_genericos)
+        # CNES padrão do estabelecimento
+        self.cnes_padrao = str(dados_fixos_genericos.get("COD_ESTABELECIMENTO", "2087669"))
+        self.fixos_por_procedimento = {}
+
+    def enriquecer(self, registro):
+        # A chave dos fixos é lida antes de completar_registro, que fixa PROC_PRINCIPAL_COD
+        chave_fixos = procedimentos_do_formulario(registro)
+        completar_registro(registro, self.dados_fixos_genericos, self.cnes_padrao)
+        return chave_fixos
+
+    def pagina(self, registro, chave_fixos):
+        fixos = self.fixos_por_procedimento.get(chave_fixos)
+        if fixos is None:
+            fixos = self.fixos_por_procedimento[chave_fixos] = dados_fixos_risco_cirurgico(
+                self.dados_fixos_genericos, chave_fixos[1], chave_fixos[0]
+            )
+        return None, fixos, PROC_PRINCIPAL["cod"], PROC_PRINCIPAL["descricao"]
+
+    def caminho_saida(self, pasta, carimbo, grupo):
+        return os.path.join(pasta, f"apac_risco_cirurgico_{carimbo}.pdf")
+
+def gerar_apac_risco_cirurgico(blocos_apac, dados_fixos_genericos, **opcoes):
+    """Gera as APACs de risco cirúrgico num PDF só (opções em geracao_apac.gerar_apacs)."""
+    return gerar_apacs(RiscoCirurgico(dados_fixos_genericos), blocos_apac, **opcoes)
@@ -0,0 +1,348 @@
+# servico.py
+#
+# Modo serviço: um processo que fica no ar com as especialidades importadas, as
+# tabelas de consulta carregadas e o template preparado, atendendo por HTTP os
+# pedidos de geração de vários balcões. Cada pedido roda num pool de processos
+# que já nasce aquecido, então uma exportação pequena não paga de novo a
+# abertura do Python, a importação do fpdf nem a leitura dos CSVs.
+#
+# API (o corpo do POST é o arquivo TXT exportado):
+#   POST /render?tipo=oftalmologia[&sobreposicao=1][&impressora=sala1]
+#                [&paginas_por_parte=500][&validar=0][&modo_diario=pular][&nome=export.txt]
+#        -> 200 application/zip com os PDFs, a contagem, o relatório, os erros e
+#           resumo.json (status também no cabeçalho X-APAC-Status)
+#   GET  /estado -> JSON com os processos, os pedidos em andamento e os atendidos
+#
+# medicos.csv, estabelecimentos.csv e as demais tabelas são relidos pelos
+# processos quando o arquivo muda (ver utils.TabelaIndexada); não é preciso
+# reiniciar o serviço depois de editar um CSV.
+
+import os
+import hmac
+import json
+import shutil
+import signal
+import zipfile
+import tempfile
+import threading
+import multiprocessing
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import TABELAS_CONSULTA, ErroGeracaoAPAC, aquecer_template, cadastro_nacional, registro_tabelas
+from especialidades import TIPOS_APAC, obter_gerador
+from diario_apac import MODOS_DIARIO, MODO_DIARIO_PADRAO
+from escrita_pdf import PAGINAS_POR_PARTE
+from solicitador_apac import gerar_apacs_de_arquivo, opcoes_impressao, status_do_resultado
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+HOST_PADRAO = "127.0.0.1"  # só a própria máquina; use --host 0.0.0.0 para os balcões da rede interna
+PORTA_PADRAO = 8765
+
+# Maior exportação aceita num pedido
+LIMITE_UPLOAD = 512 * 1024 * 1024
+TAMANHO_LEITURA_UPLOAD = 1024 * 1024
+
+# Nome da exportação recebida dentro da pasta do pedido; o nome enviado pelo
+# cliente (parâmetro nome) só aparece no resumo
+NOME_ENTRADA = "entrada.txt"
+
+# Pedidos aceitos por processo do pool (rodando + na fila); além disso responde 503
+PEDIDOS_POR_TRABALHADOR = 4
+
+# PDFs já saem comprimidos do fpdf; no zip só os textos (CSV, JSON, TXT) são comprimidos
+EXTENSOES_SEM_COMPRESSAO = (".pdf",)
+
+VERDADEIROS = ("1", "true", "sim", "s")
+
+# Segundos esperando todos os processos do pool ficarem prontos ao subir o serviço
+LIMITE_AQUECIMENTO = 120
+
+# ==============================================================================
+# PROCESSOS DO POOL
+# ==============================================================================
+
+_pool_pronto = None  # multiprocessing.Barrier com uma vaga por processo do pool
+
+def _iniciar_trabalhador(pool_pronto):
+    """Carrega uma vez por processo do pool tudo o que os pedidos reaproveitam."""
+    global _pool_pronto
+    _pool_pronto = pool_pronto
+    # O Ctrl+C é tratado só pelo processo principal, que espera os pedidos em andamento
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for tipo in TIPOS_APAC:
+        obter_gerador(tipo)
+    for caminho_csv, coluna_chave, coluna_valor in TABELAS_CONSULTA:
+        registro_tabelas.tabela(caminho_csv, coluna_chave, coluna_valor).existe
+    cadastro_nacional()
+    try:
+        aquecer_template()
+    except (ErroGeracaoAPAC, OSError, ValueError) as e:
+        # Sem template só a sobreposição funciona; os demais pedidos falham com a mensagem
+        print(f"ERRO ao preparar o template: {e}")
+
+def _aguardar_pool():
+    """Segura este processo até todos os do pool terem carregado (um chamado por processo)."""
+    _pool_pronto.wait(LIMITE_AQUECIMENTO)
+    return os.getpid()
+
+def _processar_pedido(caminho, tipo, pasta_saida, opcoes):
+    """Executado no processo do pool: gera as APACs do arquivo enviado e retorna o resumo."""
+    resultado = gerar_apacs_de_arquivo(caminho, tipo, pasta_saida=pasta_saida, **opcoes)
+    resultado["status"] = status_do_resultado(resultado)
+    return resultado
+
+def _caminhos_relativos(valor, pasta):
+    """Troca os caminhos dentro de pasta pelo nome que eles têm dentro do zip."""
+    if isinstance(valor, str) and valor.startswith(pasta + os.sep):
+        return os.path.relpath(valor, pasta).replace(os.sep, "/")
+    if isinstance(valor, list):
+        return [_caminhos_relativos(item, pasta) for item in valor]
+    if isinstance(valor, dict):
+        return {chave: _caminhos_relativos(item, pasta) for chave, item in valor.items()}
+    return valor
+
+def _compactar(pasta, destino, resumo):
+    """Grava em destino um zip com todos os arquivos de pasta e o resumo.json."""
+    with zipfile.ZipFile(destino, "w") as zip_saida:
+        for raiz, _, nomes in os.walk(pasta):
+            for nome in sorted(nomes):
+                caminho = os.path.join(raiz, nome)
+                compressao = (zipfile.ZIP_STORED if nome.lower().endswith(EXTENSOES_SEM_COMPRESSAO)
+                              else zipfile.ZIP_DEFLATED)
+                zip_saida.write(caminho, os.path.relpath(caminho, pasta), compress_type=compressao)
+        zip_saida.writestr("resumo.json", json.dumps(resumo, ensure_ascii=False, indent=2),
+                           compress_type=zipfile.ZIP_DEFLATED)
+
+# ==============================================================================
+# PEDIDOS HTTP
+# ==============================================================================
+
+class _ErroPedido(Exception):
+    def __init__(self, codigo, mensagem):
+        super().__init__(mensagem)
+        self.codigo = codigo
+
+def _opcoes_do_pedido(parametros, caminho_diario):
+    """(tipo, opções de gerar_apacs_de_arquivo) a partir da query string; _ErroPedido(400) se inválida."""
+    def valor(nome, padrao=None):
+        return parametros.get(nome, [padrao])[-1]
+
+    tipo = valor("tipo")
+    if tipo not in TIPOS_APAC:
+        raise _ErroPedido(400, f"tipo deve ser um de: {', '.join(sorted(TIPOS_APAC))}")
+    modo_diario = valor("modo_diario", MODO_DIARIO_PADRAO)
+    if modo_diario not in MODOS_DIARIO:
+        raise _ErroPedido(400, f"modo_diario deve ser um de: {', '.join(MODOS_DIARIO)}")
+    try:
+        paginas_por_parte = int(valor("paginas_por_parte", PAGINAS_POR_PARTE or 0))
+    except ValueError:
+        raise _ErroPedido(400, "paginas_por_parte deve ser um número inteiro")
+    try:
+        opcoes_pdf = opcoes_impressao(valor("sobreposicao", "").lower() in VERDADEIROS, valor("impressora"))
+    except ErroGeracaoAPAC as e:
+        raise _ErroPedido(400, str(e))
+    return tipo, {
+        "caminho_diario": caminho_diario,
+        "modo_diario": modo_diario,
+        "paginas_por_parte": paginas_por_parte or None,
+        "validar": valor("validar", "1").lower() in VERDADEIROS,
+        "opcoes_pdf": opcoes_pdf,
+    }
+
+class _TratadorPedidos(BaseHTTPRequestHandler):
+    server_version = "SolicitadorAPAC"
+
+    def _responder(self, codigo, corpo, tipo_conteudo, cabecalhos=()):
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo_conteudo)
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valor in cabecalhos:
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _responder_json(self, codigo, dados, cabecalhos=()):
+        corpo = json.dumps(dados, ensure_ascii=False, indent=2).encode("utf-8")
+        self._responder(codigo, corpo, "application/json; charset=utf-8", cabecalhos)
+
+    def _autorizado(self):
+        token = self.server.token
+        if not token:
+            return True
+        recebido = self.headers.get("Authorization", "")
+        return hmac.compare_digest(recebido.encode("utf-8"), f"Bearer {token}".encode("utf-8"))
+
+    def do_GET(self):
+        if not self._autorizado():
+            self._responder_json(401, {"status": "falha", "mensagem": "token inválido"})
+        elif urlsplit(self.path).path == "/estado":
+            self._responder_json(200, self.server.estado())
+        else:
+            self._responder_json(404, {"status": "falha", "mensagem": "caminho desconhecido"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        try:
+            if not self._autorizado():
+                raise _ErroPedido(401, "token inválido")
+            if url.path != "/render":
+                raise _ErroPedido(404, "caminho desconhecido")
+            tipo, opcoes = _opcoes_do_pedido(parse_qs(url.query), self.server.caminho_diario)
+            tamanho = self.headers.get("Content-Length")
+            if tamanho is None:
+                raise _ErroPedido(411, "Content-Length é obrigatório")
+            tamanho = int(tamanho)
+            if tamanho > LIMITE_UPLOAD:
+                raise _ErroPedido(413, f"exportação maior que {LIMITE_UPLOAD} bytes")
+            nome = os.path.basename(parse_qs(url.query).get("nome", ["exportacao.txt"])[-1]) or "exportacao.txt"
+            self.server.atender(self, tipo, opcoes, nome, tamanho)
+        except _ErroPedido as e:
+            cabecalhos = (("Retry-After", "5"),) if e.codigo == 503 else ()
+            self._responder_json(e.codigo, {"status": "falha", "mensagem": str(e)}, cabecalhos)
+        except ValueError:
+            self._responder_json(400, {"status": "falha", "mensagem": "Content-Length inválido"})
+        except ConnectionError:
+            # O cliente desistiu no meio do envio ou da resposta: não há a quem responder
+            pass
+        except OSError as e:
+            # Falha ao gravar ou ler na pasta de trabalho
+            self._responder_json(500, {"status": "falha", "mensagem": str(e)})
+
+    def receber_exportacao(self, destino, tamanho):
+        """Grava o corpo do pedido em destino sem segurá-lo inteiro na memória."""
+        restante = tamanho
+        with open(destino, "wb") as f:
+            while restante:
+                pedaco = self.rfile.read(min(restante, TAMANHO_LEITURA_UPLOAD))
+                if not pedaco:
+                    raise _ErroPedido(400, "corpo do pedido menor que o Content-Length")
+                f.write(pedaco)
+                restante -= len(pedaco)
+
+    def enviar_zip(self, caminho_zip, nome_zip, resumo):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(os.path.getsize(caminho_zip)))
+        self.send_header("Content-Disposition", f'attachment; filename="{nome_zip}"')
+        self.send_header("X-APAC-Status", resumo["status"])
+        self.send_header("X-APAC-Paginas", str(resumo["paginas"]))
+        self.end_headers()
+        with open(caminho_zip, "rb") as f:
+            shutil.copyfileobj(f, self.wfile)
+
+# ==============================================================================
+# SERVIDOR
+# ==============================================================================
+
+class ServicoAPAC(ThreadingHTTPServer):
+    """Servidor HTTP com um pool de processos aquecidos atendendo os pedidos de geração.
+
+    Cada conexão é tratada numa thread, que recebe a exportação numa pasta de
+    trabalho, espera o processo do pool gerar os PDFs e devolve tudo num zip.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, endereco, trabalhadores=None, pasta_trabalho=None, caminho_diario=None, token=None):
+        super().__init__(endereco, _TratadorPedidos)
+        self.trabalhadores = max(1, trabalhadores or os.cpu_count() or 1)
+        self.pasta_trabalho = pasta_trabalho or os.path.join(tempfile.gettempdir(), "solicitador_apac_servico")
+        self.caminho_diario = caminho_diario
+        self.token = token
+        self.iniciado_em = datetime.now().isoformat(timespec="seconds")
+        self.processos = []
+        self.em_andamento = 0
+        self.atendidos = {"ok": 0, "concluido_com_rejeitados": 0, "falha": 0}
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(self.trabalhadores * PEDIDOS_POR_TRABALHADOR)
+        os.makedirs(self.pasta_trabalho, exist_ok=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.trabalhadores, initializer=_iniciar_trabalhador,
+                                            initargs=(multiprocessing.Barrier(self.trabalhadores),))
+
+    def aquecer(self):
+        """Sobe todos os processos do pool e espera cada um terminar de carregar."""
+        futuros = [self.executor.submit(_aguardar_pool) for _ in range(self.trabalhadores)]
+        self.processos = sorted({futuro.result() for futuro in futuros})
+        return self.processos
+
+    def estado(self):
+        with self._lock:
+            return {
+                "status": "ok",
+                "iniciado_em": self.iniciado_em,
+                "tipos": sorted(TIPOS_APAC),
+                "trabalhadores": self.trabalhadores,
+                "processos": self.processos,
+                "em_andamento": self.em_andamento,
+                "atendidos": dict(self.atendidos),
+                "diario": self.caminho_diario,
+            }
+
+    def _contar(self, em_andamento, status=None):
+        with self._lock:
+            self.em_andamento += em_andamento
+            if status:
+                self.atendidos[status] += 1
+
+    def atender(self, tratador, tipo, opcoes, nome, tamanho):
+        """Recebe a exportação, gera no pool e responde com o zip (ou com o erro em JSON)."""
+        if not self._vagas.acquire(blocking=False):
+            raise _ErroPedido(503, "serviço ocupado; tente de novo em instantes")
+        self._contar(1)
+        status = "falha"
+        pasta = tempfile.mkdtemp(prefix="pedido_", dir=self.pasta_trabalho)
+        try:
+            caminho_entrada = os.path.join(pasta, NOME_ENTRADA)
+            pasta_saida = os.path.join(pasta, "saida")
+            tratador.receber_exportacao(caminho_entrada, tamanho)
+            try:
+                resultado = self.executor.submit(_processar_pedido, caminho_entrada, tipo, pasta_saida, opcoes).result()
+            except ErroGeracaoAPAC as e:
+                tratador._responder_json(422, {"status": "falha", "tipo": tipo, "arquivo_entrada": nome,
+                                               "mensagem": str(e)})
+                return
+            except Exception as e:
+                tratador._responder_json(500, {"status": "falha", "tipo": tipo, "arquivo_entrada": nome,
+                                               "mensagem": str(e)})
+                return
+            status = resultado["status"]
+            resumo = _caminhos_relativos(resultado, pasta_saida)
+            resumo["arquivo_entrada"] = nome
+            del resumo["pasta_saida"]
+            caminho_zip = os.path.join(pasta, "resposta.zip")
+            _compactar(pasta_saida, caminho_zip, resumo)
+            tratador.enviar_zip(caminho_zip, f"apac_{tipo}_{resultado['carimbo']}.zip", resumo)
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+            self._contar(-1, status)
+            self._vagas.release()
+
+    def server_close(self):
+        super().server_close()
+        # Os pedidos que ainda não começaram são descartados; os em andamento terminam
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+def servir(host=HOST_PADRAO, porta=PORTA_PADRAO, trabalhadores=None, pasta_trabalho=None, caminho_diario=None,
+           token=None, ao_iniciar=None):
+    """Sobe o serviço, aquece o pool e atende até um KeyboardInterrupt.
+
+    ao_iniciar(servico), se informado, é chamado quando o pool está pronto.
+    Levanta OSError se a porta não puder ser aberta.
+    """
+    servico = ServicoAPAC((host, porta), trabalhadores=trabalhadores, pasta_trabalho=pasta_trabalho,
+                          caminho_diario=caminho_diario, token=token)
+    try:
+        servico.aquecer()
+        if ao_iniciar:
+            ao_iniciar(servico)
+        servico.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servico.server_close()
@@ -0,0 +1,555 @@
+# solicitador_apac.py
+#
+# Ponto de entrada sem interface gráfica (biblioteca e linha de comando).
+#
+# Uso: python -m solicitador_apac render --tipo oftalmologia --in export.txt --out pasta/
+#      python -m solicitador_apac lote --in pasta_exportacoes/ --tipo oftalmologia [--continuo]
+#      python -m solicitador_apac reimprimir --tipo oftalmologia --in export.txt --apac 352500000001-1
+#      python -m solicitador_apac validar --in export.txt
+#      python -m solicitador_apac alinhamento --impressora sala1 --out alinhamento.pdf
+#      python -m solicitador_apac servico --porta 8765 [--host 0.0.0.0] [--trabalhadores 4]
+
+import os
+import sys
+import json
+import time
+import csv
+import sqlite3
+import argparse
+import itertools
+
+from utils import (
+    MARCADOR_BLOCO,
+    ErroGeracaoAPAC,
+    abrir_blocos_bdsia,
+    converter_cid10_datasus,
+    estatisticas_consultas,
+    registro_tabelas,
+    resource_path,
+)
+from instrumentacao import PERFIS, INSTRUMENTACAO_DESLIGADA, Instrumentacao, instrumentacao_do_ambiente
+from diario_apac import MODOS_DIARIO, MODO_DIARIO_PADRAO, DiarioAPAC
+from escrita_pdf import PAGINAS_POR_PARTE
+from especialidades import TIPOS_APAC, obter_gerador
+from pipeline import CONFIGURACAO_SERIAL, Pipeline, configuracao_pipeline, ler_especificacao_estagio
+
+# ==============================================================================
+# CONFIGURAÇÕES
+# ==============================================================================
+
+DADOS_FIXOS_GENERICOS = {
+    "NOME_ESTABELECIMENTO": "NGA 16",
+    "MUNICIPIO_RESIDENCIA": "FRANCA",
+    "COD_IBGE_MUNICIPIO": "351620",
+    "UF": "SP",
+    "NOME_EXECUTANTE": "NGA 16",
+}
+
+# Códigos de saída da linha de comando
+SAIDA_OK = 0
+SAIDA_COM_REJEITADOS = 1  # gerou os PDFs, mas alguns blocos foram rejeitados
+SAIDA_USO_INVALIDO = 2    # mesmo código usado pelo argparse
+SAIDA_FALHA = 3
+
+# ==============================================================================
+# BIBLIOTECA
+# ==============================================================================
+
+def _contar_lidos(blocos, lidos):
+    """Repassa os blocos acumulando em lidos[0] quantos bytes do arquivo já foram consumidos."""
+    for bloco in blocos:
+        lidos[0] += len(bloco) + len(MARCADOR_BLOCO)
+        yield bloco
+
+def gerar_apacs_de_arquivo(caminho_arquivo, tipo, pasta_saida=None, processos=1, dados_fixos=None,
+                           progresso=None, cancelar=None, caminho_diario=None, modo_diario=MODO_DIARIO_PADRAO,
+                           metricas=None, perfil=None, paginas_por_parte=PAGINAS_POR_PARTE, validar=True,
+                           opcoes_pdf=None, estagios=None, cache_parse=False):
+    """Gera as APACs de um arquivo exportado e retorna o resumo da execução.
+
+    progresso, se informado, recebe um dicionário com a fração do arquivo já
+    lida, blocos, páginas e segundos decorridos; cancelar é um threading.Event
+    verificado entre os blocos (GeracaoCancelada é levantada ao acioná-lo).
+
+    caminho_diario, se informado, liga o diário de APACs emitidas (SQLite) no
+    modo_diario escolhido: retomar, pular ou forcar (ver diario_apac).
+
+    metricas=True grava apac_metricas_<data>.json (tempos por etapa, contadores,
+    consultas, pico de memória e bytes gravados) junto aos PDFs; perfil
+    ("cprofile" ou "tracemalloc") grava também o perfil correspondente. Sem
+    nenhum dos dois, vale a variável de ambiente APAC_METRICAS.
+
+    paginas_por_parte, se informado, limita as páginas de cada PDF gravado;
+    saídas maiores são divididas em apac_..._parte001.pdf, _parte002.pdf...
+    Sem ele (padrão) cada saída só é dividida acima do limite de bytes
+    (escrita_pdf.BYTES_POR_PARTE).
+
+    validar=False desliga a validação prévia dos registros (dígitos
+    verificadores, datas e campos obrigatórios; ver validacao_apac).
+
+    opcoes_pdf são repassadas ao APAC_PDF (ver opcoes_impressao para imprimir
+    sobre o formulário pré-impresso).
+
+    estagios ajusta threads, processos e filas de cada estágio (ex.:
+    {"parse": {"processos": 2}, "gravacao": {"capacidade": 2}}; ver
+    pipeline.CONFIGURACAO_PADRAO); pipeline.CONFIGURACAO_SERIAL roda tudo
+    nesta thread. render.processos, se informado, substitui processos. As
+    métricas dos estágios vêm em resultado["pipeline"].
+
+    cache_parse=True guarda os registros extraídos no cache_parse (chave: o
+    conteúdo do arquivo), e uma nova carga do mesmo arquivo pula a leitura dos
+    blocos e o parse; uma instância de cache_parse.CacheParse escolhe a pasta,
+    o tamanho e a idade máximos. Desligado por padrão, porque as entradas
+    guardam dados de pacientes em disco. O resumo vem em resultado["cache_parse"].
+
+    Levanta ErroGeracaoAPAC se o tipo for desconhecido ou se o arquivo não
+    tiver nenhuma APAC; erros de leitura do arquivo (OSError) são propagados.
+    """
+    gerador = obter_gerador(tipo)
+    if gerador is None:
+        raise ErroGeracaoAPAC(f"Tipo de APAC desconhecido: {tipo}")
+
+    if metricas is None and perfil is None:
+        instrumentacao = instrumentacao_do_ambiente()
+    elif metricas or perfil:
+        instrumentacao = Instrumentacao(perfil)
+    else:
+        instrumentacao = INSTRUMENTACAO_DESLIGADA
+
+    inicio = time.perf_counter()
+    tamanho_arquivo = max(os.path.getsize(caminho_arquivo), 1)
+    entrada_cache = None
+    if cache_parse:
+        from cache_parse import CacheParse, EntradaCacheParse  # hashlib e marshal só com o cache ligado
+
+        entrada_cache = EntradaCacheParse(cache_parse if isinstance(cache_parse, CacheParse) else CacheParse(),
+                                          caminho_arquivo)
+    lidos = [0]
+    if entrada_cache is not None and entrada_cache.acerto:
+        # Registros já extraídos antes: o arquivo não é lido de novo e o progresso conta registros
+        blocos = ()
+        def fracao_lida(total_blocos):
+            return total_blocos / max(entrada_cache.total, 1)
+    else:
+        # Com o cache ligado, a entrada é gravada com o hash dos mesmos bytes lidos aqui
+        blocos = entrada_cache.blocos(caminho_arquivo) if entrada_cache is not None else abrir_blocos_bdsia(caminho_arquivo)
+        blocos = _contar_lidos(blocos, lidos)
+        primeiro_bloco = next(blocos, None)
+        if primeiro_bloco is None:
+            raise ErroGeracaoAPAC("Nenhum registro de APAC válido foi encontrado no arquivo.")
+        blocos = itertools.chain([primeiro_bloco], blocos)
+        def fracao_lida(total_blocos):
+            return lidos[0] / tamanho_arquivo
+
+    progresso_especialidade = None
+    if progresso:
+        def progresso_especialidade(total_blocos, paginas):
+            progresso({
+                "fracao": min(fracao_lida(total_blocos), 1.0),
+                "blocos": total_blocos,
+                "paginas": paginas,
+                "segundos": time.perf_counter() - inicio,
+            })
+
+    pipeline = Pipeline(estagios, cache_parse=entrada_cache)
+    processos = pipeline.configuracao["render"]["processos"] or processos
+    pipeline.configuracao["render"]["processos"] = processos
+
+    dados_fixos = (dados_fixos or DADOS_FIXOS_GENERICOS).copy()
+    diario = DiarioAPAC(caminho_diario, modo_diario) if caminho_diario else None
+    if instrumentacao.ativa:
+        registro_tabelas.zerar_contadores()
+    instrumentacao.iniciar()
+    try:
+        resultado = gerador(
+            blocos,
+            dados_fixos,
+            processos=processos,
+            pasta_saida=pasta_saida,
+            progresso=progresso_especialidade,
+            cancelar=cancelar,
+            diario=diario,
+            instrumentacao=instrumentacao,
+            paginas_por_parte=paginas_por_parte,
+            validar=validar,
+            opcoes_pdf=opcoes_pdf,
+            pipeline=pipeline,
+        )
+        if diario is not None:
+            resultado["diario"] = diario.estatisticas()
+        if entrada_cache is not None:
+            entrada_cache.concluir()
+            resultado["cache_parse"] = entrada_cache.estatisticas()
+    finally:
+        pipeline.encerrar()
+        if entrada_cache is not None:
+            entrada_cache.descartar()
+        instrumentacao.parar()
+        if diario is not None:
+            diario.fechar()
+    resultado["arquivo_entrada"] = os.path.abspath(caminho_arquivo)
+    resultado["segundos"] = round(time.perf_counter() - inicio, 3)
+    resultado["consultas"] = estatisticas_consultas()
+    resultado["pipeline"] = pipeline.relatorio()
+
+    if instrumentacao.ativa:
+        instrumentacao.registrar("tipo", tipo)
+        instrumentacao.registrar("arquivo_entrada", resultado["arquivo_entrada"])
+        instrumentacao.registrar("consultas", resultado["consultas"])
+        instrumentacao.registrar("pipeline", resultado["pipeline"])
+        if entrada_cache is not None:
+            instrumentacao.registrar("cache_parse", resultado["cache_parse"])
+        instrumentacao.contar("bytes_entrada", tamanho_arquivo)
+        instrumentacao.contar("bytes_saida", sum(os.path.getsize(caminho) for caminho in resultado["arquivos"]))
+        instrumentacao.contar("puladas_diario", resultado["puladas_diario"])
+        resultado.update(instrumentacao.gravar(resultado["pasta_saida"], resultado["carimbo"]))
+    return resultado
+
+def opcoes_impressao(sobreposicao=False, impressora=None):
+    """opcoes_pdf para imprimir sobre o formulário pré-impresso (sem o fundo), com a calibração da impressora.
+
+    Levanta ErroGeracaoAPAC se a impressora não tiver perfil de calibração.
+    """
+    if not sobreposicao and not impressora:
+        return None
+    from calibracao_impressora import calibracao_da_impressora
+
+    opcoes = {"sobreposicao": True}
+    if impressora:
+        opcoes["calibracao"] = calibracao_da_impressora(impressora)
+    return opcoes
+
+def status_do_resultado(resultado):
+    """ok, concluido_com_rejeitados ou falha (algum PDF não pôde ser gravado)."""
+    if resultado["falhas_gravacao"]:
+        return "falha"
+    if resultado["erros"]:
+        return "concluido_com_rejeitados"
+    return "ok"
+
+# ==============================================================================
+# LINHA DE COMANDO
+# ==============================================================================
+
+CODIGOS_SAIDA = {"ok": SAIDA_OK, "concluido_com_rejeitados": SAIDA_COM_REJEITADOS, "falha": SAIDA_FALHA}
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(prog="solicitador_apac", description="Gerador de APAC's sem interface gráfica.")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+
+    render = subcomandos.add_parser("render", help="Gera os PDFs das APACs de um arquivo exportado")
+    render.add_argument("--tipo", required=True, choices=sorted(TIPOS_APAC))
+    render.add_argument("--in", dest="entrada", required=True, help="Arquivo TXT exportado (BDSIA)")
+    render.add_argument("--out", dest="saida", default=None, help="Pasta de saída (padrão: ~/Downloads)")
+    render.add_argument("--processos", type=int, default=1, help="Processos de renderização (1 = serial)")
+    render.add_argument("--diario", default=None, help="Diário SQLite das APACs já emitidas (desligado se omitido)")
+    render.add_argument("--modo-diario", default=MODO_DIARIO_PADRAO, choices=MODOS_DIARIO,
+                        help="retomar: pula blocos idênticos já emitidos; pular: pula números já emitidos; forcar: emite tudo")
+    render.add_argument("--paginas-por-parte", type=int, default=PAGINAS_POR_PARTE,
+                        help="Divide cada PDF em partes com esse número de páginas (padrão: um arquivo só, "
+                             "dividido apenas acima do limite de bytes)")
+    render.add_argument("--sobreposicao", action="store_true",
+                        help="Só o texto, sem o fundo, para imprimir sobre o formulário pré-impresso")
+    render.add_argument("--impressora", default=None,
+                        help="Perfil de calibração da impressora (implica --sobreposicao)")
+    render.add_argument("--sem-validacao", action="store_true",
+                        help="Não valida CNS, CPF, número da APAC e datas antes de gerar")
+    render.add_argument("--estagio", action="append", default=[], metavar="ESTAGIO:CHAVE=VALOR[,...]",
+                        help="Ajusta um estágio (leitura, parse, enriquecimento, render, gravacao): threads, "
+                             "processos ou capacidade; ex.: parse:processos=2 gravacao:capacidade=2")
+    render.add_argument("--serial", action="store_true", help="Sem estágios em paralelo: tudo numa thread só")
+    render.add_argument("--cache-parse", action="store_true",
+                        help="Usa e grava o cache dos registros extraídos (~/.solicitador_apac/cache_parse); "
+                             "guarda dados de pacientes em disco por até 7 dias")
+    render.add_argument("--metricas", action="store_true", help="Grava apac_metricas_<data>.json junto aos PDFs")
+    render.add_argument("--perfil", default=None, choices=PERFIS, help="Grava também um perfil (cProfile ou tracemalloc)")
+    render.add_argument("--resumo", default="-", help="Arquivo JSON do resumo da execução ('-' = saída padrão)")
+
+    lote = subcomandos.add_parser("lote", help="Processa todas as exportações de uma pasta (modo lote)")
+    lote.add_argument("--in", dest="entrada", required=True,
+                      help="Pasta vigiada; subpastas com o nome do tipo definem o tipo dos arquivos nelas")
+    lote.add_argument("--tipo", default=None, choices=sorted(TIPOS_APAC),
+                      help="Tipo dos arquivos na raiz da pasta (sem ele, só as subpastas de tipo são lidas)")
+    lote.add_argument("--out", dest="saida", default=None, help="Pasta de saída (padrão: ~/Downloads)")
+    lote.add_argument("--trabalhadores", type=int, default=None, help="Arquivos processados ao mesmo tempo (padrão: nº de CPUs)")
+    lote.add_argument("--continuo", action="store_true", help="Continua vigiando a pasta até Ctrl+C")
+    lote.add_argument("--intervalo", type=float, default=5, help="Segundos entre as varreduras no modo contínuo")
+    lote.add_argument("--diario", default=None, help="Diário SQLite das APACs já emitidas (desligado se omitido)")
+    lote.add_argument("--modo-diario", default=MODO_DIARIO_PADRAO, choices=MODOS_DIARIO)
+    lote.add_argument("--paginas-por-parte", type=int, default=PAGINAS_POR_PARTE,
+                      help="Divide cada PDF em partes com esse número de páginas (padrão: sem limite)")
+    lote.add_argument("--sobreposicao", action="store_true", help="Só o texto, sem o fundo (formulário pré-impresso)")
+    lote.add_argument("--impressora", default=None, help="Perfil de calibração da impressora (implica --sobreposicao)")
+    lote.add_argument("--resumo", default="-", help="Arquivo JSON do relatório do lote ('-' = saída padrão)")
+
+    reimprimir = subcomandos.add_parser("reimprimir", help="Gera de novo só algumas APACs de um arquivo (via índice)")
+    reimprimir.add_argument("--tipo", required=True, choices=sorted(TIPOS_APAC))
+    reimprimir.add_argument("--in", dest="entrada", required=True, help="Arquivo TXT exportado (BDSIA)")
+    selecao = reimprimir.add_mutually_exclusive_group(required=True)
+    selecao.add_argument("--apac", nargs="+", help="Números das APACs (com ou sem traço)")
+    selecao.add_argument("--lista", help="Arquivo com um número de APAC por linha")
+    selecao.add_argument("--cnes", help="Todas as APACs de um CNES solicitante")
+    reimprimir.add_argument("--out", dest="saida", default=None, help="Pasta de saída (padrão: ~/Downloads)")
+    reimprimir.add_argument("--resumo", default="-", help="Arquivo JSON do resumo da execução ('-' = saída padrão)")
+
+    validar = subcomandos.add_parser("validar", help="Só valida os registros de um arquivo, sem gerar PDFs")
+    validar.add_argument("--in", dest="entrada", required=True, help="Arquivo TXT exportado (BDSIA)")
+    validar.add_argument("--out", dest="saida", default=None,
+                         help="Pasta do apac_rejeitadas_<data>.csv (padrão: ~/Downloads)")
+    validar.add_argument("--resumo", default="-", help="Arquivo JSON do resumo ('-' = saída padrão)")
+
+    alinhamento = subcomandos.add_parser("alinhamento", help="Gera a página de teste de alinhamento do formulário pré-impresso")
+    alinhamento.add_argument("--impressora", default=None, help="Perfil de calibração a aplicar (padrão: sem ajuste)")
+    alinhamento.add_argument("--out", dest="saida", default="apac_alinhamento.pdf", help="PDF a gerar")
+    alinhamento.add_argument("--com-fundo", action="store_true", help="Desenha o template por baixo (conferência na tela)")
+
+    calibrar = subcomandos.add_parser("calibrar", help="Cria ou ajusta o perfil de calibração de uma impressora")
+    calibrar.add_argument("--impressora", required=True)
+    calibrar.add_argument("--deslocamento-x", type=float, default=None, help="mm (positivo = para a direita)")
+    calibrar.add_argument("--deslocamento-y", type=float, default=None, help="mm (positivo = para baixo)")
+    calibrar.add_argument("--escala-x", type=float, default=None, help="Fator horizontal (ex.: 0.995)")
+    calibrar.add_argument("--escala-y", type=float, default=None, help="Fator vertical")
+
+    cadastro = subcomandos.add_parser("cadastro", help="Importa os extratos do CNES para o cadastro nacional (SQLite)")
+    cadastro.add_argument("--profissionais", default=None, help="Extrato de profissionais (ex.: tbDadosProfissionalSus)")
+    cadastro.add_argument("--estabelecimentos", default=None, help="Extrato de estabelecimentos (ex.: tbEstabelecimento)")
+    cadastro.add_argument("--banco", default=None, help="Banco SQLite (padrão: ~/.solicitador_apac/cadastro_nacional.sqlite3)")
+    cadastro.add_argument("--encoding", default="latin-1", help="Codificação dos extratos (padrão: latin-1)")
+    cadastro.add_argument("--acrescentar", action="store_true", help="Acrescenta ao conteúdo atual em vez de substituí-lo")
+
+    servico = subcomandos.add_parser("servico", help="Fica no ar gerando APACs por HTTP, com tabelas e template já carregados")
+    servico.add_argument("--host", default=None, help="Endereço de escuta (padrão: 127.0.0.1, só esta máquina)")
+    servico.add_argument("--porta", type=int, default=None, help="Porta HTTP (padrão: 8765)")
+    servico.add_argument("--trabalhadores", type=int, default=None, help="Pedidos gerados ao mesmo tempo (padrão: nº de CPUs)")
+    servico.add_argument("--pasta-trabalho", default=None, help="Onde os pedidos são recebidos e gerados (padrão: pasta temporária)")
+    servico.add_argument("--diario", default=None, help="Diário SQLite das APACs já emitidas (desligado se omitido)")
+    servico.add_argument("--token", default=None, help="Exige o cabeçalho 'Authorization: Bearer TOKEN' nos pedidos")
+
+    cid10 = subcomandos.add_parser("cid10", help="Monta cid10.csv a partir das tabelas CID-10 do DATASUS")
+    cid10.add_argument("--datasus", nargs="+", required=True,
+                       help="CID-10-CATEGORIAS.CSV e/ou CID-10-SUBCATEGORIAS.CSV (latin-1, separadas por ';')")
+    cid10.add_argument("--out", dest="saida", default=None, help="Destino (padrão: cid10.csv junto dos demais CSVs)")
+    return parser
+
+def _gravar_resumo(resumo, destino):
+    texto = json.dumps(resumo, ensure_ascii=False, indent=2)
+    if destino == "-":
+        print(texto)
+    else:
+        with open(destino, "w", encoding="utf-8") as f:
+            f.write(texto)
+
+def _estagios_dos_argumentos(args):
+    """Configuração dos estágios pedida por --serial e --estagio (ValueError se inválida)."""
+    estagios = {nome: dict(valores) for nome, valores in CONFIGURACAO_SERIAL.items()} if args.serial else {}
+    for especificacao in args.estagio:
+        nome, valores = ler_especificacao_estagio(especificacao)
+        estagios.setdefault(nome, {}).update(valores)
+    return estagios
+
+def _comando_render(args):
+    try:
+        estagios = _estagios_dos_argumentos(args)
+        configuracao_pipeline(estagios)  # valida estágios e chaves antes de começar
+    except ValueError as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_USO_INVALIDO
+    try:
+        opcoes_pdf = opcoes_impressao(args.sobreposicao, args.impressora)
+        resultado = gerar_apacs_de_arquivo(
+            args.entrada,
+            args.tipo,
+            pasta_saida=args.saida,
+            processos=args.processos,
+            caminho_diario=args.diario,
+            modo_diario=args.modo_diario,
+            metricas=args.metricas or None,
+            perfil=args.perfil,
+            paginas_por_parte=args.paginas_por_parte or None,
+            validar=not args.sem_validacao,
+            opcoes_pdf=opcoes_pdf,
+            estagios=estagios,
+            cache_parse=args.cache_parse,
+        )
+    except (ErroGeracaoAPAC, OSError) as e:
+        _gravar_resumo({"status": "falha", "tipo": args.tipo, "arquivo_entrada": args.entrada, "mensagem": str(e)}, args.resumo)
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_FALHA
+
+    resultado["status"] = status_do_resultado(resultado)
+    _gravar_resumo(resultado, args.resumo)
+    return CODIGOS_SAIDA[resultado["status"]]
+
+def _comando_lote(args):
+    from lote import processar_lote  # só carrega o pool de processos quando o lote é pedido
+
+    if not os.path.isdir(args.entrada):
+        print(f"ERRO: pasta não encontrada: {args.entrada}", file=sys.stderr)
+        return SAIDA_USO_INVALIDO
+
+    try:
+        opcoes_pdf = opcoes_impressao(args.sobreposicao, args.impressora)
+    except ErroGeracaoAPAC as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_USO_INVALIDO
+
+    def ao_concluir(resumo):
+        print(f"{resumo['status']:<26} {resumo['arquivo_entrada']}", file=sys.stderr)
+
+    relatorio = processar_lote(
+        args.entrada,
+        tipo_padrao=args.tipo,
+        pasta_saida=args.saida,
+        trabalhadores=args.trabalhadores,
+        continuo=args.continuo,
+        intervalo=args.intervalo,
+        caminho_diario=args.diario,
+        modo_diario=args.modo_diario,
+        paginas_por_parte=args.paginas_por_parte or None,
+        opcoes_pdf=opcoes_pdf,
+        ao_concluir=ao_concluir,
+    )
+    _gravar_resumo(relatorio, args.resumo)
+    totais = relatorio["totais"]
+    if totais["falha"]:
+        return SAIDA_FALHA
+    if totais["concluido_com_rejeitados"]:
+        return SAIDA_COM_REJEITADOS
+    return SAIDA_OK
+
+def _comando_reimprimir(args):
+    from indice_apac import reimprimir_apacs  # o índice (mmap) só é carregado quando pedido
+
+    try:
+        numeros = args.apac
+        if args.lista:
+            with open(args.lista, encoding="utf-8") as f:
+                numeros = [linha.strip() for linha in f if linha.strip()]
+        resultado = reimprimir_apacs(args.entrada, args.tipo, numeros_apac=numeros, cnes=args.cnes, pasta_saida=args.saida)
+    except (ErroGeracaoAPAC, OSError) as e:
+        _gravar_resumo({"status": "falha", "tipo": args.tipo, "arquivo_entrada": args.entrada, "mensagem": str(e)}, args.resumo)
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_FALHA
+
+    resultado["status"] = status_do_resultado(resultado)
+    if resultado["nao_encontradas"] and resultado["status"] == "ok":
+        resultado["status"] = "concluido_com_rejeitados"
+    _gravar_resumo(resultado, args.resumo)
+    return CODIGOS_SAIDA[resultado["status"]]
+
+def _comando_validar(args):
+    from validacao_apac import validar_arquivo
+
+    inicio = time.perf_counter()
+    try:
+        resumo = validar_arquivo(args.entrada, pasta_saida=args.saida)
+    except OSError as e:
+        _gravar_resumo({"status": "falha", "arquivo_entrada": args.entrada, "mensagem": str(e)}, args.resumo)
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_FALHA
+    resumo["status"] = "concluido_com_rejeitados" if resumo["rejeitados"] else "ok"
+    resumo["segundos"] = round(time.perf_counter() - inicio, 3)
+    _gravar_resumo(resumo, args.resumo)
+    return CODIGOS_SAIDA[resumo["status"]]
+
+def _comando_alinhamento(args):
+    from calibracao_impressora import gerar_pagina_alinhamento
+
+    try:
+        calibracao = gerar_pagina_alinhamento(args.saida, impressora=args.impressora, com_fundo=args.com_fundo)
+    except (ErroGeracaoAPAC, OSError) as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_FALHA
+    print(f"Página de alinhamento gravada em {args.saida} ({json.dumps(calibracao)})", file=sys.stderr)
+    return SAIDA_OK
+
+def _comando_calibrar(args):
+    from calibracao_impressora import caminho_perfis_padrao, salvar_calibracao
+
+    try:
+        perfil = salvar_calibracao(args.impressora, {
+            "deslocamento_x": args.deslocamento_x,
+            "deslocamento_y": args.deslocamento_y,
+            "escala_x": args.escala_x,
+            "escala_y": args.escala_y,
+        })
+    except (ErroGeracaoAPAC, OSError) as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_FALHA
+    print(f"{args.impressora}: {json.dumps(perfil)} -> {caminho_perfis_padrao()}", file=sys.stderr)
+    return SAIDA_OK
+
+def _comando_cadastro(args):
+    from cadastro_nacional import caminho_cadastro_padrao, importar_extrato
+
+    if not args.profissionais and not args.estabelecimentos:
+        print("ERRO: informe --profissionais e/ou --estabelecimentos", file=sys.stderr)
+        return SAIDA_USO_INVALIDO
+    banco = args.banco or caminho_cadastro_padrao()
+    for tabela, caminho in (("profissionais", args.profissionais), ("estabelecimentos", args.estabelecimentos)):
+        if not caminho:
+            continue
+        inicio = time.perf_counter()
+        try:
+            total = importar_extrato(
+                banco, tabela, caminho, encoding=args.encoding, substituir=not args.acrescentar,
+                progresso=lambda linhas: print(f"  {tabela}: {linhas} linhas", end="\r", file=sys.stderr),
+            )
+        except (OSError, ValueError, csv.Error, sqlite3.Error) as e:
+            print(f"ERRO ao importar {caminho}: {e}", file=sys.stderr)
+            return SAIDA_FALHA
+        print(f"{tabela}: {total} linhas importadas em {time.perf_counter() - inicio:.1f} s -> {banco}", file=sys.stderr)
+    return SAIDA_OK
+
+def _comando_cid10(args):
+    destino = args.saida or resource_path("cid10.csv")
+    try:
+        total = converter_cid10_datasus(args.datasus, destino)
+    except (OSError, csv.Error) as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_FALHA
+    print(f"{total} códigos gravados em {destino}", file=sys.stderr)
+    return SAIDA_OK
+
+def _comando_servico(args):
+    from servico import HOST_PADRAO, PORTA_PADRAO, servir  # http.server e o pool só quando o serviço é pedido
+
+    host = args.host or HOST_PADRAO
+    porta = args.porta if args.porta is not None else PORTA_PADRAO
+
+    def ao_iniciar(servico):
+        print(f"Serviço no ar em http://{host}:{servico.server_port} com {servico.trabalhadores} processo(s); "
+              f"Ctrl+C para sair", file=sys.stderr)
+
+    try:
+        servir(host, porta, trabalhadores=args.trabalhadores, pasta_trabalho=args.pasta_trabalho,
+               caminho_diario=args.diario, token=args.token, ao_iniciar=ao_iniciar)
+    except OSError as e:
+        print(f"ERRO: {e}", file=sys.stderr)
+        return SAIDA_FALHA
+    return SAIDA_OK
+
+def main(argv=None):
+    args = _criar_parser().parse_args(argv)
+    if args.comando == "render":
+        return _comando_render(args)
+    if args.comando == "lote":
+        return _comando_lote(args)
+    if args.comando == "reimprimir":
+        return _comando_reimprimir(args)
+    if args.comando == "validar":
+        return _comando_validar(args)
+    if args.comando == "alinhamento":
+        return _comando_alinhamento(args)
+    if args.comando == "calibrar":
+        return _comando_calibrar(args)
+    if args.comando == "cadastro":
+        return _comando_cadastro(args)
+    if args.comando == "cid10":
+        return _comando_cid10(args)
+    if args.comando == "servico":
+        return _comando_servico(args)
+    return SAIDA_USO_INVALIDO
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+# tests/conftest.py
+#
+# Os módulos do projeto ficam na raiz do repositório (sem pacote): a raiz entra
+# no sys.path para os testes rodarem com "pytest" de qualquer pasta.
+
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
@@ -0,0 +1,122 @@
+# tests/test_cache_parse.py
+#
+# Cache dos registros extraídos: a leitura devolve os mesmos RegistroAPAC da
+# extração, a entrada fica com a chave dos bytes lidos, vence com a idade e só
+# é acessível ao usuário.
+
+import os
+import sys
+
+import pytest
+
+from cache_parse import CacheParse, EntradaCacheParse, hash_arquivo
+from registro_apac import RegistroAPAC, extrair_registros
+from utils import abrir_blocos_bdsia
+from benchmarks.gerar_export_sintetico import gerar_export
+
+
+@pytest.fixture
+def exportacao(tmp_path):
+    return gerar_export(str(tmp_path / "export.txt"), 300, semente=5, fracao_malformados=0.05)
+
+
+def _gravar(cache, caminho):
+    """Primeira carga: extrai os registros lendo por EntradaCacheParse.blocos e publica a entrada."""
+    entrada = EntradaCacheParse(cache, caminho)
+    assert not entrada.acerto
+    itens = ((registro, ()) for registro in extrair_registros(entrada.blocos(caminho)))
+    registros = [registro for registro, _ in entrada.anotar(itens)]
+    entrada.concluir()
+    return entrada, registros
+
+
+def test_gravacao_e_leitura_devolvem_os_mesmos_registros(tmp_path, exportacao):
+    cache = CacheParse(str(tmp_path / "cache"))
+    gravada, extraidos = _gravar(cache, exportacao)
+    assert gravada.gravada
+
+    entrada = EntradaCacheParse(cache, exportacao)
+    assert entrada.acerto
+    assert entrada.total == len(extraidos)
+    lidos = list(entrada.registros())
+    assert len(lidos) == len(extraidos)
+    for lido, extraido in zip(lidos, extraidos):
+        for campo in RegistroAPAC.__slots__:
+            assert getattr(lido, campo) == getattr(extraido, campo), campo
+
+
+def test_registros_do_cache_sao_os_da_extracao_direta(tmp_path, exportacao):
+    cache = CacheParse(str(tmp_path / "cache"))
+    _gravar(cache, exportacao)
+    diretos = list(extrair_registros(abrir_blocos_bdsia(exportacao)))
+    lidos = list(EntradaCacheParse(cache, exportacao).registros())
+    assert [r.__getstate__() for r in lidos] == [r.__getstate__() for r in diretos]
+
+
+def test_chave_e_a_dos_bytes_lidos(tmp_path, exportacao):
+    cache = CacheParse(str(tmp_path / "cache"))
+    entrada = EntradaCacheParse(cache, exportacao)
+    chave_consultada = entrada.chave
+    # O arquivo muda entre a consulta ao cache e a leitura
+    with open(exportacao, "a", encoding="latin-1") as f:
+        f.write("\n")
+    itens = ((registro, ()) for registro in extrair_registros(entrada.blocos(exportacao)))
+    for _ in entrada.anotar(itens):
+        pass
+    entrada.concluir()
+    assert entrada.gravada
+    assert entrada.chave == hash_arquivo(exportacao) != chave_consultada
+    assert not os.path.exists(cache.caminho(chave_consultada))
+
+
+def test_leitura_incompleta_nao_publica(tmp_path, exportacao):
+    cache = CacheParse(str(tmp_path / "cache"))
+    entrada = EntradaCacheParse(cache, exportacao)
+    blocos = entrada.blocos(exportacao)
+    next(blocos)
+    entrada.concluir()
+    assert not entrada.gravada
+    assert not os.path.exists(cache.caminho(entrada.chave))
+
+
+def test_entrada_vencida_e_removida(tmp_path, exportacao):
+    pasta = str(tmp_path / "cache")
+    gravada, _ = _gravar(CacheParse(pasta), exportacao)
+    caminho = CacheParse(pasta).caminho(gravada.chave)
+    antigo = os.path.getmtime(caminho) - 3600
+    os.utime(caminho, (antigo, antigo))
+
+    assert CacheParse(pasta, idade_maxima=7200).ler(gravada.chave) is not None
+    assert CacheParse(pasta, idade_maxima=1800).ler(gravada.chave) is None
+    assert not os.path.exists(caminho)
+
+
+def test_espaco_liberado_pelas_usadas_ha_mais_tempo(tmp_path):
+    pasta = str(tmp_path / "cache")
+    cache = CacheParse(pasta)
+    chaves = []
+    for semente in (1, 2, 3):
+        caminho = gerar_export(str(tmp_path / f"export{semente}.txt"), 50, semente=semente)
+        chaves.append(_gravar(cache, caminho)[0].chave)
+    # Gravadas em ordem (a primeira é a mais antiga), todas sem uso desde então
+    agora = os.path.getmtime(cache.caminho(chaves[-1]))
+    for idade, chave in zip((300, 200, 100), chaves):
+        os.utime(cache.caminho(chave), (agora - idade, agora - idade))
+
+    # A mais antiga é reaberta: passa a ser a usada mais recentemente, sem renovar a idade
+    mtime = os.path.getmtime(cache.caminho(chaves[0]))
+    assert cache.ler(chaves[0]) is not None
+    assert os.path.getmtime(cache.caminho(chaves[0])) == mtime
+
+    tamanho = os.path.getsize(cache.caminho(chaves[0]))
+    CacheParse(pasta, tamanho_maximo=2 * tamanho + tamanho // 2).liberar_espaco()
+    restantes = [os.path.exists(cache.caminho(chave)) for chave in chaves]
+    assert restantes == [True, False, True]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="permissões POSIX")
+def test_permissoes_restritas(tmp_path, exportacao):
+    cache = CacheParse(str(tmp_path / "cache"))
+    gravada, _ = _gravar(cache, exportacao)
+    assert os.stat(cache.pasta).st_mode & 0o777 == 0o700
+    assert os.stat(cache.caminho(gravada.chave)).st_mode & 0o777 == 0o600
@@ -0,0 +1,101 @@
+# tests/test_extrator.py
+#
+# Paridade do extrator por rótulo (extrair_dados_variaveis) e da leitura da
+# tabela de procedimentos (extrair_principal_e_cnes) com as versões de
+# referência por regex, em blocos sintéticos e em casos de borda.
+
+import random
+
+import pytest
+
+from utils import (
+    extrair_dados_variaveis,
+    extrair_dados_variaveis_por_regex,
+    extrair_principal_e_cnes,
+    extrair_principal_e_cnes_por_regex,
+)
+from benchmarks.gerar_export_sintetico import GeradorExport
+
+BLOCO = """  SISTEMA DE INFORMACOES AMBULATORIAIS        PAG: 1
+NUMERO DO APAC: 352500000001-1
+INICIO DA VALIDADE DA APAC: 01/10/2025    FIM DA VALIDADE DO APAC: 31/12/2025
+CODIGO DA UNIDADE: 2087669
+NOME: MARIA SILVA SANTOS
+CPF:   529.982.247-25
+SEXO: FEMININO    DATA DE NASCIMENTO: 01/02/1950   RACA: 03 PARDA
+NOME DA MAE: ANA SILVA
+NOME DO RES: ANA SILVA
+ENDERECO:  RUA DAS FLORES
+NUMERO:  120
+BAIRRO:  CENTRO
+CEP:  14400-000
+MEDICO SOLICITANTE
+CNS: 702 1027 6175 0292
+C.I.D. PRINCIPAL H251
+PROCEDIMENTOS REALIZADOS:
+CODIGO       DESCRICAO                                          QTD  CBO     CNES TERC
+090501003-5  FACECTOMIA                                          1  225265  2081695
+MOTIVO DE SAIDA: 21
+AUTORIZADOR
+CNS: 898001160660008
+"""
+
+
+def _blocos_sinteticos(quantidade, semente):
+    gerador = GeradorExport(semente, fracao_risco=0.3, fracao_malformados=0.1)
+    return list(gerador.blocos(quantidade))
+
+
+def _mutacoes(bloco, rng):
+    """Variações de formatação que o SIA produz ou que já apareceram em exportações."""
+    yield bloco
+    yield bloco.replace("\n", "\r\n")
+    yield bloco.replace(":  ", ":\t", 1)
+    yield bloco.replace("CNS: ", "CNS:", 1)
+    linhas = bloco.split("\n")
+    for _ in range(3):
+        posicao = rng.randrange(len(linhas))
+        yield "\n".join(linhas[:posicao] + linhas[posicao + 1:])
+    yield bloco[:rng.randrange(len(bloco))]
+
+
+def test_dados_variaveis_bloco_exemplo():
+    dados = extrair_dados_variaveis(BLOCO)
+    assert dados == extrair_dados_variaveis_por_regex(BLOCO)
+    assert dados["NUMERO_APAC"] == "352500000001-1"
+    assert dados["ENDERECO"] == "RUA DAS FLORES, 120 - CENTRO"
+    assert dados["CNS_SOLICITANTE"] == "702102761750292"
+    assert dados["CNS_AUTORIZADOR"] == "898001160660008"
+
+
+def test_bloco_sem_apac():
+    assert extrair_dados_variaveis("RELATORIO SEM DADOS\n") == extrair_dados_variaveis_por_regex("RELATORIO SEM DADOS\n")
+
+
+@pytest.mark.parametrize("semente", [1, 2, 3])
+def test_dados_variaveis_paridade_sinteticos(semente):
+    rng = random.Random(semente)
+    for bloco in _blocos_sinteticos(300, semente):
+        for variacao in _mutacoes(bloco, rng):
+            novo = extrair_dados_variaveis(variacao)
+            referencia = extrair_dados_variaveis_por_regex(variacao)
+            assert novo == referencia, variacao
+            # A ordem das chaves também é a da referência (vira a ordem dos campos)
+            assert list(novo) == list(referencia)
+
+
+@pytest.mark.parametrize("semente", [1, 2])
+def test_principal_e_cnes_paridade_sinteticos(semente):
+    for bloco in _blocos_sinteticos(300, semente):
+        assert extrair_principal_e_cnes(bloco) == extrair_principal_e_cnes_por_regex(bloco), bloco
+
+
+@pytest.mark.parametrize("bloco", [
+    BLOCO,
+    BLOCO.replace("PROCEDIMENTOS REALIZADOS:", "procedimentos realizados:"),
+    BLOCO.replace("2081695", ""),
+    BLOCO.replace("MOTIVO DE SAIDA: 21\n", ""),
+    BLOCO.replace("FACECTOMIA", "FACECTOMIA\nATENCAO: CONFERIR LAUDO"),
+])
+def test_principal_e_cnes_casos_de_borda(bloco):
+    assert extrair_principal_e_cnes(bloco) == extrair_principal_e_cnes_por_regex(bloco)
@@ -0,0 +1,169 @@
+# tests/test_validacao_apac.py
+#
+# Dígitos verificadores (CNS, CPF, número da APAC), a regra dos campos ausentes
+# e a concordância entre a validação vetorizada (numpy) e a em Python puro.
+
+import random
+
+import pytest
+
+import validacao_apac
+from validacao_apac import apac_valida, avisos_registro, cns_valido, cpf_valido, data_ordinal, validar_lote
+from registro_apac import RegistroAPAC
+from benchmarks.gerar_export_sintetico import cns_definitivo, cns_provisorio, digitos_cpf, numero_apac
+
+
+def _registro(**valores):
+    padrao = {
+        "NUMERO_APAC": numero_apac(1),
+        "NOME_PACIENTE": "MARIA SILVA",
+        "SEXO": "F",
+        "DATA_NASCIMENTO": "01/02/1950",
+        "DATA_SOLICITACAO": "01/10/2025",
+        "VALIDADE_FIM": "31/12/2025",
+        "CNS_SOLICITANTE": cns_definitivo("12345678901"),
+        "CNS_AUTORIZADOR": "791417776317068",
+        "CPF_PACIENTE": "529.982.247-25",
+    }
+    return RegistroAPAC(**{**padrao, **valores})
+
+# ==============================================================================
+# DÍGITOS VERIFICADORES
+# ==============================================================================
+
+@pytest.mark.parametrize("cns", [
+    cns_definitivo("12345678901"),
+    cns_definitivo("20000000000"),
+    cns_definitivo("10000000001"),
+    "791417776317068",
+    "700000000000005",
+])
+def test_cns_valido(cns):
+    assert cns_valido(cns)
+
+@pytest.mark.parametrize("cns", [
+    "",
+    cns_definitivo("12345678901")[:14] + "9",  # verificador errado
+    "323456789010003",      # primeiro dígito fora de 1, 2, 7, 8, 9
+    "791417776317069",      # provisório com soma não múltipla de 11
+    "79141777631706",       # 14 dígitos
+    "7914177763170680",     # 16 dígitos
+    "79141777631706a",
+    "７９１４１７７７６３１７０６８",  # dígitos de largura total não são ASCII
+])
+def test_cns_invalido(cns):
+    assert not cns_valido(cns)
+
+def test_cns_definitivo_com_verificador_10():
+    # PIS cujo verificador daria 10: o CNS passa a terminar em 001 + novo verificador
+    base = next(f"1{n:010d}" for n in range(10 ** 6)
+                if (11 - sum(int(d) * p for d, p in zip(f"1{n:010d}", range(15, 4, -1))) % 11) == 10)
+    cns = cns_definitivo(base)
+    assert cns[11:14] == "001"
+    assert cns_valido(cns)
+    assert not cns_valido(cns[:11] + "000" + cns[14])
+
+def test_cns_provisorios_gerados():
+    rng = random.Random(7)
+    for _ in range(200):
+        assert cns_valido(cns_provisorio(rng))
+
+@pytest.mark.parametrize("cpf", ["52998224725", "11144477735", digitos_cpf("123456789")])
+def test_cpf_valido(cpf):
+    assert cpf_valido(cpf)
+
+@pytest.mark.parametrize("cpf", ["52998224724", "11111111111", "00000000000", "5299822472", "529982247250", ""])
+def test_cpf_invalido(cpf):
+    assert not cpf_valido(cpf)
+
+@pytest.mark.parametrize("sequencial", [1, 2, 10, 12345, 99999999])
+def test_apac_valida(sequencial):
+    numero = numero_apac(sequencial).replace("-", "")
+    assert apac_valida(numero)
+    errado = numero[:12] + str((int(numero[12]) + 1) % 10)
+    assert not apac_valida(errado)
+
+def test_apac_com_resto_10_usa_zero():
+    base = next(f"3525{n:08d}" for n in range(1000) if int(f"3525{n:08d}") % 11 == 10)
+    assert apac_valida(base + "0")
+    assert not apac_valida(base + "1")
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("29/02/2024", 20240229),
+    ("29/02/2023", None),
+    ("31/04/2025", None),
+    ("1/02/2024", None),
+    ("01-02-2024", None),
+])
+def test_data_ordinal(texto, esperado):
+    assert data_ordinal(texto) == esperado
+
+# ==============================================================================
+# CAMPOS AUSENTES
+# ==============================================================================
+
+@pytest.mark.parametrize("usar_numpy", [False, True])
+def test_cns_ausente_e_aviso_e_cns_invalido_reprova(usar_numpy):
+    if usar_numpy:
+        pytest.importorskip("numpy")
+    registros = [
+        _registro(),
+        _registro(CNS_SOLICITANTE="", CNS_AUTORIZADOR=""),
+        _registro(CNS_AUTORIZADOR="791417776317069"),
+        _registro(NOME_PACIENTE=""),
+    ]
+    motivos = validar_lote(registros, usar_numpy=usar_numpy)
+    assert motivos == [[], [], ["cns_autorizador_invalido"], ["nome_paciente_ausente"]]
+    assert avisos_registro(registros[1]) == ["cns_solicitante_ausente", "cns_autorizador_ausente"]
+    assert avisos_registro(registros[0]) == []
+
+# ==============================================================================
+# NUMPY x PYTHON PURO
+# ==============================================================================
+
+def _variacoes(rng):
+    """Registros válidos e com defeitos variados (dígito trocado, tamanho, data impossível, campo vazio)."""
+    def estragar(valor):
+        escolha = rng.randrange(5)
+        if not valor or escolha == 0:
+            return valor
+        if escolha == 1:
+            posicao = rng.randrange(len(valor))
+            return valor[:posicao] + str(rng.randrange(10)) + valor[posicao + 1:]
+        if escolha == 2:
+            return valor[:-1]
+        if escolha == 3:
+            return valor + "0"
+        return ""
+
+    for n in range(1500):
+        dia, mes, ano = rng.randrange(0, 33), rng.randrange(0, 14), rng.randrange(1900, 2030)
+        valores = {
+            "NUMERO_APAC": numero_apac(n + 1),
+            "CNS_SOLICITANTE": cns_definitivo(f"{rng.randrange(10 ** 10, 3 * 10 ** 10)}"),
+            "CNS_AUTORIZADOR": cns_provisorio(rng),
+            "CPF_PACIENTE": digitos_cpf(f"{rng.randrange(10 ** 9):09d}"),
+            "DATA_NASCIMENTO": f"{dia:02d}/{mes:02d}/{ano}",
+            "DATA_SOLICITACAO": rng.choice(("01/10/2025", "31/02/2025", "")),
+            "VALIDADE_FIM": rng.choice(("31/12/2025", "01/01/2025", "x")),
+        }
+        if rng.random() < 0.5:
+            campo = rng.choice(list(valores))
+            valores[campo] = estragar(valores[campo])
+        yield _registro(**valores)
+
+def test_numpy_e_python_concordam():
+    pytest.importorskip("numpy")
+    registros = list(_variacoes(random.Random(20)))
+    vetorizada = validar_lote(registros, usar_numpy=True)
+    python = validar_lote(registros, usar_numpy=False)
+    assert vetorizada == python
+    # A amostra precisa exercitar tanto aprovados quanto reprovados
+    assert any(vetorizada) and not all(vetorizada)
+
+def test_lote_vazio():
+    assert validar_lote([]) == []
+
+def test_sem_numpy_valida_em_python_puro(monkeypatch):
+    monkeypatch.setattr(validacao_apac, "np", None)
+    assert validar_lote([_registro()]) == [[]]
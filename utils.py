@@ -1,11 +1,18 @@
 # utils.py
 
 import re
+import bisect
+import io
 import os
 import sys
 import csv
+import time
+import zlib
+import marshal
+import threading
+import functools
+import collections
 from fpdf import FPDF
-from tkinter import filedialog, messagebox
 
 # ==============================================================================
 # FUNÇÃO DE CAMINHO PARA PYINSTALLER
@@ -23,6 +30,51 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+# ==============================================================================
+# ERROS E PASTA DE SAÍDA
+# ==============================================================================
+
+class ErroGeracaoAPAC(Exception):
+    """Erro que impede a geração das APACs; a GUI mostra em um diálogo e a CLI na saída de erro."""
+
+class GeracaoCancelada(ErroGeracaoAPAC):
+    """O usuário cancelou a geração; só as partes de PDF já concluídas ficam gravadas."""
+
+def verificar_cancelamento(cancelar):
+    """Levanta GeracaoCancelada se o evento de cancelamento (threading.Event) foi acionado."""
+    if cancelar is not None and cancelar.is_set():
+        raise GeracaoCancelada("Geração cancelada pelo usuário.")
+
+def pasta_saida_padrao():
+    """Pasta onde os PDFs e relatórios são gravados quando nenhuma outra é informada."""
+    return os.path.join(os.path.expanduser("~"), "Downloads")
+
+# Pasta dos caches derivados (template preparado, tabelas e índices em marshal):
+# APAC_CACHE, se definida, ou ~/.solicitador_apac/cache. Fica na pasta do usuário,
+# e não na temporária compartilhada, porque o que está nela é usado sem conferência
+# (o marshal é carregado e o template vai para todas as APACs)
+VARIAVEL_PASTA_CACHE = "APAC_CACHE"
+PASTA_CACHE = os.environ.get(VARIAVEL_PASTA_CACHE) or os.path.join(
+    os.path.expanduser("~"), ".solicitador_apac", "cache"
+)
+MODO_PASTA_PRIVADA = 0o700
+
+def criar_pasta_privada(pasta):
+    """Cria a pasta (ou restringe a que já existe) só para o usuário; permissões são ignoradas no Windows."""
+    os.makedirs(pasta, mode=MODO_PASTA_PRIVADA, exist_ok=True)
+    try:
+        os.chmod(pasta, MODO_PASTA_PRIVADA)
+    except OSError:
+        pass
+    return pasta
+
+def arquivo_confiavel(info):
+    """Se um arquivo de cache (os.stat) pode ser reaproveitado: do próprio usuário
+    (ou do root) e sem escrita para o grupo ou os demais. Sempre True no Windows."""
+    if not hasattr(os, "getuid"):
+        return True
+    return info.st_uid in (0, os.getuid()) and not info.st_mode & 0o022
+
 # ==============================================================================
 # FUNÇÕES DE UTILIDADE GERAL
 # ==============================================================================
@@ -32,8 +84,41 @@ def extrair(pattern, texto, flags=0):
     match = re.search(pattern, texto, flags)
     return match.group(1).strip() if match else ""
 
-def extrair_principal_e_cnes(bloco, caminho_csv='estabelecimentos.csv'):
-    
+# ==============================================================================
+# LEITURA EM FLUXO DO ARQUIVO EXPORTADO (BDSIA)
+# ==============================================================================
+
+MARCADOR_BLOCO = "*BDSIA"
+TAMANHO_LEITURA = 1024 * 1024  # caracteres lidos por vez (latin-1: 1 caractere = 1 byte)
+
+def ler_blocos_bdsia(arquivo, tamanho_leitura=TAMANHO_LEITURA):
+    """Gera os blocos de APAC de um arquivo aberto, um por vez.
+
+    Equivale a f.read().split("*BDSIA") filtrado por "NUMERO DO APAC", mas
+    mantém em memória no máximo um trecho lido mais o bloco em andamento. Um
+    marcador partido entre duas leituras é remontado porque a sobra após o último
+    marcador é sempre concatenada à leitura seguinte.
+    """
+    sobra = ""
+    while True:
+        trecho = arquivo.read(tamanho_leitura)
+        if not trecho:
+            break
+        partes = (sobra + trecho).split(MARCADOR_BLOCO)
+        sobra = partes.pop()
+        for bloco in partes:
+            if "NUMERO DO APAC" in bloco:
+                yield bloco
+    if "NUMERO DO APAC" in sobra:
+        yield sobra
+
+def abrir_blocos_bdsia(caminho_arquivo, tamanho_leitura=TAMANHO_LEITURA):
+    """Abre o arquivo exportado (latin-1) e gera seus blocos de APAC sob demanda."""
+    with open(caminho_arquivo, 'r', encoding='latin-1') as f:
+        yield from ler_blocos_bdsia(f, tamanho_leitura)
+
+def extrair_principal_e_cnes_por_regex(bloco, caminho_csv='estabelecimentos.csv'):
+    """Versão de referência (várias varreduras da seção); usada para conferir extrair_procedimentos."""
     proc_principal = ""
     cnes_solicitante_capturado = ""
 
@@ -74,22 +159,11 @@ def extrair_principal_e_cnes(bloco, caminho_csv='estabelecimentos.csv'):
                 cnes_solicitante_capturado = match_cnes.group(1).strip()
                 break # Encontrou o CNES válido, pode sair do loop
 
-    # Validação contra estabelecimentos.csv
+    # Validação contra estabelecimentos.csv (índice em memória)
     cod_cnes_solicitante = ""
     if len(cnes_solicitante_capturado) >= 5:
-        # --- ALTERAÇÃO: Usa resource_path() para localizar o CSV ---
-        csv_path = resource_path(caminho_csv)
-        if os.path.exists(csv_path):
-            try:
-                with open(csv_path, mode='r', encoding='utf-8') as file:
-                    reader = csv.DictReader(file, delimiter=';')
-                    for row in reader:
-                        if row['cod_solicitante'].strip() == cnes_solicitante_capturado:
-                            cod_cnes_solicitante = cnes_solicitante_capturado
-                            break
-            except Exception as e:
-                print(f"[ERRO] Falha ao validar CNES no CSV: {e}")
-        # -----------------------------------------------------------
+        if cnes_solicitante_capturado in tabela_estabelecimentos(caminho_csv):
+            cod_cnes_solicitante = cnes_solicitante_capturado
 
     # Se não validou pelo CSV, usa CNES_ESTABELECIMENTO como fallback
     if not cod_cnes_solicitante:
@@ -99,8 +173,8 @@ def extrair_principal_e_cnes(bloco, caminho_csv='estabelecimentos.csv'):
     return proc_principal, cod_cnes_solicitante
 
 
-def extrair_dados_variaveis(bloco):
-    """Extrai apenas os dados variáveis de um bloco de texto da APAC."""
+def extrair_dados_variaveis_por_regex(bloco):
+    """Versão de referência (uma busca por campo); usada para conferir o extrator por rótulo."""
     if "NUMERO DO APAC" not in bloco:
         return {}
     
@@ -142,160 +216,837 @@ def extrair_dados_variaveis(bloco):
 
     return dados
 
-# O restante do seu arquivo utils.py...
+# ==============================================================================
+# EXTRATOR POR RÓTULO (str.find + regex do valor)
+# ==============================================================================
 
-_estabelecimentos_cache = None
+# Valor que vai até o fim da linha (nomes, endereço, bairro, raça)
+VALOR_ATE_FIM_DA_LINHA = r'\s+([^\n]+)'
 
-def buscar_nome_medico_por_cns(cns, caminho_csv='medicos.csv'):
-    """Busca o nome do médico em um arquivo CSV a partir do Cartão Nacional de Saúde (CNS)."""
-    if not cns:
-        return None
-    
-    # --- ALTERAÇÃO: Usa resource_path() para localizar o CSV ---
-    csv_path = resource_path(caminho_csv)
-    if not os.path.exists(csv_path):
-        print(f"ERRO: Arquivo '{caminho_csv}' não encontrado.")
+# (chave, rótulo no texto, padrão do valor logo após o rótulo)
+CAMPOS_BLOCO = (
+    ("CPF_PACIENTE", "CPF:", r'\s+([\d\.\-]+)'),
+    ("NOME_PACIENTE", "NOME:", VALOR_ATE_FIM_DA_LINHA),
+    ("SEXO", "SEXO:", r'\s+(MASCULINO|FEMININO)'),
+    ("DATA_NASCIMENTO", "DATA DE NASCIMENTO:", r'\s+([\d/]+)'),
+    ("RACA_COR", "RACA:", VALOR_ATE_FIM_DA_LINHA),
+    ("NOME_MAE", "NOME DA MAE:", VALOR_ATE_FIM_DA_LINHA),
+    ("NOME_RESPONSAVEL", "NOME DO RES:", VALOR_ATE_FIM_DA_LINHA),
+    ("RUA", "ENDERECO:", VALOR_ATE_FIM_DA_LINHA),
+    ("NUMERO", "NUMERO:", r'\s+([\d]+)'),
+    ("BAIRRO", "BAIRRO:", VALOR_ATE_FIM_DA_LINHA),
+    ("CEP", "CEP:", r'\s+([\d\-]+)'),
+    ("DATA_SOLICITACAO", "INICIO DA VALIDADE DA APAC:", r'\s+([\d/]+)'),
+    ("VALIDADE_FIM", "FIM DA VALIDADE DO APAC:", r'\s+([\d/]+)'),
+    ("NUMERO_APAC", "NUMERO DO APAC:", r'\s+([\d\-]+)'),
+    ("CNES_ESTABELECIMENTO", "CODIGO DA UNIDADE:", r'\s*([\d-]+)'),
+    ("CID10_PRINCIPAL", "C.I.D. PRINCIPAL", r'\s*([A-Z]\d{2,3})'),
+    ("CNS", "CNS:", r'\s*([\d\s]+)'),
+)
+
+# Cada campo: (chave, rótulo, tamanho do rótulo, match compilado do valor, valor até o fim da linha?)
+_CAMPOS_COMPILADOS = tuple(
+    (chave, rotulo, len(rotulo), re.compile(padrao).match, padrao == VALOR_ATE_FIM_DA_LINHA)
+    for chave, rotulo, padrao in CAMPOS_BLOCO
+    if chave != "CNS"
+)
+_CASAR_CNS = re.compile(r'\s*([\d\s]+)').match
+
+# Resultado de extrair_dados_variaveis com todos os campos vazios, na ordem de sempre
+_DADOS_VAZIOS = dict.fromkeys((
+    "CPF_PACIENTE", "NOME_PACIENTE", "SEXO", "DATA_NASCIMENTO", "RACA_COR", "NOME_MAE",
+    "NOME_RESPONSAVEL", "ENDERECO", "CEP", "DATA_SOLICITACAO", "VALIDADE_FIM", "NUMERO_APAC",
+    "CNES_ESTABELECIMENTO", "CID10_PRINCIPAL", "CNS_SOLICITANTE", "CNS_AUTORIZADOR",
+    "RUA", "NUMERO", "BAIRRO",
+), "")
+
+def extrair_dados_variaveis(bloco):
+    """Extrai apenas os dados variáveis de um bloco de texto da APAC."""
+    if "NUMERO DO APAC" not in bloco:
+        return {}
+
+    # Os rótulos são literais: str.find acha cada ocorrência e a regex do valor só
+    # é testada ali. Cada campo fica com a primeira ocorrência cujo valor casa
+    # (como re.search) e o CNS com todas (como re.findall).
+    find = bloco.find
+    dados = _DADOS_VAZIOS.copy()
+    for chave, rotulo, tamanho, casar, ate_fim_da_linha in _CAMPOS_COMPILADOS:
+        posicao = find(rotulo)
+        while posicao >= 0:
+            inicio = posicao + tamanho
+            # Caso comum de \s+([^\n]+): espaço e o valor na mesma linha do rótulo
+            if ate_fim_da_linha and bloco[inicio:inicio + 1] in (" ", "\t"):
+                fim = find("\n", inicio)
+                valor = bloco[inicio:fim if fim >= 0 else len(bloco)].strip()
+                if valor:
+                    dados[chave] = valor
+                    break
+            match = casar(bloco, inicio)
+            if match:
+                dados[chave] = match.group(1).strip()
+                break
+            posicao = find(rotulo, posicao + 1)
+
+    cns_matches = []
+    posicao = find("CNS:")
+    while posicao >= 0:
+        match = _CASAR_CNS(bloco, posicao + 4)
+        if match:
+            cns_matches.append(match.group(1))
+            posicao = find("CNS:", match.end())
+        else:
+            posicao = find("CNS:", posicao + 1)
+
+    # Com duas ou mais ocorrências: a primeira é o solicitante e a última o autorizador
+    if len(cns_matches) >= 2:
+        dados["CNS_SOLICITANTE"] = cns_matches[0].replace(" ", "").strip()
+        dados["CNS_AUTORIZADOR"] = cns_matches[-1].replace(" ", "").strip()
+
+    dados["RACA_COR"] = dados["RACA_COR"].split(" ")[0]
+    dados["ENDERECO"] = f"{dados.pop('RUA')}, {dados.pop('NUMERO')} - {dados.pop('BAIRRO')}"
+    return dados
+
+# ==============================================================================
+# TABELA "PROCEDIMENTOS REALIZADOS" (PASSADA ÚNICA)
+# ==============================================================================
+
+# Uma linha da tabela: CODIGO  DESCRICAO  QTD  CBO  CNES TERC (só o código é obrigatório)
+LinhaProcedimento = collections.namedtuple("LinhaProcedimento", "cod descricao qtd cbo cnes_terc")
+
+# Linhas PROC_SEC1..5 do formulário
+SECUNDARIOS_NO_FORMULARIO = 5
+
+INICIO_PROCEDIMENTOS = "PROCEDIMENTOS REALIZADOS:"
+FIM_PROCEDIMENTOS = "MOTIVO DE SAIDA"
+_RE_SECAO_PROCEDIMENTOS = re.compile(r'PROCEDIMENTOS REALIZADOS:(.*?)(?=MOTIVO DE SAIDA)', re.DOTALL | re.IGNORECASE)
+_RE_LINHA_PROCEDIMENTO = re.compile(r'^[ \t]*(\d{9}-\d)(?![\d-])(.*)$', re.MULTILINE)
+
+def _colunas_procedimento(cod, resto):
+    """Separa as colunas depois do código, da direita para a esquerda.
+
+    Um número de 6 ou 7 dígitos no fim da linha é sempre o CNES terceiro (a regra
+    de sempre); o CBO vem antes dele (4 dígitos + 2 caracteres) e a quantidade
+    antes do CBO. O que sobra é a descrição.
+    """
+    tokens = resto.rsplit(None, 3)
+    cnes_terc = cbo = qtd = ""
+    if tokens and len(tokens[-1]) in (6, 7) and tokens[-1].isdecimal():
+        cnes_terc = tokens.pop()
+    if tokens and len(tokens[-1]) == 6 and tokens[-1][:4].isdecimal() and tokens[-1].isalnum():
+        cbo = tokens.pop()
+    if tokens and len(tokens[-1]) <= 4 and tokens[-1].isdecimal():
+        qtd = tokens.pop()
+    return LinhaProcedimento(cod, " ".join(tokens).strip(), qtd, cbo, cnes_terc)
+
+def ler_procedimentos(bloco):
+    """Linhas (LinhaProcedimento) da tabela de procedimentos do bloco, na ordem do arquivo.
+
+    Só contam as linhas que começam por um código de procedimento; cabeçalho,
+    ATENCAO e OBSERVACAO ficam de fora sem precisar de tratamento próprio.
+    """
+    # Os limites da seção saem de str.find; a regex (sem distinguir maiúsculas) só
+    # entra quando o texto não vem no formato usual
+    inicio = bloco.find(INICIO_PROCEDIMENTOS)
+    fim = bloco.find(FIM_PROCEDIMENTOS, inicio) if inicio >= 0 else -1
+    if fim >= 0:
+        inicio += len(INICIO_PROCEDIMENTOS)
+    else:
+        secao = _RE_SECAO_PROCEDIMENTOS.search(bloco)
+        if not secao:
+            return ()
+        inicio, fim = secao.span(1)
+    return tuple(
+        _colunas_procedimento(match.group(1), match.group(2))
+        for match in _RE_LINHA_PROCEDIMENTO.finditer(bloco, inicio, fim)
+    )
+
+def cnes_solicitante(cnes_terc, cnes_unidade, caminho_csv='estabelecimentos.csv'):
+    """O CNES terceiro se ele constar em estabelecimentos.csv; senão o CNES da unidade."""
+    if len(cnes_terc) >= 5 and cnes_terc in tabela_estabelecimentos(caminho_csv):
+        return cnes_terc
+    return cnes_unidade or ""
+
+def cnes_terceiro(linhas):
+    """CNES terceiro da tabela de procedimentos: o da última linha que o informa."""
+    return next((linha.cnes_terc for linha in reversed(linhas) if linha.cnes_terc), "")
+
+def extrair_procedimentos(bloco, cnes_unidade=None, caminho_csv='estabelecimentos.csv'):
+    """(linha principal ou None, linhas secundárias, CNES solicitante) da tabela de procedimentos.
+
+    A principal é a primeira linha da tabela e o CNES terceiro é o da última linha
+    que o informa. cnes_unidade (CODIGO DA UNIDADE, já extraído por
+    extrair_dados_variaveis) evita procurá-lo de novo no bloco.
+    """
+    linhas = ler_procedimentos(bloco)
+    if cnes_unidade is None:
+        cnes_unidade = extrair(r'CODIGO DA UNIDADE:\s*([\d-]+)', bloco)
+    cnes = cnes_solicitante(cnes_terceiro(linhas), cnes_unidade, caminho_csv)
+    if not linhas:
+        return None, (), cnes
+    return linhas[0], linhas[1:], cnes
+
+def extrair_principal_e_cnes(bloco, caminho_csv='estabelecimentos.csv'):
+    """(código do procedimento principal, CNES solicitante) do bloco; ver extrair_procedimentos."""
+    principal, _, cnes = extrair_procedimentos(bloco, caminho_csv=caminho_csv)
+    return (principal.cod if principal else ""), cnes
+
+# ==============================================================================
+# REGISTRO DE TABELAS DE CONSULTA (CSV)
+# ==============================================================================
+
+# Intervalo mínimo (em segundos) entre duas verificações de mtime do mesmo CSV
+INTERVALO_VERIFICACAO_CSV = 1.0
+
+# Tabelas de consulta já indexadas em marshal: "<csv>.<chave>.<valor>.tab" ao lado
+# dos CSVs (geradas no build com empacotar_tabelas) ou em PASTA_CACHE
+VERSAO_PACOTE_TABELA = 2
+
+def nome_pacote_tabela(caminho_csv, coluna_chave, coluna_valor):
+    return f"{os.path.basename(caminho_csv)}.{coluna_chave}.{coluna_valor}.tab"
+
+def assinatura_csv(conteudo, delimitador):
+    """Identifica o conteúdo de um CSV (o mtime muda a cada extração do executável)."""
+    return (VERSAO_PACOTE_TABELA, len(conteudo), zlib.crc32(conteudo), delimitador)
+
+def ler_pacote_tabela(caminho_pacote, assinatura):
+    """Índice guardado no pacote, ou None se não existir, for de outra versão do CSV
+    ou puder ter sido gravado por outro usuário (ver arquivo_confiavel)."""
+    try:
+        with open(caminho_pacote, 'rb') as f:
+            if not arquivo_confiavel(os.fstat(f.fileno())):
+                return None
+            assinatura_pacote, indice = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
         return None
+    return indice if assinatura_pacote == assinatura else None
 
+def gravar_pacote_tabela(caminho_pacote, assinatura, indice):
+    """Grava o pacote de forma atômica; falhas (pasta sem permissão etc.) só retornam False."""
     try:
-        with open(csv_path, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file, delimiter=';')
-            for row in reader:
-                if row['cartao_sus'].strip() == cns.strip():
-                    return row['nome_completo']
-    except Exception as e:
-        print(f"ERRO ao ler o arquivo CSV: {e}")
+        pasta = os.path.dirname(caminho_pacote)
+        if pasta == PASTA_CACHE:
+            criar_pasta_privada(pasta)
+        else:
+            os.makedirs(pasta, exist_ok=True)
+        temporario = f"{caminho_pacote}.{os.getpid()}.tmp"
+        with open(temporario, 'wb') as f:
+            marshal.dump((assinatura, indice), f)
+        os.replace(temporario, caminho_pacote)
+    except OSError:
+        return False
+    return True
+
+def normalizar_chave(valor):
+    """Normaliza uma chave de consulta: sem espaços nas pontas, maiúscula, sem traços e sem pontos (H25.1 = H251)."""
+    if valor is None:
+        return ""
+    return str(valor).strip().upper().replace('-', '').replace('.', '')
+
+class TabelaIndexada:
+    """Tabela CSV carregada uma única vez em um índice hash, recarregada quando o arquivo muda."""
+
+    def __init__(self, caminho_csv, coluna_chave, coluna_valor, delimitador=';'):
+        self.caminho_csv = caminho_csv
+        self.coluna_chave = coluna_chave
+        self.coluna_valor = coluna_valor
+        self.delimitador = delimitador
+        self.acertos = 0
+        self.falhas = 0
+        self.recargas = 0
+        self._indice = {}
+        self._mtime = None
+        self._existe = False
+        self._ultima_verificacao = None
+        self._lock = threading.Lock()
+
+    def _indexar_csv(self, conteudo):
+        indice = {}
+        reader = csv.DictReader(io.StringIO(conteudo.decode('utf-8')), delimiter=self.delimitador)
+        for row in reader:
+            chave = normalizar_chave(row[self.coluna_chave])
+            # Mantém a primeira ocorrência, como fazia a busca linear
+            if chave not in indice:
+                indice[chave] = row[self.coluna_valor]
+        return indice
+
+    def _carregar(self, caminho, mtime):
+        with open(caminho, mode='rb') as file:
+            conteudo = file.read()
+        assinatura = assinatura_csv(conteudo, self.delimitador)
+        nome_pacote = nome_pacote_tabela(self.caminho_csv, self.coluna_chave, self.coluna_valor)
+        indice = None
+        for caminho_pacote in (resource_path(nome_pacote), os.path.join(PASTA_CACHE, nome_pacote)):
+            indice = ler_pacote_tabela(caminho_pacote, assinatura)
+            if indice is not None:
+                break
+        else:
+            indice = self._indexar_csv(conteudo)
+            gravar_pacote_tabela(os.path.join(PASTA_CACHE, nome_pacote), assinatura, indice)
+        self._indice = indice
+        self._mtime = mtime
+        self.recargas += 1
+
+    def _atualizar(self):
+        """Carrega o CSV na primeira consulta e recarrega se o mtime mudou."""
+        agora = time.monotonic()
+        if (self._ultima_verificacao is not None
+                and agora - self._ultima_verificacao < INTERVALO_VERIFICACAO_CSV):
+            return
+        with self._lock:
+            self._ultima_verificacao = agora
+            caminho = resource_path(self.caminho_csv)
+            try:
+                mtime = os.stat(caminho).st_mtime_ns
+            except OSError:
+                self._indice, self._mtime, self._existe = {}, None, False
+                return
+            self._existe = True
+            if mtime != self._mtime:
+                try:
+                    self._carregar(caminho, mtime)
+                except Exception as e:
+                    print(f"ERRO ao ler o arquivo CSV '{self.caminho_csv}': {e}")
+                    self._indice, self._mtime = {}, None
+
+    @property
+    def existe(self):
+        self._atualizar()
+        return self._existe
+
+    def __len__(self):
+        self._atualizar()
+        return len(self._indice)
+
+    def __contains__(self, chave):
+        # Só consulta o índice: testes de pertinência não entram nos contadores
+        self._atualizar()
+        return normalizar_chave(chave) in self._indice
+
+    def buscar(self, chave):
+        """Retorna o valor associado à chave normalizada ou None."""
+        self._atualizar()
+        valor = self._indice.get(normalizar_chave(chave))
+        if valor is None:
+            self.falhas += 1
+        else:
+            self.acertos += 1
+        return valor
+
+    def estatisticas(self):
+        return {
+            "arquivo": self.caminho_csv,
+            "registros": len(self._indice),
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "recargas": self.recargas,
+        }
+
+class RegistroTabelas:
+    """Mantém uma TabelaIndexada por (arquivo, coluna chave, coluna valor)."""
+
+    def __init__(self):
+        self._tabelas = {}
+        self._lock = threading.Lock()
+
+    def tabela(self, caminho_csv, coluna_chave, coluna_valor):
+        chave = (caminho_csv, coluna_chave, coluna_valor)
+        tabela = self._tabelas.get(chave)
+        if tabela is None:
+            with self._lock:
+                tabela = self._tabelas.setdefault(
+                    chave, TabelaIndexada(caminho_csv, coluna_chave, coluna_valor)
+                )
+        return tabela
+
+    def estatisticas(self):
+        """Contadores de acertos/falhas de cada tabela carregada."""
+        return [tabela.estatisticas() for tabela in self._tabelas.values()]
+
+    def zerar_contadores(self):
+        for tabela in self._tabelas.values():
+            tabela.acertos = tabela.falhas = 0
+
+    def limpar(self):
+        """Descarta as tabelas carregadas; a próxima consulta relê os CSVs."""
+        with self._lock:
+            self._tabelas.clear()
+
+registro_tabelas = RegistroTabelas()
+
+def tabela_medicos(caminho_csv='medicos.csv'):
+    return registro_tabelas.tabela(caminho_csv, 'cartao_sus', 'nome_completo')
+
+def tabela_estabelecimentos(caminho_csv='estabelecimentos.csv'):
+    return registro_tabelas.tabela(caminho_csv, 'cod_solicitante', 'desc_solicitante')
+
+def tabela_cid(caminho_csv='cid_oftalmologia.csv'):
+    return registro_tabelas.tabela(caminho_csv, 'codigo', 'descricao')
+
+def tabela_cid10(caminho_csv='cid10.csv'):
+    return registro_tabelas.tabela(caminho_csv, 'codigo', 'descricao')
+
+# (arquivo, coluna chave, coluna valor) das tabelas usadas pelas especialidades
+TABELAS_CONSULTA = (
+    ('medicos.csv', 'cartao_sus', 'nome_completo'),
+    ('estabelecimentos.csv', 'cod_solicitante', 'desc_solicitante'),
+    ('cid_oftalmologia.csv', 'codigo', 'descricao'),
+    ('cid10.csv', 'codigo', 'descricao'),
+)
+
+def empacotar_tabelas(pasta_destino=None):
+    """Gera os pacotes .tab das tabelas de consulta (para incluir no build do executável).
+
+    Retorna a lista de pacotes gravados; CSVs ausentes são ignorados.
+    """
+    pasta_destino = pasta_destino or resource_path("")
+    gravados = []
+    for caminho_csv, coluna_chave, coluna_valor in TABELAS_CONSULTA:
+        tabela = TabelaIndexada(caminho_csv, coluna_chave, coluna_valor)
+        try:
+            with open(resource_path(caminho_csv), 'rb') as f:
+                conteudo = f.read()
+        except OSError:
+            continue
+        assinatura = assinatura_csv(conteudo, tabela.delimitador)
+        caminho_pacote = os.path.join(pasta_destino, nome_pacote_tabela(caminho_csv, coluna_chave, coluna_valor))
+        gravar_pacote_tabela(caminho_pacote, assinatura, tabela._indexar_csv(conteudo))
+        gravados.append(caminho_pacote)
+    return gravados
+
+def cadastro_nacional():
+    """Cadastro SQLite de profissionais e estabelecimentos (cadastro_nacional), ou None se não houver."""
+    from cadastro_nacional import cadastro_padrao  # sqlite3 só é carregado na primeira consulta sem resposta no CSV
+    return cadastro_padrao()
+
+def estatisticas_consultas():
+    """Retorna os contadores de acertos/falhas das tabelas de consulta (e do cadastro nacional, se aberto)."""
+    estatisticas = registro_tabelas.estatisticas()
+    cadastro = sys.modules.get("cadastro_nacional")
+    if cadastro is not None and cadastro._cadastro is not None:
+        estatisticas.append(cadastro._cadastro.estatisticas())
+    return estatisticas
+
+def buscar_nome_medico_por_cns(cns, caminho_csv='medicos.csv'):
+    """Busca o nome do médico pelo Cartão Nacional de Saúde (CNS): no CSV e, se não achar, no cadastro nacional."""
+    if not cns:
         return None
-    return None
+
+    tabela = tabela_medicos(caminho_csv)
+    nome = tabela.buscar(cns) if tabela.existe else None
+    if nome is None:
+        cadastro = cadastro_nacional()
+        if cadastro is not None:
+            return cadastro.nome_profissional(cns)
+        if not tabela.existe:
+            print(f"ERRO: Arquivo '{caminho_csv}' não encontrado.")
+    return nome
 
 def buscar_descricao_cid(codigo_cid):
-    """Busca a descrição de um CID em um arquivo CSV."""
-    # --- ALTERAÇÃO: Usa resource_path() para localizar o CSV ---
-    caminho_csv = resource_path('cid_oftalmologia.csv')
-    if not os.path.exists(caminho_csv):
-        messagebox.showerror("Erro", f"Arquivo CSV não encontrado: {caminho_csv}")
+    """Busca a descrição de um CID: código completo, depois a categoria (H25.1 -> H25) e por fim o capítulo.
+
+    Consulta a tabela completa (cid10.csv) e a de oftalmologia, nessa ordem.
+    """
+    tabelas = [tabela for tabela in (tabela_cid10(), tabela_cid()) if tabela.existe]
+    if not tabelas:
+        print(f"ERRO: Arquivo CSV não encontrado: {resource_path(tabela_cid10().caminho_csv)}")
+
+    codigo = normalizar_chave(codigo_cid)
+    for chave in (codigo, codigo[:3]) if len(codigo) > 3 else (codigo,):
+        for tabela in tabelas:
+            descricao = tabela.buscar(chave)
+            if descricao:
+                return descricao
+    return capitulo_cid(codigo) or "Descrição não encontrada"
+
+# ==============================================================================
+# CID-10: CAPÍTULOS E IMPORTAÇÃO DA TABELA DO DATASUS
+# ==============================================================================
+
+# (primeira categoria, última categoria, descrição), em ordem
+CAPITULOS_CID10 = (
+    ("A00", "B99", "Algumas doenças infecciosas e parasitárias"),
+    ("C00", "D48", "Neoplasias (tumores)"),
+    ("D50", "D89", "Doenças do sangue e dos órgãos hematopoéticos e alguns transtornos imunitários"),
+    ("E00", "E90", "Doenças endócrinas, nutricionais e metabólicas"),
+    ("F00", "F99", "Transtornos mentais e comportamentais"),
+    ("G00", "G99", "Doenças do sistema nervoso"),
+    ("H00", "H59", "Doenças do olho e anexos"),
+    ("H60", "H95", "Doenças do ouvido e da apófise mastóide"),
+    ("I00", "I99", "Doenças do aparelho circulatório"),
+    ("J00", "J99", "Doenças do aparelho respiratório"),
+    ("K00", "K93", "Doenças do aparelho digestivo"),
+    ("L00", "L99", "Doenças da pele e do tecido subcutâneo"),
+    ("M00", "M99", "Doenças do sistema osteomuscular e do tecido conjuntivo"),
+    ("N00", "N99", "Doenças do aparelho geniturinário"),
+    ("O00", "O99", "Gravidez, parto e puerpério"),
+    ("P00", "P96", "Algumas afecções originadas no período perinatal"),
+    ("Q00", "Q99", "Malformações congênitas, deformidades e anomalias cromossômicas"),
+    ("R00", "R99", "Sintomas, sinais e achados anormais de exames clínicos e de laboratório"),
+    ("S00", "T98", "Lesões, envenenamento e algumas outras consequências de causas externas"),
+    ("U04", "U99", "Códigos para propósitos especiais"),
+    ("V01", "Y98", "Causas externas de morbidade e de mortalidade"),
+    ("Z00", "Z99", "Fatores que influenciam o estado de saúde e o contato com os serviços de saúde"),
+)
+_INICIOS_CAPITULOS = [inicio for inicio, _, _ in CAPITULOS_CID10]
+_RE_CATEGORIA_CID = re.compile(r'[A-Z]\d\d')
+
+def capitulo_cid(codigo_cid):
+    """Descrição do capítulo do CID-10 que contém o código, ou None."""
+    categoria = normalizar_chave(codigo_cid)[:3]
+    if not _RE_CATEGORIA_CID.fullmatch(categoria):
+        return None
+    posicao = bisect.bisect_right(_INICIOS_CAPITULOS, categoria) - 1
+    if posicao < 0:
         return None
+    _, fim, descricao = CAPITULOS_CID10[posicao]
+    return descricao if categoria <= fim else None
 
-    with open(caminho_csv, mode='r', encoding='utf-8') as file:
-        reader = csv.DictReader(file, delimiter=';')
-        for row in reader:
-            if row['codigo'].strip().upper() == codigo_cid.strip().upper():
-                return row['descricao']
-    return "Descrição não encontrada"
+def converter_cid10_datasus(caminhos_datasus, destino='cid10.csv'):
+    """Monta cid10.csv (codigo;descricao, UTF-8) a partir das tabelas CSV do DATASUS.
+
+    Aceita CID-10-CATEGORIAS.CSV (coluna CAT) e CID-10-SUBCATEGORIAS.CSV (coluna
+    SUBCAT), em latin-1 e separadas por ';'. Retorna o número de códigos gravados.
+    """
+    descricoes = {}
+    for caminho in caminhos_datasus:
+        with open(caminho, encoding='latin-1', newline='') as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                codigo = normalizar_chave(row.get('SUBCAT') or row.get('CAT'))
+                descricao = (row.get('DESCRICAO') or '').strip()
+                if codigo and descricao:
+                    descricoes.setdefault(codigo, descricao)
+
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8', newline='') as f:
+        escritor = csv.writer(f, delimiter=';')
+        escritor.writerow(('codigo', 'descricao'))
+        escritor.writerows(sorted(descricoes.items()))
+    os.replace(temporario, destino)
+    return len(descricoes)
 
 def buscar_descricao_cnes(cnes, caminho_csv='estabelecimentos.csv'):
-    """Busca a descrição de um CNES solicitante ou executante em um arquivo CSV."""
+    """Busca a descrição de um CNES solicitante ou executante: no CSV e, se não achar, no cadastro nacional."""
     if not cnes:
         return "" 
 
-    # --- ALTERAÇÃO: Usa resource_path() para localizar o CSV ---
-    csv_path = resource_path(caminho_csv)
-    if not os.path.exists(csv_path):
-        print(f"ERRO: Arquivo '{caminho_csv}' não encontrado.")
-        return ""
+    # Usa 'cod_solicitante' pois o CSV usa essa coluna para todos os CNES
+    tabela = tabela_estabelecimentos(caminho_csv)
+    descricao = tabela.buscar(cnes) if tabela.existe else None
+    if descricao is None:
+        cadastro = cadastro_nacional()
+        if cadastro is not None:
+            return cadastro.descricao_estabelecimento(cnes) or ""
+        if not tabela.existe:
+            print(f"ERRO: Arquivo '{caminho_csv}' não encontrado.")
+    return descricao or ""
+    
+# ==============================================================================
+# TEMPLATE DE FUNDO (PREPARADO UMA VEZ POR PROCESSO)
+# ==============================================================================
+
+TEMPLATE_PNG = "template.png"
+
+# cor: RGB sem canal alfa | cinza: 8 bits | pb: 1 bit (bilevel)
+VARIANTES_TEMPLATE = ("cor", "cinza", "pb")
+VARIANTE_TEMPLATE = "cor"
+DPI_TEMPLATE = None  # None mantém a resolução original do template.png
+LIMIAR_PB = 160  # tons acima disso viram branco na variante "pb"
+
+@functools.lru_cache(maxsize=None)
+def preparar_template(variante=VARIANTE_TEMPLATE, dpi=DPI_TEMPLATE):
+    """Prepara o fundo da página e retorna o caminho do arquivo pronto para o FPDF.
+
+    O resultado fica em cache no processo (e em disco, em PASTA_CACHE), então
+    o PNG original só é decodificado uma vez. Como o FPDF reconhece o mesmo caminho,
+    a imagem é embutida uma única vez em cada documento.
+    """
+    if variante not in VARIANTES_TEMPLATE:
+        raise ValueError(f"Variante de template desconhecida: {variante}")
+
+    caminho_png = resource_path(TEMPLATE_PNG)
+    if not os.path.exists(caminho_png):
+        raise FileNotFoundError(f"Arquivo '{TEMPLATE_PNG}' não encontrado.")
 
+    mtime = os.stat(caminho_png).st_mtime_ns
+    criar_pasta_privada(PASTA_CACHE)
+    caminho_pronto = os.path.join(PASTA_CACHE, f"template_{variante}_{dpi or 'original'}_{mtime}.png")
     try:
-        with open(csv_path, mode='r', encoding='utf-8') as file:
-            reader = csv.DictReader(file, delimiter=';')
-            for row in reader:
-                # Usa 'cod_solicitante' pois o CSV usa essa coluna para todos os CNES
-                if row['cod_solicitante'].strip() == cnes.strip().replace('-', ''):
-                    return row['desc_solicitante']
-    except Exception as e:
-        print(f"ERRO ao ler o arquivo CSV: {e}")
-        return ""
-    return ""
-    
+        if arquivo_confiavel(os.stat(caminho_pronto)):
+            return caminho_pronto
+    except OSError:
+        pass
+
+    from PIL import Image
+
+    with Image.open(caminho_png) as original:
+        imagem = original.convert("RGBA")
+    fundo = Image.new("RGB", imagem.size, "white")
+    fundo.paste(imagem, mask=imagem.split()[3])
+
+    if dpi:
+        largura = round(210 / 25.4 * dpi)
+        altura = round(297 / 25.4 * dpi)
+        fundo = fundo.resize((largura, altura), Image.LANCZOS)
+
+    if variante == "cinza":
+        fundo = fundo.convert("L")
+    elif variante == "pb":
+        fundo = fundo.convert("L").point(lambda p: 255 if p > LIMIAR_PB else 0).convert("1", dither=Image.NONE)
+
+    # Grava em arquivo temporário e renomeia, para processos paralelos não lerem um PNG pela metade
+    temporario = f"{caminho_pronto}.{os.getpid()}.tmp"
+    fundo.save(temporario, "PNG", optimize=True)
+    os.replace(temporario, caminho_pronto)
+    return caminho_pronto
+
+# ==============================================================================
+# LAYOUT DO FORMULÁRIO (DECLARADO COMO DADOS)
+# ==============================================================================
+
+# (chave, x, y, largura, altura) de cada campo de texto, em mm
+LAYOUT_CAMPOS = (
+    ("NOME_ESTAB_SOLICITANTE", 13, 32, 100, 5),
+    ("CNES_SOLICITANTE", 168, 32, 50, 5),
+    ("NOME_PACIENTE", 13, 46.5, 100, 5),
+    ("CPF_PACIENTE", 13, 55.2, 90, 5),
+    ("DATA_NASCIMENTO", 112, 55.2, 40, 5),
+    ("RACA_COR", 148, 55.2, 15, 5),
+    ("NOME_MAE", 13, 62.7, 100, 5),
+    ("NOME_RESPONSAVEL", 13, 72.5, 100, 5),
+    ("ENDERECO", 13, 80, 150, 5),
+    ("MUNICIPIO_RESIDENCIA", 13, 88.5, 50, 5),
+    ("COD_IBGE_MUNICIPIO", 130, 88.5, 50, 5),
+    ("UF", 155, 88.5, 20, 5),
+    ("CEP", 167, 88.5, 40, 5),
+
+    ("PROC_PRINCIPAL_COD", 11.7, 103, 40, 5),
+    ("PROC_PRINCIPAL_NOME", 78, 103, 120, 5),
+    ("PROC_PRINCIPAL_QTD", 180, 103, 10, 5),
+    ("PROC_SEC1_COD", 11.7, 118.5, 40, 5),
+    ("PROC_SEC1_NOME", 78, 118.5, 120, 5),
+    ("PROC_SEC1_QTD", 182, 118.5, 10, 5),
+    ("PROC_SEC2_COD", 11.7, 127.5, 40, 5),
+    ("PROC_SEC2_NOME", 78, 127.5, 120, 5),
+    ("PROC_SEC2_QTD", 182, 127.5, 10, 5),
+    ("PROC_SEC3_COD", 11.7, 136.5, 40, 5),
+    ("PROC_SEC3_NOME", 78, 136.5, 120, 5),
+    ("PROC_SEC3_QTD", 182, 136.5, 10, 5),
+    ("PROC_SEC4_COD", 11.7, 145.5, 40, 5),
+    ("PROC_SEC4_NOME", 78, 145.5, 120, 5),
+    ("PROC_SEC4_QTD", 182, 145.5, 10, 5),
+    ("PROC_SEC5_COD", 11.7, 154.5, 40, 5),
+    ("PROC_SEC5_NOME", 78, 154.5, 120, 5),
+    ("PROC_SEC5_QTD", 182, 154.5, 10, 5),
+
+    ("DESC_DIAGNOSTICO", 14, 173, 100, 5),
+    ("OBSERVACOES", 14, 185, 80, 5),
+    ("CID10_PRINCIPAL", 125, 173, 80, 5),
+
+    ("NOME_SOLICITANTE", 13, 222, 100, 5),
+    ("DOC_SOLICITANTE", 55, 230, 60, 5),
+    ("DATA_SOLICITACAO", 110, 222, 40, 5),
+
+    ("NOME_AUTORIZADOR", 13, 246, 60, 5),
+    ("COD_ORGAO_EMISSOR", 105, 246, 60, 5),
+    ("DOC_AUTORIZADOR", 55, 257.5, 60, 5),
+    ("NUMERO_APAC", 140, 246, 60, 5),
+    ("DATA_SOLICITACAO", 13, 270, 60, 5),
+    ("PERIODO_VALIDADE", 147, 270, 60, 5),
+
+    ("NOME_ESTABELECIMENTO", 13, 283, 100, 5),
+    ("CNES_ESTABELECIMENTO", 165, 283, 50, 5),
+)
+
+# Marcas "X" sempre presentes (x, y, lado), na fonte normal
+MARCAS_FIXAS = ((18.8, 230.9, 2), (18.8, 257.9, 2))
+
+# Marca "X" do sexo do paciente (x, y), em fonte 7
+MARCAS_SEXO = {"MASCULINO": (148.8, 47.5), "FEMININO": (160.8, 47.5)}
+TAMANHO_FONTE_MARCA_SEXO = 7
+
+# Ajuste de uma impressora sobre o formulário pré-impresso: posição impressa = deslocamento + posição * escala (mm)
+CALIBRACAO_NEUTRA = {"deslocamento_x": 0.0, "deslocamento_y": 0.0, "escala_x": 1.0, "escala_y": 1.0}
+
+def calibrar_layout(calibracao=None):
+    """(campos, marcas fixas, marcas de sexo) com as posições ajustadas pela calibração."""
+    calibracao = {**CALIBRACAO_NEUTRA, **(calibracao or {})}
+    dx, dy = calibracao["deslocamento_x"], calibracao["deslocamento_y"]
+    sx, sy = calibracao["escala_x"], calibracao["escala_y"]
+    if (dx, dy, sx, sy) == (0, 0, 1, 1):
+        return LAYOUT_CAMPOS, MARCAS_FIXAS, MARCAS_SEXO
+    campos = tuple((chave, dx + x * sx, dy + y * sy, largura * sx, altura * sy)
+                   for chave, x, y, largura, altura in LAYOUT_CAMPOS)
+    marcas_fixas = tuple((dx + x * sx, dy + y * sy, lado) for x, y, lado in MARCAS_FIXAS)
+    marcas_sexo = {sexo: (dx + x * sx, dy + y * sy) for sexo, (x, y) in MARCAS_SEXO.items()}
+    return campos, marcas_fixas, marcas_sexo
+
+def texto_campo(chave, data):
+    """Texto de um campo do layout (inclusive os derivados) a partir dos dados da página."""
+    if chave == "PERIODO_VALIDADE":
+        return f"{data.get('DATA_SOLICITACAO', '')}    {data.get('VALIDADE_FIM', '')}"
+    return data.get(chave, "")
+
 # ==============================================================================
 # CLASSE PARA GERAÇÃO DO PDF
 # ==============================================================================
 
 class APAC_PDF(FPDF):
-    def __init__(self, orientacao='P', unidade='mm', tamanho='A4'):
+    """PDF das APACs.
+
+    Com sobreposicao=True o fundo (template.png) não é desenhado: a página leva
+    só o texto posicionado, para imprimir sobre o formulário pré-impresso. O
+    ganho de tamanho é o template, gravado uma vez por documento; o texto de
+    cada página é o mesmo nos dois modos.
+    calibracao (ver CALIBRACAO_NEUTRA) ajusta todas as posições da página,
+    compensando o desvio de cada impressora.
+    """
+
+    def __init__(self, orientacao='P', unidade='mm', tamanho='A4', variante_template=None, dpi_template=None,
+                 sobreposicao=False, calibracao=None):
         super().__init__(orientation=orientacao, unit=unidade, format=tamanho)
         self.set_auto_page_break(auto=True, margin=5)
-        
-    def add_apac_page(self, data):
+        self.variante_template = variante_template or VARIANTE_TEMPLATE
+        self.dpi_template = dpi_template if dpi_template is not None else DPI_TEMPLATE
+        self.sobreposicao = sobreposicao
+        self.calibracao = {**CALIBRACAO_NEUTRA, **(calibracao or {})}
+        self._layout_campos, self._marcas_fixas, self._marcas_sexo = calibrar_layout(self.calibracao)
+        self._template_path = None
+        # Posições de texto (FPDF.text) de cada campo e marca, calculadas na primeira página
+        self._posicoes_campos = None
+        self._posicoes_marcas_fixas = None
+        self._posicoes_marcas_sexo = None
+
+    def _desenhar_fundo(self):
+        # O template é preparado uma vez por processo e resolvido uma vez por documento;
+        # o FPDF reconhece o mesmo caminho e embute a imagem uma única vez no documento
+        if self._template_path is None:
+            try:
+                self._template_path = preparar_template(self.variante_template, self.dpi_template)
+            except FileNotFoundError as e:
+                raise ErroGeracaoAPAC(f"{e} Por favor, coloque-o na mesma pasta do executável.") from e
+
+        c = self.calibracao
+        self.image(self._template_path, x=c["deslocamento_x"], y=c["deslocamento_y"],
+                   w=210 * c["escala_x"], h=297 * c["escala_y"])
+
+    def _compilar_layout(self):
+        """Converte o layout (caixas de cell()) nas posições de FPDF.text, uma vez por documento.
+
+        Um campo alinhado à esquerda em cell(largura, altura) começa em x + c_margin,
+        com a linha de base a 0.5 * altura + 0.3 * tamanho da fonte do topo da
+        caixa; as marcas "X" (centralizadas) descontam metade da largura do texto.
+        Com text() o FPDF só posiciona e codifica o texto, sem o cálculo de
+        fragmentos, quebras e alinhamento que cell() refaz a cada chamada.
+        """
+        margem, tamanho_fonte, tamanho_fonte_pt = self.c_margin, self.font_size, self.font_size_pt
+        self._posicoes_campos = tuple(
+            (chave, x + margem, y + 0.5 * altura + 0.3 * tamanho_fonte, largura, altura)
+            for chave, x, y, largura, altura in self._layout_campos
+        )
+        largura_x = self.get_string_width("X")
+        self._posicoes_marcas_fixas = tuple(
+            (x + (lado - largura_x) / 2, y + 0.5 * lado + 0.3 * tamanho_fonte)
+            for x, y, lado in self._marcas_fixas
+        )
+        self.set_font_size(TAMANHO_FONTE_MARCA_SEXO)
+        largura_x, tamanho_marca = self.get_string_width("X"), self.font_size
+        self._posicoes_marcas_sexo = {
+            sexo: (x + (3 - largura_x) / 2, y + 1.5 + 0.3 * tamanho_marca)
+            for sexo, (x, y) in self._marcas_sexo.items()
+        }
+        self.set_font_size(tamanho_fonte_pt)
+
+    def _desenhar_campos(self, data):
+        for chave, x, y, largura, altura in self._posicoes_campos:
+            texto = texto_campo(chave, data)
+            if not texto:
+                continue
+            if "\n" in texto:
+                # Quebras de linha ficam com cell(), que é quem sempre as tratou
+                self.set_xy(x - self.c_margin, y - 0.5 * altura - 0.3 * self.font_size)
+                self.cell(largura, altura, texto)
+                continue
+            self.text(x, y, texto)
+
+    def _desenhar_marcas_fixas(self):
+        for x, y in self._posicoes_marcas_fixas:
+            self.text(x, y, "X")
+
+    def _desenhar_marca_sexo(self, data):
+        posicao = self._posicoes_marcas_sexo.get(data.get("SEXO"))
+        if posicao:
+            original_font_size = self.font_size_pt
+            self.set_font_size(TAMANHO_FONTE_MARCA_SEXO)
+            self.text(*posicao, "X")
+            self.set_font_size(original_font_size)
+
+    def add_apac_page(self, data, fixos=None):
+        """Adiciona uma página de APAC.
+
+        fixos (opcional) são os campos comuns a várias páginas (especialidade,
+        procedimentos, município); data tem precedência sobre eles. O layout é
+        convertido em posições de texto uma vez por documento (_compilar_layout)
+        e cada campo vira uma chamada a FPDF.text.
+        """
         self.add_page()
-        
-        # --- BLOCO ANTIGO SIMPLIFICADO PELA resource_path ---
-        # if getattr(sys, 'frozen', False):
-        #     application_path = os.path.dirname(sys.executable)
-        # else:
-        #     application_path = os.path.dirname(os.path.abspath(__file__))
-        # template_path = os.path.join(application_path, "template.png")
-        
-        # --- ALTERAÇÃO: Usa resource_path() para localizar o PNG ---
-        template_path = resource_path("template.png")
-        
-        if os.path.exists(template_path):
-            self.image(template_path, x=0, y=0, w=210, h=297)
-        else:
-            messagebox.showerror("Erro Fatal", "Arquivo 'template.png' não encontrado. Por favor, coloque-o na mesma pasta do executável.")
-            return
+        if not self.sobreposicao:
+            self._desenhar_fundo()
 
         self.set_font('Arial', '', 10)
         self.set_text_color(0, 0, 0)
-        
-        # ... (restante do código do PDF) ...
-        self.set_xy(13, 32); self.cell(100, 5, data.get("NOME_ESTAB_SOLICITANTE", ""))
-        self.set_xy(168, 32); self.cell(50, 5, data.get("CNES_SOLICITANTE", ""))
-        self.set_xy(13, 46.5); self.cell(100, 5, data.get("NOME_PACIENTE", ""))
-        
-        original_font_size = self.font_size_pt
-        self.set_font_size(7)
-        if data.get("SEXO") == "MASCULINO":
-            self.set_xy(148.8, 47.5); self.cell(w=3, h=3, text="X", border=0, align='C')
-        elif data.get("SEXO") == "FEMININO":
-            self.set_xy(160.8, 47.5); self.cell(w=3, h=3, text="X", border=0, align='C')
-        self.set_font_size(original_font_size)
-        
-        self.set_xy(13, 55.2); self.cell(90, 5, data.get("CPF_PACIENTE", ""))
-        self.set_xy(112, 55.2); self.cell(40, 5, data.get("DATA_NASCIMENTO", ""))
-        self.set_xy(148, 55.2); self.cell(15, 5, data.get("RACA_COR", ""))
-        self.set_xy(13, 62.7); self.cell(100, 5, data.get("NOME_MAE", ""))
-        self.set_xy(13, 72.5); self.cell(100, 5, data.get("NOME_RESPONSAVEL", ""))
-        self.set_xy(13, 80); self.cell(150, 5, data.get("ENDERECO", ""))
-        self.set_xy(13, 88.5); self.cell(50, 5, data.get("MUNICIPIO_RESIDENCIA", ""))
-        self.set_xy(130, 88.5); self.cell(50, 5, data.get("COD_IBGE_MUNICIPIO", ""))
-        self.set_xy(155, 88.5); self.cell(20, 5, data.get("UF", ""))
-        self.set_xy(167, 88.5); self.cell(40, 5, data.get("CEP", ""))
-
-        self.set_xy(11.7, 103); self.cell(40, 5, data.get("PROC_PRINCIPAL_COD", ""))
-        self.set_xy(78, 103); self.cell(120, 5, data.get("PROC_PRINCIPAL_NOME", ""))
-        self.set_xy(180, 103); self.cell(10, 5, data.get("PROC_PRINCIPAL_QTD", ""))
-        self.set_xy(11.7, 118.5); self.cell(40, 5, data.get("PROC_SEC1_COD", ""))
-        self.set_xy(78, 118.5); self.cell(120, 5, data.get("PROC_SEC1_NOME", ""))
-        self.set_xy(182, 118.5); self.cell(10, 5, data.get("PROC_SEC1_QTD", ""))
-        self.set_xy(11.7, 127.5); self.cell(40, 5, data.get("PROC_SEC2_COD", ""))
-        self.set_xy(78, 127.5); self.cell(120, 5, data.get("PROC_SEC2_NOME", ""))
-        self.set_xy(182, 127.5); self.cell(10, 5, data.get("PROC_SEC2_QTD", ""))
-        self.set_xy(11.7, 136.5); self.cell(40, 5, data.get("PROC_SEC3_COD", ""))
-        self.set_xy(78, 136.5); self.cell(120, 5, data.get("PROC_SEC3_NOME", ""))
-        self.set_xy(182, 136.5); self.cell(10, 5, data.get("PROC_SEC3_QTD", ""))
-        self.set_xy(11.7, 145.5); self.cell(40, 5, data.get("PROC_SEC4_COD", ""))
-        self.set_xy(78, 145.5); self.cell(120, 5, data.get("PROC_SEC4_NOME", ""))
-        self.set_xy(182, 145.5); self.cell(10, 5, data.get("PROC_SEC4_QTD", ""))
-        self.set_xy(11.7, 154.5); self.cell(40, 5, data.get("PROC_SEC5_COD", ""))
-        self.set_xy(78, 154.5); self.cell(120, 5, data.get("PROC_SEC5_NOME", ""))
-        self.set_xy(182, 154.5); self.cell(10, 5, data.get("PROC_SEC5_QTD", ""))
-
-        self.set_xy(14, 173); self.cell(100, 5, data.get("DESC_DIAGNOSTICO", ""))
-        self.set_xy(14, 185); self.cell(80, 5, data.get("OBSERVACOES", ""))
-        self.set_xy(125, 173); self.cell(80, 5, data.get("CID10_PRINCIPAL", ""))
-        
-        self.set_xy(13, 222); self.cell(100, 5, data.get("NOME_SOLICITANTE", ""))
-        self.set_xy(55, 230); self.cell(60, 5, data.get("DOC_SOLICITANTE", ""))
-        self.set_xy(110, 222); self.cell(40, 5, data.get("DATA_SOLICITACAO", ""))
-        self.set_xy(18.8, 230.9); self.cell(w=2, h=2, text="X", border=0, align='C')
-        
-        self.set_xy(13, 246); self.cell(60, 5, data.get("NOME_AUTORIZADOR", ""))
-        self.set_xy(105, 246); self.cell(60, 5, data.get("COD_ORGAO_EMISSOR", ""))
-        self.set_xy(55, 257.5); self.cell(60, 5, data.get("DOC_AUTORIZADOR", ""))
-        self.set_xy(140, 246); self.cell(60, 5, data.get("NUMERO_APAC", ""))
-        self.set_xy(13, 270); self.cell(60, 5, data.get("DATA_SOLICITACAO", ""))
-        self.set_xy(147, 270); self.cell(60, 5, f"{data.get('DATA_SOLICITACAO', '')}    {data.get('VALIDADE_FIM', '')}")
-        self.set_xy(18.8, 257.9); self.cell(w=2, h=2, text="X", border=0, align='C')
-
-        self.set_xy(13, 283); self.cell(100, 5, data.get("NOME_ESTABELECIMENTO", ""))
-        self.set_xy(165, 283); self.cell(50, 5, data.get("CNES_ESTABELECIMENTO", ""))
\ No newline at end of file
+        if self._posicoes_campos is None:
+            self._compilar_layout()
+
+        if fixos is not None:
+            data = {**fixos, **data}
+        self._desenhar_campos(data)
+        self._desenhar_marcas_fixas()
+        self._desenhar_marca_sexo(data)
+
+    def add_pagina_alinhamento(self, titulo=""):
+        """Página de teste para o formulário pré-impresso: o contorno de cada campo
+        com o nome dele, as marcas "X" e uma cruz nos cantos da área útil, tudo já
+        com a calibração aplicada. Impressa sobre o formulário, mostra quanto o
+        texto cai fora das caixas."""
+        self.add_page()
+        if not self.sobreposicao:
+            self._desenhar_fundo()
+
+        c = self.calibracao
+        self.set_draw_color(0, 0, 0)
+        self.set_line_width(0.1)
+        self.set_text_color(0, 0, 0)
+        self.set_font('Arial', '', 5)
+        for chave, x, y, largura, altura in self._layout_campos:
+            self.rect(x, y, min(largura, 210 - x), altura)
+            self.set_xy(x, y); self.cell(largura, 2, chave)
+
+        self.set_font('Arial', '', 10)
+        if self._posicoes_campos is None:
+            self._compilar_layout()
+        self._desenhar_marcas_fixas()
+        for x, y in self._marcas_sexo.values():
+            self.set_font_size(TAMANHO_FONTE_MARCA_SEXO)
+            self.set_xy(x, y); self.cell(w=3, h=3, text="X", border=0, align='C')
+
+        # Cruzes nos cantos (10 mm das bordas do formulário)
+        self.set_font('Arial', '', 6)
+        for x, y in ((10, 10), (200, 10), (10, 287), (200, 287)):
+            px, py = c["deslocamento_x"] + x * c["escala_x"], c["deslocamento_y"] + y * c["escala_y"]
+            self.line(px - 4, py, px + 4, py)
+            self.line(px, py - 4, px, py + 4)
+            self.set_xy(px + 1, py + 0.5); self.cell(20, 2.5, f"({x}, {y}) mm")
+
+        self.set_font('Arial', '', 8)
+        self.set_xy(20, 14)
+        self.cell(170, 4, titulo or "Página de alinhamento", align='C')
+        self.set_xy(20, 18)
+        self.cell(170, 4, (f"deslocamento x={c['deslocamento_x']:+.1f} mm y={c['deslocamento_y']:+.1f} mm | "
+                           f"escala x={c['escala_x']:.4f} y={c['escala_y']:.4f}"), align='C')
+
+def aquecer_template(variante=None, dpi=None):
+    """Prepara o template neste processo, para processos que ficam no ar (servico.py):
+    o primeiro pedido já encontra o PNG pronto e as importações do FPDF e do Pillow feitas."""
+    pdf = APAC_PDF(variante_template=variante, dpi_template=dpi)
+    pdf.add_page()
+    pdf._desenhar_fundo()
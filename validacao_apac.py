@@ -0,0 +1,387 @@
+# validacao_apac.py
+#
+# Validação prévia dos registros, antes de qualquer trabalho de PDF: dígitos
+# verificadores de CNS (definitivo e provisório), CPF e número da APAC, datas
+# (nascimento, início e fim da validade) e campos obrigatórios. CNS do solicitante
+# ou do autorizador ausente não reprova, só conta como aviso. Os registros são
+# validados em lotes; com numpy instalado cada lote é conferido de forma
+# vetorizada, senão registro a registro.
+
+import os
+import csv
+import operator
+import itertools
+from datetime import date, datetime
+
+from utils import abrir_blocos_bdsia, pasta_saida_padrao
+from registro_apac import extrair_registro
+from instrumentacao import INSTRUMENTACAO_DESLIGADA
+
+try:
+    # numpy é opcional: sem ele a validação roda em Python puro (mesmas regras)
+    import numpy as np
+except ImportError:
+    np = None
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+# Registros validados de cada vez
+TAMANHO_LOTE = 4096
+
+CAMPOS_OBRIGATORIOS = (
+    "NUMERO_APAC",
+    "NOME_PACIENTE",
+    "SEXO",
+    "DATA_NASCIMENTO",
+    "DATA_SOLICITACAO",
+    "VALIDADE_FIM",
+)
+
+# Conferidos quando preenchidos (CNS inválido reprova), mas a ausência é só um
+# aviso: há exportações sem o CNS do solicitante ou do autorizador, e elas
+# sempre foram impressas com o campo em branco
+CAMPOS_RECOMENDADOS = (
+    "CNS_SOLICITANTE",
+    "CNS_AUTORIZADOR",
+)
+
+# Código do motivo -> descrição usada no arquivo de rejeitadas
+MOTIVOS = {
+    **{f"{campo.lower()}_ausente": f"{campo} ausente" for campo in CAMPOS_OBRIGATORIOS + CAMPOS_RECOMENDADOS},
+    "numero_apac_invalido": "Número da APAC com dígito verificador inválido",
+    "cpf_invalido": "CPF do paciente inválido",
+    "cns_solicitante_invalido": "CNS do solicitante inválido",
+    "cns_autorizador_invalido": "CNS do autorizador inválido",
+    "data_nascimento_invalida": "Data de nascimento inválida",
+    "data_solicitacao_invalida": "Início da validade inválido",
+    "validade_fim_invalida": "Fim da validade inválido",
+    "validade_invertida": "Fim da validade anterior ao início",
+    "nascimento_posterior": "Nascimento posterior ao início da validade",
+}
+
+def sem_separadores(valor):
+    """Tira a pontuação aceita nos números ("123.456.789-01", "352500000001-1", "702 1027 6175 0292");
+    qualquer outro caractere torna o número inválido."""
+    return valor.replace(".", "").replace("-", "").replace(" ", "")
+
+# ==============================================================================
+# REGRAS (UM VALOR POR VEZ)
+# ==============================================================================
+
+def _digitos(valor, largura):
+    """Lista de dígitos se valor tiver exatamente `largura` dígitos ASCII, senão None."""
+    if len(valor) != largura or not (valor.isascii() and valor.isdigit()):
+        return None
+    return [ord(c) - 48 for c in valor]
+
+def cns_valido(cns):
+    """CNS definitivo (1 ou 2 + PIS + 000/001 + DV) ou provisório (7, 8 ou 9, soma ponderada múltipla de 11)."""
+    d = _digitos(cns, 15)
+    if d is None:
+        return False
+    if d[0] in (7, 8, 9):
+        return sum(x * p for x, p in zip(d, range(15, 0, -1))) % 11 == 0
+    if d[0] not in (1, 2):
+        return False
+    soma = sum(x * p for x, p in zip(d[:11], range(15, 4, -1)))
+    dv = 11 - soma % 11
+    if dv == 11:
+        dv = 0
+    if dv == 10:
+        return d[11:14] == [0, 0, 1] and d[14] == 11 - (soma + 2) % 11
+    return d[11:14] == [0, 0, 0] and d[14] == dv
+
+def cpf_valido(cpf):
+    d = _digitos(cpf, 11)
+    if d is None or len(set(d)) == 1:
+        return False
+    for n in (9, 10):
+        if d[n] != sum(x * p for x, p in zip(d[:n], range(n + 1, 1, -1))) * 10 % 11 % 10:
+            return False
+    return True
+
+def apac_valida(numero):
+    """12 dígitos + verificador (resto da divisão por 11, com 10 -> 0)."""
+    d = _digitos(numero, 13)
+    if d is None:
+        return False
+    dv = int(numero[:12]) % 11
+    return d[12] == (0 if dv == 10 else dv)
+
+def data_ordinal(texto):
+    """dd/mm/aaaa -> aaaammdd (int) se for uma data válida, senão None."""
+    if len(texto) != 10 or texto[2] != "/" or texto[5] != "/":
+        return None
+    try:
+        data = date(int(texto[6:]), int(texto[3:5]), int(texto[:2]))
+    except ValueError:
+        return None
+    return data.year * 10000 + data.month * 100 + data.day
+
+# ==============================================================================
+# VALIDAÇÃO DE UM LOTE
+# ==============================================================================
+
+_CAMPOS_LIDOS = CAMPOS_OBRIGATORIOS + CAMPOS_RECOMENDADOS + ("CPF_PACIENTE",)
+_ler_campos = operator.attrgetter(*_CAMPOS_LIDOS)
+
+def _sem_separadores_coluna(valores):
+    """sem_separadores de uma coluna inteira, com uma única passada de replace sobre o lote."""
+    partes = sem_separadores("\0".join(valores)).split("\0")
+    if len(partes) != len(valores):
+        # Algum valor continha o próprio "\0": volta a tratar um a um
+        return [sem_separadores(v) for v in valores]
+    return partes
+
+def _campos_do_lote(registros):
+    """(valores normalizados dos campos validados, valores brutos dos obrigatórios), em colunas."""
+    brutos = dict(zip(_CAMPOS_LIDOS, zip(*map(_ler_campos, registros))))
+    colunas = {
+        "numero_apac": _sem_separadores_coluna(brutos["NUMERO_APAC"]),
+        "cpf": _sem_separadores_coluna(brutos["CPF_PACIENTE"]),
+        "cns_solicitante": _sem_separadores_coluna(brutos["CNS_SOLICITANTE"]),
+        "cns_autorizador": _sem_separadores_coluna(brutos["CNS_AUTORIZADOR"]),
+        "data_nascimento": brutos["DATA_NASCIMENTO"],
+        "data_solicitacao": brutos["DATA_SOLICITACAO"],
+        "validade_fim": brutos["VALIDADE_FIM"],
+    }
+    return colunas, brutos
+
+def _hoje():
+    hoje = date.today()
+    return hoje.year * 10000 + hoje.month * 100 + hoje.day
+
+def _verificacoes_python(colunas):
+    """{código do motivo: [bool por registro]} com True onde o valor falhou."""
+    hoje = _hoje()
+    nascimento = [data_ordinal(v) for v in colunas["data_nascimento"]]
+    inicio = [data_ordinal(v) for v in colunas["data_solicitacao"]]
+    fim = [data_ordinal(v) for v in colunas["validade_fim"]]
+    return {
+        "numero_apac_invalido": [not apac_valida(v) for v in colunas["numero_apac"]],
+        "cpf_invalido": [bool(v) and not cpf_valido(v) for v in colunas["cpf"]],
+        "cns_solicitante_invalido": [not cns_valido(v) for v in colunas["cns_solicitante"]],
+        "cns_autorizador_invalido": [not cns_valido(v) for v in colunas["cns_autorizador"]],
+        "data_nascimento_invalida": [n is None or n > hoje for n in nascimento],
+        "data_solicitacao_invalida": [i is None for i in inicio],
+        "validade_fim_invalida": [f is None for f in fim],
+        "validade_invertida": [i is not None and f is not None and f < i for i, f in zip(inicio, fim)],
+        "nascimento_posterior": [n is not None and i is not None and n > i for n, i in zip(nascimento, inicio)],
+    }
+
+# --------------------------------------------------------------------------
+# Versão vetorizada (numpy): as mesmas regras, sobre o lote inteiro
+# --------------------------------------------------------------------------
+
+def _codigos_caracteres(valores, largura):
+    """Matriz n x (largura + 1) com os códigos dos caracteres de cada valor (0 após o fim).
+
+    A coluna a mais só fica preenchida nos valores mais longos que a largura.
+    """
+    texto = np.array(valores, dtype=f"<U{largura + 1}")
+    return texto.view(np.uint32).reshape(len(valores), largura + 1).astype(np.int64)
+
+def _matriz_digitos(valores, largura):
+    """(matriz n x largura com os dígitos, máscara dos valores com exatamente `largura` dígitos)."""
+    codigos = _codigos_caracteres(valores, largura)
+    matriz = codigos[:, :largura] - 48
+    ok = ((matriz >= 0) & (matriz <= 9)).all(axis=1) & (codigos[:, largura] == 0)
+    matriz[~ok] = 0
+    return matriz, ok
+
+def _cns_validos_np(valores):
+    m, ok = _matriz_digitos(valores, 15)
+    primeiro = m[:, 0]
+    provisorio = (primeiro >= 7) & ((m @ np.arange(15, 0, -1)) % 11 == 0)
+    soma = m[:, :11] @ np.arange(15, 4, -1)
+    dv = 11 - soma % 11
+    dv[dv == 11] = 0
+    meio = m[:, 11] * 100 + m[:, 12] * 10 + m[:, 13]
+    definitivo = ((primeiro == 1) | (primeiro == 2)) & np.where(
+        dv == 10,
+        (meio == 1) & (m[:, 14] == 11 - (soma + 2) % 11),
+        (meio == 0) & (m[:, 14] == dv),
+    )
+    return ok & (provisorio | definitivo)
+
+def _cpfs_validos_np(valores):
+    m, ok = _matriz_digitos(valores, 11)
+    dv1 = (m[:, :9] @ np.arange(10, 1, -1)) * 10 % 11 % 10
+    dv2 = (m[:, :10] @ np.arange(11, 1, -1)) * 10 % 11 % 10
+    repetidos = (m == m[:, :1]).all(axis=1)
+    return ok & (m[:, 9] == dv1) & (m[:, 10] == dv2) & ~repetidos
+
+def _apacs_validas_np(valores):
+    m, ok = _matriz_digitos(valores, 13)
+    dv = (m[:, :12] @ (10 ** np.arange(11, -1, -1, dtype=np.int64))) % 11
+    dv[dv == 10] = 0
+    return ok & (m[:, 12] == dv)
+
+_DIAS_NO_MES = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_POSICOES_DIGITOS_DATA = [0, 1, 3, 4, 6, 7, 8, 9]
+
+def _datas_np(valores):
+    """(máscara das datas válidas, aaaammdd) de valores dd/mm/aaaa."""
+    codigos = _codigos_caracteres(valores, 10)
+    m = codigos[:, _POSICOES_DIGITOS_DATA] - 48
+    ok = (((m >= 0) & (m <= 9)).all(axis=1)
+          & (codigos[:, 2] == ord("/")) & (codigos[:, 5] == ord("/")) & (codigos[:, 10] == 0))
+    dia = m[:, 0] * 10 + m[:, 1]
+    mes = m[:, 2] * 10 + m[:, 3]
+    ano = m[:, 4] * 1000 + m[:, 5] * 100 + m[:, 6] * 10 + m[:, 7]
+    bissexto = (ano % 4 == 0) & ((ano % 100 != 0) | (ano % 400 == 0))
+    dias_no_mes = np.array(_DIAS_NO_MES)[np.clip(mes, 0, 12)] + ((mes == 2) & bissexto)
+    ok &= (mes >= 1) & (mes <= 12) & (dia >= 1) & (dia <= dias_no_mes) & (ano >= 1)
+    return ok, ano * 10000 + mes * 100 + dia
+
+def _verificacoes_numpy(colunas):
+    hoje = _hoje()
+    cpfs = colunas["cpf"]
+    ok_nascimento, nascimento = _datas_np(colunas["data_nascimento"])
+    ok_inicio, inicio = _datas_np(colunas["data_solicitacao"])
+    ok_fim, fim = _datas_np(colunas["validade_fim"])
+    tem_cpf = np.fromiter(map(bool, cpfs), bool, len(cpfs))
+    return {
+        "numero_apac_invalido": ~_apacs_validas_np(colunas["numero_apac"]),
+        "cpf_invalido": tem_cpf & ~_cpfs_validos_np(cpfs),
+        "cns_solicitante_invalido": ~_cns_validos_np(colunas["cns_solicitante"]),
+        "cns_autorizador_invalido": ~_cns_validos_np(colunas["cns_autorizador"]),
+        "data_nascimento_invalida": ~ok_nascimento | (nascimento > hoje),
+        "data_solicitacao_invalida": ~ok_inicio,
+        "validade_fim_invalida": ~ok_fim,
+        "validade_invertida": ok_inicio & ok_fim & (fim < inicio),
+        "nascimento_posterior": ok_nascimento & ok_inicio & (nascimento > inicio),
+    }
+
+# --------------------------------------------------------------------------
+# Lote
+# --------------------------------------------------------------------------
+
+# Campo de onde vem cada verificação: se o campo faltar, a verificação não reprova
+# (fica o "ausente" dos obrigatórios; dos recomendados, nem isso)
+_CAMPO_DA_VERIFICACAO = {
+    "numero_apac_invalido": "NUMERO_APAC",
+    "cns_solicitante_invalido": "CNS_SOLICITANTE",
+    "cns_autorizador_invalido": "CNS_AUTORIZADOR",
+    "data_nascimento_invalida": "DATA_NASCIMENTO",
+    "data_solicitacao_invalida": "DATA_SOLICITACAO",
+    "validade_fim_invalida": "VALIDADE_FIM",
+}
+
+def validar_lote(registros, usar_numpy=None):
+    """Lista, para cada registro, dos códigos de motivo que o reprovam (vazia se válido).
+
+    usar_numpy=None usa a versão vetorizada quando numpy estiver instalado.
+    """
+    if not registros:
+        return []
+    usar_numpy = np is not None if usar_numpy is None else usar_numpy
+    colunas, brutos = _campos_do_lote(registros)
+    ausentes = {campo: [not v for v in brutos[campo]] for campo in CAMPOS_OBRIGATORIOS + CAMPOS_RECOMENDADOS}
+
+    if not usar_numpy:
+        falhas = _verificacoes_python(colunas)
+        for codigo, campo in _CAMPO_DA_VERIFICACAO.items():
+            falhas[codigo] = [falhou and not ausente for falhou, ausente in zip(falhas[codigo], ausentes[campo])]
+        motivos = [(f"{campo.lower()}_ausente", ausentes[campo]) for campo in CAMPOS_OBRIGATORIOS]
+        motivos += falhas.items()
+        return [[codigo for codigo, valores in motivos if valores[posicao]] for posicao in range(len(registros))]
+
+    ausentes = {campo: np.fromiter(valores, bool, len(registros)) for campo, valores in ausentes.items()}
+    falhas = _verificacoes_numpy(colunas)
+    for codigo, campo in _CAMPO_DA_VERIFICACAO.items():
+        falhas[codigo] &= ~ausentes[campo]
+    codigos = [f"{campo.lower()}_ausente" for campo in CAMPOS_OBRIGATORIOS] + list(falhas)
+    matriz = np.vstack([ausentes[campo] for campo in CAMPOS_OBRIGATORIOS] + list(falhas.values()))
+    # Só os registros reprovados (poucos) voltam a ser percorridos em Python
+    resultado = [[] for _ in registros]
+    for posicao in np.flatnonzero(matriz.any(axis=0)).tolist():
+        resultado[posicao] = [codigos[k] for k in np.flatnonzero(matriz[:, posicao]).tolist()]
+    return resultado
+
+def avisos_registro(registro):
+    """Códigos dos campos recomendados ausentes no registro (não reprovam)."""
+    return [f"{campo.lower()}_ausente" for campo in CAMPOS_RECOMENDADOS if not getattr(registro, campo)]
+
+def descrever_motivos(motivos):
+    return "; ".join(MOTIVOS.get(codigo, codigo) for codigo in motivos)
+
+# ==============================================================================
+# ETAPA DE VALIDAÇÃO NA GERAÇÃO
+# ==============================================================================
+
+def registros_validados(blocos_apac, instrumentacao=None, validar=True, tamanho_lote=TAMANHO_LOTE):
+    """Extrai os registros dos blocos e gera (registro, motivos), validando em lotes.
+
+    motivos é a lista de códigos que reprovam o registro (vazia = válido). Sem
+    validar, cada registro sai assim que é extraído, sempre com motivos vazios.
+    """
+    instrumentacao = instrumentacao or INSTRUMENTACAO_DESLIGADA
+
+    def extrair():
+        for bloco in instrumentacao.iterar("leitura", blocos_apac):
+            with instrumentacao.etapa("parse"):
+                registro = extrair_registro(bloco)
+            if registro is not None:
+                yield registro
+
+    return validar_registros(extrair(), instrumentacao, validar, tamanho_lote)
+
+def validar_registros(registros, instrumentacao=None, validar=True, tamanho_lote=TAMANHO_LOTE):
+    """Gera (registro, motivos) de registros já extraídos (ex.: vindos do cache_parse), validando em lotes."""
+    instrumentacao = instrumentacao or INSTRUMENTACAO_DESLIGADA
+    registros = iter(registros)
+    if not validar:
+        for registro in registros:
+            yield registro, ()
+        return
+    while True:
+        lote = list(itertools.islice(registros, tamanho_lote))
+        if not lote:
+            return
+        with instrumentacao.etapa("validacao"):
+            motivos_lote = validar_lote(lote)
+        yield from zip(lote, motivos_lote)
+
+def gravar_rejeitadas(pasta, carimbo, rejeitadas):
+    """Grava apac_rejeitadas_<carimbo>.csv com (número, paciente, motivos); retorna o caminho ou None."""
+    if not rejeitadas:
+        return None
+    caminho = os.path.join(pasta, f"apac_rejeitadas_{carimbo}.csv")
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as f:
+        escritor = csv.writer(f, delimiter=";")
+        escritor.writerow(("numero_apac", "nome_paciente", "motivos"))
+        for numero_apac, nome_paciente, motivos in rejeitadas:
+            escritor.writerow((numero_apac, nome_paciente, descrever_motivos(motivos)))
+    return caminho
+
+def validar_arquivo(caminho_arquivo, pasta_saida=None):
+    """Só a validação prévia, sobre o arquivo inteiro: grava o arquivo de rejeitadas e retorna o resumo."""
+    total = 0
+    rejeitadas = []
+    por_motivo = {}
+    avisos = {}
+    for registro, motivos in registros_validados(abrir_blocos_bdsia(caminho_arquivo)):
+        total += 1
+        for codigo in avisos_registro(registro):
+            avisos[codigo] = avisos.get(codigo, 0) + 1
+        if motivos:
+            rejeitadas.append((registro.NUMERO_APAC, registro.NOME_PACIENTE, motivos))
+            for codigo in motivos:
+                por_motivo[codigo] = por_motivo.get(codigo, 0) + 1
+
+    pasta_saida = pasta_saida or pasta_saida_padrao()
+    os.makedirs(pasta_saida, exist_ok=True)
+    carimbo = datetime.now().strftime('%Y%m%d%H%M%S')
+    return {
+        "arquivo_entrada": os.path.abspath(caminho_arquivo),
+        "total_registros": total,
+        "validos": total - len(rejeitadas),
+        "rejeitados": len(rejeitadas),
+        "por_motivo": por_motivo,
+        "avisos": avisos,
+        "vetorizada": np is not None,
+        "arquivo_rejeitadas": gravar_rejeitadas(pasta_saida, carimbo, rejeitadas),
+    }